@@ -9,9 +9,28 @@ apiUrl="https://glycoshape.io"  # Replace with your actual API base URL
 # Temporary files to store response headers and body
 response_headers=$(mktemp)
 response_body=$(mktemp)
-# Send POST request to the API
-curl -X POST -H "Content-Type: application/json" -d "{\"url\":\"$url\"}" \
-  -D $response_headers -o $response_body "$apiUrl/api/gotw"
+# Send POST request to the API; the build runs as a background job
+submit_response=$(curl -s -X POST -H "Content-Type: application/json" -d "{\"url\":\"$url\"}" "$apiUrl/api/gotw")
+job_id=$(echo "$submit_response" | sed -n 's/.*"job_id": *"\([0-9a-f]*\)".*/\1/p')
+if [ -z "$job_id" ]; then
+  echo "Failed to submit GOTW job: $submit_response"
+  exit 1
+fi
+echo "GOTW job $job_id submitted, waiting for it to finish..."
+# The result URL answers 409 until the job is done, then sends the zip
+while true; do
+  http_code=$(curl -s -D $response_headers -o $response_body -w '%{http_code}' "$apiUrl/api/gotw/$job_id/result")
+  if [ "$http_code" = "200" ]; then
+    break
+  elif [ "$http_code" = "409" ]; then
+    echo "Job $job_id: $(sed -n 's/.*"stage": *"\([^"]*\)".*/\1/p' $response_body)"
+    sleep 10
+  else
+    echo "GOTW job $job_id failed (HTTP $http_code): $(cat $response_body)"
+    rm -f $response_headers $response_body
+    exit 1
+  fi
+done
 # Extract the file name from the headers
 file_name=$(grep -i 'x-filename:' $response_headers | awk '{print $2}' | tr -d '\r')
 # Set default file name if not found in headers
@@ -1,30 +1,24 @@
-from flask import Flask, request, jsonify, make_response, send_file, Response
+from flask import Flask, Request, request, jsonify, make_response, send_file, Response
 from flask_cors import CORS
-import pandas as pd
 from pathlib import Path
 import requests
-import sys, time
 import os,json
-import time
-from datetime import datetime
-from lib import config, GOTW_script, name , natural2sparql
+from datetime import datetime, timezone
+from lib import config, GOTW_script, name , natural2sparql, database, search_index, cache, bundle, visitors, geolocation, jobs, download, inventory, uploads, blobs, folders
 from glycowork.motif.draw import GlycoDraw
 from glycowork.motif.processing import canonicalize_iupac
 import tempfile
 import shutil
 import zipfile
-import tempfile
-from thefuzz import fuzz
-import geocoder
-import io
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import re
 from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
 from werkzeug.exceptions import RequestEntityTooLarge
 import logging
-import hashlib
-import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 app = Flask(__name__)
@@ -68,13 +62,81 @@ def ensure_directory_exists(directory_path):
     """Create directory if it doesn't exist."""
     Path(directory_path).mkdir(parents=True, exist_ok=True)
 
+def upload_destination(clean_target_path, relative_path):
+    """Validate an uploaded file's relative path and create its directory.
+
+    Returns:
+        tuple: (upload directory, relative directory, secure filename)
+
+    Raises:
+        ValueError: If the path, filename or file type is not acceptable.
+    """
+    # Sanitize the relative path to prevent directory traversal
+    try:
+        clean_relative_path = sanitize_path(relative_path)
+    except ValueError as e:
+        raise ValueError(f'Invalid file path: {str(e)}')
+
+    # Create the full directory path
+    if clean_target_path:
+        full_relative_path = os.path.join(clean_target_path, clean_relative_path)
+    else:
+        full_relative_path = clean_relative_path
+
+    # Hidden directories hold the blob store and partial uploads
+    if any(part.startswith('.') for part in full_relative_path.split(os.sep)):
+        raise ValueError('Invalid file path: hidden files and directories are not allowed')
+
+    # Get directory part of the path
+    file_dir = os.path.dirname(full_relative_path)
+    filename = os.path.basename(full_relative_path)
+
+    # Secure the filename
+    secure_filename_result = secure_filename(filename)
+    if not secure_filename_result:
+        raise ValueError('Invalid filename')
+
+    # Check file extension
+    if not allowed_file(secure_filename_result):
+        raise ValueError('File type not allowed')
+
+    # Create the full upload directory path including subdirectories
+    if file_dir:
+        upload_dir = os.path.join(str(GLYCOSHAPE_UPLOAD_DIR), file_dir)
+    else:
+        upload_dir = str(GLYCOSHAPE_UPLOAD_DIR)
+
+    ensure_directory_exists(upload_dir)
+    return upload_dir, file_dir, secure_filename_result
+
 
 # load directory 
 GLYCOSHAPE_DIR = Path(config.glycoshape_database_dir)
 GLYCOSHAPE_CSV = Path(config.glycoshape_inventory_csv)
+# Submissions are appended to SQLite; the CSV is imported once and kept as a view for the DB scripts
+INVENTORY = inventory.InventoryStore(config.inventory_db_path, GLYCOSHAPE_CSV)
 GLYCOSHAPE_RAWDATA_DIR = Path(config.glycoshape_rawdata_dir)
 GLYCOSHAPE_NEWDATA_DIR = Path(config.glycoshape_newdata_dir)
+# Folder names in both data directories, for /api/exist without listing them per request
+FOLDERS = folders.FolderIndex([('raw data', GLYCOSHAPE_RAWDATA_DIR), ('uploads', GLYCOSHAPE_NEWDATA_DIR)],
+                              check_interval=config.folder_index_interval)
 GLYCOSHAPE_UPLOAD_DIR = Path(config.glycoshape_upload_dir)
+# Uploaded contents are stored once by SHA-256 and hardlinked into GLYCOSHAPE_UPLOAD_DIR
+BLOBS = blobs.BlobStore(config.upload_blob_dir or GLYCOSHAPE_UPLOAD_DIR / '.blobs')
+# Chunked upload sessions write straight into GLYCOSHAPE_UPLOAD_DIR
+UPLOADS = uploads.UploadSessions(config.upload_sessions_db, BLOBS, ttl=config.upload_session_ttl)
+
+
+class UploadRequest(Request):
+    """Spools /api/upload files straight into the blob store, hashing them as the form is parsed."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.path == '/api/upload':
+            return BLOBS.spool()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+app.request_class = UploadRequest
 
 # Ensure upload directory exists
 ensure_directory_exists(GLYCOSHAPE_UPLOAD_DIR)
@@ -85,22 +147,11 @@ logger = logging.getLogger(__name__)
 
 # Define the path to the CSV file
 CSV_FILE_PATH = 'visitors.csv'
+# Visits live in SQLite; an existing visitors.csv is imported on first start
+VISITORS = visitors.VisitorStore(config.visitors_db_path, CSV_FILE_PATH)
 
-# Ensure the CSV file exists; if not, create it with headers
-if not os.path.exists(CSV_FILE_PATH):
-    # Create a new CSV file with headers (timestamp, ip_address, latitude, longitude)
-    pd.DataFrame(columns=['timestamp', 'ip_address', 'latitude', 'longitude']).to_csv(CSV_FILE_PATH, index=False)
-
-def get_geolocation(ip):
-    """Get geolocation for the given IP address using geocoder."""
-    try:
-        g = geocoder.ip(ip)
-        if g.ok:
-            return g.latlng  # Returns [latitude, longitude]
-        return None, None  # If no geolocation is found
-    except Exception as e:
-        print(f"Error getting geolocation for IP {ip}: {e}")
-        return None, None
+# Visits are logged right away and located by a background thread
+GEO = geolocation.Geolocator(VISITORS, geoip_path=config.geoip_db_path)
 
 @app.route('/api/log', methods=['GET'])
 def log_visitor():
@@ -114,24 +165,13 @@ def log_visitor():
     else:
         ip = request.remote_addr
 
-    # Log IP and timestamp
+    # Log IP and timestamp; coordinates come from memory or are filled in later
     timestamp = datetime.now()
-    print(f"Logging IP {ip} at {timestamp}")
-    print(get_geolocation(ip))
-    latitude, longitude = get_geolocation(ip)
-
-    
-    # Check if file exists, to write headers if not
-    file_exists = os.path.exists(CSV_FILE_PATH)
-
-    # Open the file in append mode
-    with open(CSV_FILE_PATH, 'a') as f:
-        # Write headers if the file is new
-        if not file_exists:
-            f.write("timestamp,ip_address,latitude,longitude\n")
-
-        # Write the new entry
-        f.write(f"{timestamp},{ip},{latitude},{longitude}\n")
+    location = GEO.cached(ip)
+    if location:
+        VISITORS.log(timestamp, ip, *location)
+    else:
+        GEO.submit(VISITORS.log(timestamp, ip), ip)
 
     # Create a response and set a cookie with 24-hour expiration
     response = make_response("Logged", 200)
@@ -140,104 +180,100 @@ def log_visitor():
 
 
 
+@app.route('/api/admin/geolocate', methods=['POST'])
+def geolocate_visitors():
+    """Locate previously logged visits that have no coordinates, in the background."""
+    data = request.get_json(silent=True) or {}
+    if validate_upload_key(data.get('upload_key')) != 'admin':
+        return jsonify({'error': 'Invalid upload key'}), 401
+    threading.Thread(target=GEO.backfill, kwargs={'limit': data.get('limit')}, daemon=True).start()
+    return jsonify({'message': 'Backfill started'}), 202
+
 @app.route('/api/visitors', methods=['GET'])
 def get_visitors():
-    """API to fetch the CSV data."""
+    """API to fetch the located visits."""
     try:
-        if os.path.exists(CSV_FILE_PATH):
-            # Read the CSV file manually to handle malformed rows
-            with open(CSV_FILE_PATH, 'r') as f:
-                lines = f.readlines()
-            
-            header = lines[0]
-            valid_lines = [header]
-            
-            # Filter lines with exactly 3 commas (4 fields)
-            for line in lines[1:]:
-                if line.count(',') == 3:
-                    valid_lines.append(line)
-            
-            # Create a temporary file with valid lines
-            with tempfile.NamedTemporaryFile(mode='w', delete=False) as tmp:
-                tmp.writelines(valid_lines)
-                tmp_path = tmp.name
-            
-            # Read the valid data with pandas
-            df = pd.read_csv(tmp_path)
-            os.unlink(tmp_path)  # Delete the temporary file
-            
-            # Drop the 'ip_address' column
-            if 'ip_address' in df.columns:
-                df = df.drop(columns=['ip_address'])
-            
-            # Convert 'None' strings to NaN and drop rows with NaN values
-            df = df.replace('None', pd.NA)
-            df = df.dropna()
-            
-            # Convert to list of dictionaries and return as JSON
-            visitor_data = df.to_dict(orient='records')
-            return jsonify(visitor_data)
-        else:
-            return jsonify({'error': 'CSV file not found'}), 404
+        return Response(VISITORS.visitors_json(), mimetype='application/json')
     except Exception as e:
         return jsonify({'error': f'Error processing visitor data: {str(e)}'}), 500
     
 
-with open(GLYCOSHAPE_DIR / 'GLYCOSHAPE.json', 'r') as file:
-    GDB_data = json.load(file)
-    print('Glycan database loaded')
+def warm_name_cache(snapshot):
+    """Seed the nomenclature cache with the identifiers of a freshly loaded database."""
+    n_cached = cache.warm_from_glycoshape(name.name_cache, snapshot.data)
+    print(f"Warmed name cache with {n_cached} entries")
+
+# GDB.snapshot is swapped atomically on reload; routes read it once per request
+GDB = database.Database(GLYCOSHAPE_DIR / 'GLYCOSHAPE.json', on_load=warm_name_cache)
+GDB.watch(config.gdb_reload_interval)
+print('Glycan database loaded')
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_database():
+    """Reload GLYCOSHAPE.json in the background without restarting workers."""
+    data = request.get_json(silent=True) or {}
+    if validate_upload_key(data.get('upload_key')) != 'admin':
+        return jsonify({'error': 'Invalid upload key'}), 401
+    GDB.reload_async(force=bool(data.get('force')))
+    return jsonify({'message': 'Reload started', 'version': GDB.snapshot.version}), 202
+
+def snapshot_not_modified(gdb):
+    """Return a 304 response if the client already has this snapshot's version, else None.
+
+    JSON routes answer purely from the snapshot, so its version is a valid
+    ETag for any of their URLs and its file mtime a valid Last-Modified.
+    The ETag is shared by every response, so only check it once the route
+    knows it is answering with a 200.
+    """
+    last_modified = datetime.fromtimestamp(gdb.mtime_ns / 1e9, timezone.utc)
+    if is_resource_modified(request.environ, etag=gdb.version, last_modified=last_modified):
+        return None
+    return snapshot_validators(Response(status=304), gdb)
+
+def snapshot_validators(response, gdb):
+    """Attach the snapshot's ETag, Last-Modified and Cache-Control to a response."""
+    response.set_etag(gdb.version)
+    response.last_modified = datetime.fromtimestamp(gdb.mtime_ns / 1e9, timezone.utc)
+    response.cache_control.public = True
+    response.cache_control.max_age = config.http_max_age
+    return response
 
 @app.route('/api/available', methods=['GET'])
 def get_available():
+    gdb = GDB.snapshot
+    not_modified = snapshot_not_modified(gdb)
+    if not_modified:
+        return not_modified
     glytoucan_list = []
-    for glycan_data in GDB_data.values():
+    for glycan_data in gdb.data.values():
             glytoucan_list.append(glycan_data['archetype']['glytoucan'])
             glytoucan_list.append(glycan_data['alpha']['glytoucan'])
             glytoucan_list.append(glycan_data['beta']['glytoucan'])
     glytoucan_list = [x for x in glytoucan_list if x is not None]
-    return jsonify(glytoucan_list)
+    return snapshot_validators(jsonify(glytoucan_list), gdb)
 
 @app.route('/api/exist/<identifier>', methods=['GET'])
 def is_exist(identifier):
     """
     Checks if a glycan identifier exists either as a raw/uploaded folder
-    or within the processed GlycoShape database (GDB_data).
+    or within the processed GlycoShape database (GDB snapshot).
     Accepts GLYCAM name, GlyTouCan ID, IUPAC, or WURCS.
     Includes checks via IUPAC/GLYCAM to WURCS conversion and alpha/beta WURCS generation.
     """
+    gdb = GDB.snapshot
     try:
         # 1. Check if the identifier corresponds to an existing raw data or upload folder
-        folder_path = GLYCOSHAPE_RAWDATA_DIR / identifier
-        folder2_path = GLYCOSHAPE_NEWDATA_DIR / identifier
-        if folder_path.is_dir() or folder2_path.is_dir():
+        if FOLDERS.exists(identifier):
             return jsonify({'exists': True, 'reason': 'Folder found'})
         # 1b. Check if a folder exists matching the identifier minus the last 5 characters
         # Only check for similar folders if identifier is not a GlyTouCan ID (GlyTouCan IDs are exactly 8 characters, alphanumeric)
         if len(identifier) > 5 and not (len(identifier) == 8):
-            base_identifier = identifier[:-5]
-            
-        
-            # Check raw data directory
-            if GLYCOSHAPE_RAWDATA_DIR.is_dir():
-                for folder in GLYCOSHAPE_RAWDATA_DIR.iterdir():
-                    if folder.is_dir() and len(folder.name) == len(identifier):
-                        # Check if the folder matches the base and only differs in the last 5 chars
-                        if folder.name.startswith(base_identifier) and folder.name != identifier:
-                            return jsonify({
-                                'exists': True,
-                                'reason': f'Similar folder found in raw data: {folder.name}'
-                            })
-            
-            # Check upload directory
-            if GLYCOSHAPE_NEWDATA_DIR.is_dir():
-                for folder in GLYCOSHAPE_NEWDATA_DIR.iterdir():
-                    if folder.is_dir() and len(folder.name) == len(identifier):
-                        # Check if the folder matches the base and only differs in the last 5 chars
-                        if folder.name.startswith(base_identifier) and folder.name != identifier:
-                            return jsonify({
-                                'exists': True,
-                                'reason': f'Similar folder found in uploads: {folder.name}'
-                            })
+            similar = FOLDERS.similar(identifier)
+            if similar:
+                return jsonify({
+                    'exists': True,
+                    'reason': f'Similar folder found in {similar[0]}: {similar[1]}'
+                })
 
         # 2. Prepare for conversions and WURCS checks
         identifier_lower = identifier.lower()
@@ -294,51 +330,45 @@ def is_exist(identifier):
         # Prepare lowercase version of converted WURCS for comparison
         converted_wurcs_lower = converted_wurcs.lower() if converted_wurcs else None
 
-        # 3. Check identifiers against the processed database (GDB_data)
-        for glycan_id, glycan_data in GDB_data.items():
-            archetype = glycan_data.get('archetype', {})
-            alpha = glycan_data.get('alpha', {})
-            beta = glycan_data.get('beta', {})
-
-            # --- Direct Identifier Checks ---
-            # GlyTouCan (case-sensitive)
-            if archetype.get('glytoucan') == identifier: return jsonify({'exists': True, 'reason': 'GlyTouCan Match (Archetype)', 'glytoucan': identifier, 'ID': archetype.get('ID')})
-            if alpha.get('glytoucan') == identifier: return jsonify({'exists': True, 'reason': 'GlyTouCan Match (Alpha)', 'glytoucan': identifier, 'ID': archetype.get('ID')})
-            if beta.get('glytoucan') == identifier: return jsonify({'exists': True, 'reason': 'GlyTouCan Match (Beta)', 'glytoucan': identifier, 'ID': archetype.get('ID')})
-
-            # IUPAC (case-insensitive)
-            if archetype.get('iupac') and archetype.get('iupac').lower() == identifier_lower: return jsonify({'exists': True, 'reason': 'IUPAC Match (Archetype)', 'glytoucan': archetype.get('glytoucan'), 'ID': archetype.get('ID')})
-            if alpha.get('iupac') and alpha.get('iupac').lower() == identifier_lower: return jsonify({'exists': True, 'reason': 'IUPAC Match (Alpha)', 'glytoucan': alpha.get('glytoucan'), 'ID': archetype.get('ID')})
-            if beta.get('iupac') and beta.get('iupac').lower() == identifier_lower: return jsonify({'exists': True, 'reason': 'IUPAC Match (Beta)', 'glytoucan': beta.get('glytoucan'), 'ID': archetype.get('ID')})
-
-            # GLYCAM (case-insensitive) - Check archetype only as GLYCAM name usually refers to the base structure
-            if archetype.get('glycam') and archetype.get('glycam').lower() == identifier_lower: return jsonify({'exists': True, 'reason': 'GLYCAM Match (Archetype)', 'glytoucan': archetype.get('glytoucan'), 'ID': archetype.get('ID')})
-
-            # --- WURCS Checks (case-insensitive) ---
-            # Get lowercase WURCS from DB, handling missing keys/values
-            db_archetype_wurcs = archetype.get('wurcs', '').lower() if archetype.get('wurcs') else None
-            db_alpha_wurcs = alpha.get('wurcs', '').lower() if alpha.get('wurcs') else None
-            db_beta_wurcs = beta.get('wurcs', '').lower() if beta.get('wurcs') else None
-
-            # Check input WURCS (if identifier was WURCS)
-            if input_wurcs_lower:
-                if db_archetype_wurcs == input_wurcs_lower: return jsonify({'exists': True, 'reason': 'Input WURCS Match (Archetype)', 'glytoucan': archetype.get('glytoucan'), 'ID': archetype.get('ID')})
-                if db_alpha_wurcs == input_wurcs_lower: return jsonify({'exists': True, 'reason': 'Input WURCS Match (Alpha)', 'glytoucan': alpha.get('glytoucan'), 'ID': archetype.get('ID')})
-                if db_beta_wurcs == input_wurcs_lower: return jsonify({'exists': True, 'reason': 'Input WURCS Match (Beta)', 'glytoucan': beta.get('glytoucan'), 'ID': archetype.get('ID')})
-
-            # Check converted WURCS (lowercase comparison)
-            if converted_wurcs_lower:
-                if db_archetype_wurcs == converted_wurcs_lower: return jsonify({'exists': True, 'reason': f'Converted {conversion_type} to WURCS Match (Archetype)', 'glytoucan': archetype.get('glytoucan'), 'ID': archetype.get('ID')})
-                if db_alpha_wurcs == converted_wurcs_lower: return jsonify({'exists': True, 'reason': f'Converted {conversion_type} to WURCS Match (Alpha)', 'glytoucan': alpha.get('glytoucan'), 'ID': archetype.get('ID')})
-                if db_beta_wurcs == converted_wurcs_lower: return jsonify({'exists': True, 'reason': f'Converted {conversion_type} to WURCS Match (Beta)', 'glytoucan': beta.get('glytoucan'), 'ID': archetype.get('ID')})
-
-            # Check generated alpha WURCS against DB alpha WURCS
-            if generated_alpha_wurcs and db_alpha_wurcs == generated_alpha_wurcs:
-                 return jsonify({'exists': True, 'reason': f'Generated Alpha WURCS Match (Alpha)', 'glytoucan': alpha.get('glytoucan'), 'ID': archetype.get('ID')})
-
-            # Check generated beta WURCS against DB beta WURCS
-            if generated_beta_wurcs and db_beta_wurcs == generated_beta_wurcs:
-                 return jsonify({'exists': True, 'reason': f'Generated Beta WURCS Match (Beta)', 'glytoucan': beta.get('glytoucan'), 'ID': archetype.get('ID')})
+        # 3. Check identifiers against the processed database (GDB snapshot)
+        def found(reason, entry, variant, glytoucan=None):
+            return jsonify({'exists': True, 'reason': f'{reason} ({variant.capitalize()})',
+                            'glytoucan': glytoucan or entry[variant].get('glytoucan'),
+                            'ID': entry['archetype'].get('ID')})
+
+        # --- Direct Identifier Checks ---
+        # GlyTouCan (case-sensitive)
+        entry, variant = database.lookup(gdb.index, 'glytoucan', identifier)
+        if entry: return found('GlyTouCan Match', entry, variant, identifier)
+
+        # IUPAC (case-insensitive)
+        entry, variant = database.lookup(gdb.index, 'iupac_lower', identifier_lower)
+        if entry: return found('IUPAC Match', entry, variant)
+
+        # GLYCAM (case-insensitive) - Check archetype only as GLYCAM name usually refers to the base structure
+        entry, variant = database.lookup(gdb.index, 'glycam_lower', identifier_lower, ('archetype',))
+        if entry: return found('GLYCAM Match', entry, variant)
+
+        # --- WURCS Checks (case-insensitive) ---
+        # Check input WURCS (if identifier was WURCS)
+        if input_wurcs_lower:
+            entry, variant = database.lookup(gdb.index, 'wurcs_lower', input_wurcs_lower)
+            if entry: return found('Input WURCS Match', entry, variant)
+
+        # Check converted WURCS (lowercase comparison)
+        if converted_wurcs_lower:
+            entry, variant = database.lookup(gdb.index, 'wurcs_lower', converted_wurcs_lower)
+            if entry: return found(f'Converted {conversion_type} to WURCS Match', entry, variant)
+
+        # Check generated alpha WURCS against DB alpha WURCS
+        if generated_alpha_wurcs:
+            entry, variant = database.lookup(gdb.index, 'wurcs_lower', generated_alpha_wurcs, ('alpha',))
+            if entry: return found('Generated Alpha WURCS Match', entry, variant)
+
+        # Check generated beta WURCS against DB beta WURCS
+        if generated_beta_wurcs:
+            entry, variant = database.lookup(gdb.index, 'wurcs_lower', generated_beta_wurcs, ('beta',))
+            if entry: return found('Generated Beta WURCS Match', entry, variant)
 
         # 4. If not found after all checks
         return jsonify({'exists': False, 'reason': 'Identifier not found'})
@@ -350,88 +380,84 @@ def is_exist(identifier):
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
 
+@app.route('/api/resolve', methods=['POST'])
+def resolve_identifiers():
+    """
+    Resolves a batch of mixed identifiers (GlycoShape ID, GlyTouCan, IUPAC,
+    GLYCAM, WURCS) against the in-memory database in one request.
+    Body: {"identifiers": [...], "full": false} or a bare JSON list.
+    Results are streamed as a JSON array in input order; "full" adds each
+    matched entry as /api/glycan returns it.
+    """
+    data = request.get_json(silent=True)
+    identifiers = data.get('identifiers') if isinstance(data, dict) else data
+    if not isinstance(identifiers, list):
+        return jsonify({'error': 'Expected a JSON list of identifiers or {"identifiers": [...]}'}), 400
+    if len(identifiers) > config.resolve_batch_max:
+        return jsonify({'error': f'At most {config.resolve_batch_max} identifiers per request'}), 413
+    full = isinstance(data, dict) and bool(data.get('full'))
+
+    gdb = GDB.snapshot
+
+    def resolve_one(identifier):
+        if not isinstance(identifier, str):
+            return {'identifier': identifier, 'found': False, 'error': 'Identifier must be a string'}
+        entry, variant, match = database.resolve_any(gdb.index, identifier)
+        if entry is None:
+            return {'identifier': identifier, 'found': False}
+        result = {'identifier': identifier, 'found': True, 'match': match, 'variant': variant,
+                  'ID': entry['archetype'].get('ID'), 'glytoucan': (entry.get(variant) or {}).get('glytoucan')}
+        if full:
+            result['entry'] = entry
+        return result
+
+    def generate():
+        buffer = ['[']
+        for i, identifier in enumerate(identifiers):
+            buffer.append((',' if i else '') + json.dumps(resolve_one(identifier)))
+            # Flush in batches rather than one tiny write per identifier
+            if len(buffer) >= 256:
+                yield ''.join(buffer)
+                buffer = []
+        buffer.append(']')
+        yield ''.join(buffer)
+
+    return Response(generate(), mimetype='application/json')
+
+
 @app.route('/api/glycan/<identifier>', methods=['GET'])
 def get_glycan(identifier):
-    # First check if it's a direct glycan ID match
-    for glycan_id, glycan_data in GDB_data.items():
-        if glycan_id == identifier:
-            return jsonify(glycan_data)
-        
-    # Check for glytoucan ID match
-    for glycan_id, glycan_data in GDB_data.items():
-        if (glycan_data['archetype']['glytoucan'] == identifier or 
-            glycan_data['alpha']['glytoucan'] == identifier or 
-            glycan_data['beta']['glytoucan'] == identifier):
-            return jsonify(glycan_data)
-    
-    # Check for IUPAC match (if the identifier contains parentheses, likely an IUPAC notation)
-    if "(" in identifier:
-        for glycan_id, glycan_data in GDB_data.items():
-            if (glycan_data['archetype'].get('iupac') == identifier or 
-                glycan_data['alpha'].get('iupac') == identifier or 
-                glycan_data['beta'].get('iupac') == identifier):
-                return jsonify(glycan_data)
+    gdb = GDB.snapshot
+    # Direct glycan ID, then GlyTouCan ID, then IUPAC (if the identifier contains parentheses)
+    glycan_data, _ = database.resolve(gdb.index, identifier, iupac="(" in identifier)
+    if glycan_data:
+        # Only a hit may be revalidated; a miss must stay a 404 whatever ETag the client holds
+        not_modified = snapshot_not_modified(gdb)
+        if not_modified:
+            return not_modified
+        return snapshot_validators(jsonify(glycan_data), gdb)
     
     return jsonify({"error": "Glycan not found"}), 404
 
 @app.route('/api/pdb/<identifier>', methods=['GET'])
 def get_pdb(identifier):
-    glycoshape_entry = None
-    is_alpha = False
-    is_beta = False
-    is_archetype = False
-    
-    # First check if it's a direct glycan ID match
-    for glycan_id, glycan_data in GDB_data.items():
-        if glycan_id == identifier:
-            glycoshape_entry = glycan_data['archetype']['ID']
-            is_archetype = True
-            break
-    
-    # If not found by ID, check for glytoucan ID match
-    if not glycoshape_entry:
-        for glycan_id, glycan_data in GDB_data.items():
-            if glycan_data['alpha']['glytoucan'] == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_alpha = True
-                break
-            elif glycan_data['beta']['glytoucan'] == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_beta = True
-                break
-            elif glycan_data['archetype']['glytoucan'] == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_archetype = True
-                break
-    
-    # Check for IUPAC match (if the identifier contains parentheses, likely an IUPAC notation)
-    if not glycoshape_entry and "(" in identifier:
-        for glycan_id, glycan_data in GDB_data.items():
-            if glycan_data.get('archetype', {}).get('iupac') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_archetype = True
-                break
-            elif glycan_data.get('alpha', {}).get('iupac') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_alpha = True
-                break
-            elif glycan_data.get('beta', {}).get('iupac') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_beta = True
-                break
+    # Direct glycan ID, then GlyTouCan ID, then IUPAC (if the identifier contains parentheses)
+    glycan_data, variant = database.resolve(GDB.snapshot.index, identifier, iupac="(" in identifier)
+    glycoshape_entry = glycan_data['archetype']['ID'] if glycan_data else None
+    is_beta = variant == 'beta'
     
     if glycoshape_entry:
-        if is_alpha or is_archetype:
+        if not is_beta:
             pdb_file_path = GLYCOSHAPE_DIR / f'{glycoshape_entry}/PDB_format_ATOM/cluster0_alpha.PDB.pdb'
             alt_file_path = GLYCOSHAPE_DIR / f'{glycoshape_entry}/PDB_format_ATOM/cluster0_beta.PDB.pdb'
-        elif is_beta:
+        else:
             pdb_file_path = GLYCOSHAPE_DIR / f'{glycoshape_entry}/PDB_format_ATOM/cluster0_beta.PDB.pdb'
             alt_file_path = GLYCOSHAPE_DIR / f'{glycoshape_entry}/PDB_format_ATOM/cluster0_alpha.PDB.pdb'
         
         if pdb_file_path.exists():
-            return send_file(pdb_file_path, as_attachment=True)
+            return send_file(pdb_file_path, as_attachment=True, max_age=config.http_max_age)
         elif alt_file_path.exists():
-            return send_file(alt_file_path, as_attachment=True)
+            return send_file(alt_file_path, as_attachment=True, max_age=config.http_max_age)
         else:
             return jsonify({"error": "PDB file not found"}), 404
             
@@ -439,62 +465,23 @@ def get_pdb(identifier):
 
 @app.route('/api/glycam/<identifier>', methods=['GET'])
 def get_glycam_pdb(identifier):
-    glycoshape_entry = None
-    is_alpha = False
-    is_beta = False
-    is_archetype = False
-    
-    # First check if it's a direct glycan ID match
-    for glycan_id, glycan_data in GDB_data.items():
-        if glycan_id == identifier:
-            glycoshape_entry = glycan_data['archetype']['ID']
-            is_archetype = True
-            break
-    
-    # If not found by ID, check for glytoucan ID match
-    if not glycoshape_entry:
-        for glycan_id, glycan_data in GDB_data.items():
-            if glycan_data['alpha']['glytoucan'] == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_alpha = True
-                break
-            elif glycan_data['beta']['glytoucan'] == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_beta = True
-                break
-            elif glycan_data['archetype']['glytoucan'] == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_archetype = True
-                break
-    
-    # Check for IUPAC match (if the identifier contains parentheses, likely an IUPAC notation)
-    if not glycoshape_entry and "(" in identifier:
-        for glycan_id, glycan_data in GDB_data.items():
-            if glycan_data.get('archetype', {}).get('iupac') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_archetype = True
-                break
-            elif glycan_data.get('alpha', {}).get('iupac') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_alpha = True
-                break
-            elif glycan_data.get('beta', {}).get('iupac') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                is_beta = True
-                break
+    # Direct glycan ID, then GlyTouCan ID, then IUPAC (if the identifier contains parentheses)
+    glycan_data, variant = database.resolve(GDB.snapshot.index, identifier, iupac="(" in identifier)
+    glycoshape_entry = glycan_data['archetype']['ID'] if glycan_data else None
+    is_beta = variant == 'beta'
     
     if glycoshape_entry:
-        if is_alpha or is_archetype:
+        if not is_beta:
             pdb_file_path = GLYCOSHAPE_DIR / f'{glycoshape_entry}/GLYCAM_format_HETATM/cluster0_alpha.GLYCAM.pdb'
             alt_file_path = GLYCOSHAPE_DIR / f'{glycoshape_entry}/GLYCAM_format_HETATM/cluster0_beta.GLYCAM.pdb'
-        elif is_beta:
+        else:
             pdb_file_path = GLYCOSHAPE_DIR / f'{glycoshape_entry}/GLYCAM_format_HETATM/cluster0_beta.GLYCAM.pdb'
             alt_file_path = GLYCOSHAPE_DIR / f'{glycoshape_entry}/GLYCAM_format_HETATM/cluster0_alpha.GLYCAM.pdb'
         
         if pdb_file_path.exists():
-            return send_file(pdb_file_path, as_attachment=True)
+            return send_file(pdb_file_path, as_attachment=True, max_age=config.http_max_age)
         elif alt_file_path.exists():
-            return send_file(alt_file_path, as_attachment=True)
+            return send_file(alt_file_path, as_attachment=True, max_age=config.http_max_age)
         else:
             return jsonify({"error": "PDB file not found"}), 404
             
@@ -503,44 +490,14 @@ def get_glycam_pdb(identifier):
 
 @app.route('/api/svg/<identifier>', methods=['GET'])
 def get_svg(identifier):
-    glycoshape_entry = None
-    
-    # First check if it's a direct glycan ID match
-    for glycan_id, glycan_data in GDB_data.items():
-        if glycan_id == identifier:
-            glycoshape_entry = glycan_data['archetype']['ID']
-            break
-    
-    # If not found by ID, check for glytoucan ID match
-    if not glycoshape_entry:
-        for glycan_id, glycan_data in GDB_data.items():
-            if glycan_data['alpha']['glytoucan'] == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                break
-            elif glycan_data['beta']['glytoucan'] == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                break
-            elif glycan_data['archetype']['glytoucan'] == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                break
-    
-    # Check for IUPAC match (if the identifier contains parentheses, likely an IUPAC notation)
-    if not glycoshape_entry and "(" in identifier:
-        for glycan_id, glycan_data in GDB_data.items():
-            if glycan_data.get('archetype', {}).get('iupac') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                break
-            elif glycan_data.get('alpha', {}).get('iupac') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                break
-            elif glycan_data.get('beta', {}).get('iupac') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                break
+    # Direct glycan ID, then GlyTouCan ID, then IUPAC (if the identifier contains parentheses)
+    glycan_data, _ = database.resolve(GDB.snapshot.index, identifier, iupac="(" in identifier)
+    glycoshape_entry = glycan_data['archetype']['ID'] if glycan_data else None
     
     if glycoshape_entry:
         svg_file_path = GLYCOSHAPE_DIR / f'{glycoshape_entry}/snfg.svg'
         if svg_file_path.exists():
-            return send_file(svg_file_path, as_attachment=True)
+            return send_file(svg_file_path, as_attachment=True, max_age=config.http_max_age)
         else:
             return jsonify({"error": "SVG file not found"}), 404
             
@@ -553,21 +510,36 @@ def serve_file(filepath):
         safe_path = os.path.normpath(filepath)
         full_path = GLYCOSHAPE_DIR / safe_path
         if os.path.isfile(full_path):
-            return send_file(full_path, as_attachment=True)
+            return send_file(full_path, as_attachment=True, max_age=config.http_max_age)
         else:
             return jsonify({"error": "File not found"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# SNFG renders, shared between workers through the on-disk tier
+draw_cache = cache.FileCache(config.draw_cache_dir, max_items=512, suffix='.svg', max_bytes=config.draw_cache_bytes)
+
+def draw_response(glycan, motif=None):
+    """Render (or fetch) an SNFG SVG and answer with a strong ETag."""
+    try:
+        canonical = canonicalize_iupac(glycan)
+    except Exception:
+        canonical = glycan
+    options = {'show_linkage': True}
+    if motif:
+        options['highlight_motif'] = motif
+    svg, etag = draw_cache.get_or_create(
+        (canonical, motif, sorted(options.items())),
+        lambda path: GlycoDraw(glycan, filepath=path, **options))
+    response = Response(svg, mimetype='image/svg+xml')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response.make_conditional(request)
+
 @app.route('/api/draw/<iupac>', methods=['GET'])
 def get_glycowork(iupac):
     try:
-        with tempfile.NamedTemporaryFile(suffix='.svg', delete=False) as tmp:
-            temp_path = tmp.name
-            GlycoDraw(iupac, show_linkage=True, filepath=temp_path)
-            response = send_file(temp_path, mimetype='image/svg+xml')
-            os.remove(temp_path)  # Clean up temp file after sending
-            return response
+        return draw_response(iupac)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -576,12 +548,7 @@ def get_glycowork_with_motif(glycan, motif):
     try:
         if len(motif)== 8:
             motif = name.glytoucan2iupac(motif)
-        with tempfile.NamedTemporaryFile(suffix='.svg', delete=False) as tmp:
-            temp_path = tmp.name
-            GlycoDraw(glycan, highlight_motif=motif, show_linkage=Flask, filepath=temp_path)
-            response = send_file(temp_path, mimetype='image/svg+xml')
-            os.remove(temp_path)
-            return response
+        return draw_response(glycan, motif)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -607,20 +574,28 @@ def zip_directory(folder_path, zip_path):
                 zipf.write(file_path, os.path.relpath(file_path, folder_path))
 
 
-def GOTW_process(url: str):
+def GOTW_process(url: str, zip_path, progress=None):
     """
     Process a given URL for GOTW data, extract and process files, and generate output.
     Uses robust download mechanism with retries and resume support.
 
+    All intermediate files live in one temporary directory that is removed
+    on return; only the result archive is kept.
+
     Args:
         url (str): URL to the zip file.
+        zip_path (str or Path): Where the result archive is written.
+        progress (callable): Optional progress(stage, **info) callback of a GOTW job.
 
     Returns:
-        tuple: Path to the result directory and the glycam name.
+        tuple: Path to the result archive and the glycam name.
     """
     zip_file_path = None
+    if progress is None:
+        progress = lambda stage, **info: None
     try:
         print("Starting GOTW process...")
+        progress('download')
         
         # Configure a session with retry logic
         session = requests.Session()
@@ -628,78 +603,28 @@ def GOTW_process(url: str):
             total=3,
             backoff_factor=1.5,
             status_forcelist=[500, 502, 503, 504, 408, 429],
-            allowed_methods=["GET"]
+            allowed_methods=["HEAD", "GET"]
         )
         adapter = HTTPAdapter(max_retries=retry_strategy)
         session.mount("http://", adapter)
         session.mount("https://", adapter)
 
-        # Create a temp file for the zip download that persists until we're done with it
-        with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as zip_file:
-            zip_file_path = zip_file.name
-
-        print(f"Created temp file: {zip_file_path}")
-
-        # Check if we have a partial download already
-        resume_position = 0
-        if os.path.exists(zip_file_path):
-            resume_position = os.path.getsize(zip_file_path)
-            print(f"Partial download found. Resuming from byte {resume_position}")
-
-        headers = {}
-        if resume_position > 0:
-            headers["Range"] = f"bytes={resume_position}-"
-        else:
-            headers["Range"] = "bytes=0-"
-
-        print(f"Making request to: {url}")
-        response = session.get(
-            url,
-            stream=True,
-            timeout=(10, 60),
-            headers=headers
-        )
-        response.raise_for_status()
-
-        total_size = 0
-        if "Content-Range" in response.headers:
-            content_range = response.headers.get("Content-Range", "")
-            total_size_match = content_range.split("/")[-1]
-            if total_size_match.isdigit():
-                total_size = int(total_size_match)
-        elif "Content-Length" in response.headers:
-            if resume_position > 0:
-                total_size = resume_position + int(response.headers.get("Content-Length", 0))
-            else:
-                total_size = int(response.headers.get("Content-Length", 0))
-
-        print(f"Total size: {total_size}")
-
-        file_mode = "ab" if resume_position > 0 else "wb"
-        with open(zip_file_path, file_mode) as f:
-            bytes_written = resume_position
-            for chunk in response.iter_content(chunk_size=512 * 1024):
-                if chunk:
-                    f.write(chunk)
-                    bytes_written += len(chunk)
-                    print(f"Downloaded {bytes_written} bytes of {total_size if total_size > 0 else 'unknown size'}")
-
+        # Reuse a cached copy of this project zip, or resume a partial download of it
+        zip_file = download.fetch(url, config.gotw_download_dir, session, progress)
+        zip_file_path = zip_file.name
+        download.prune(config.gotw_download_dir, config.gotw_download_cache_bytes)
         print("Download completed. Starting extraction...")
 
-        if total_size > 0 and bytes_written != total_size:
-            raise ValueError(
-                f"Download incomplete: {bytes_written} bytes received, "
-                f"expected {total_size} bytes"
-            )
-
         # --- Everything below is now inside a single tempdir context ---
         with tempfile.TemporaryDirectory() as tmpdir:
             print(f"Created temp directory: {tmpdir}")
             
             # Extract the zip file
             print("Extracting zip file...")
-            with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-                zip_ref.extractall(tmpdir)
+            with zip_file:
+                progress('extract', bytes=os.fstat(zip_file.fileno()).st_size)
+                with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+                    zip_ref.extractall(tmpdir)
             print("Extraction completed.")
 
             glycan_name = None
@@ -731,15 +656,15 @@ def GOTW_process(url: str):
                 return None, None
 
             print("Starting to process files in Requested_Builds...")
-            processed_count = 0
-            
+            builds = []
+
             for root, dirs, files in os.walk(requested_builds_dir):
+                dirs.sort()  # walk in a stable order so the merged output is deterministic
                 print(f"Processing directory: {root}")
                 print(f"Files found: {files}")
                 
                 if "structure.off" in files and "structure.pdb" in files:
                     print("Found structure files, processing...")
-                    processed_count += 1
                     
                     json_file = os.path.join(root, "info.json")
                     off_file = os.path.join(root, "structure.off")
@@ -758,35 +683,67 @@ def GOTW_process(url: str):
                         else:
                             glycan_name = glycam
                         conformer_id = data.get("conformerID", "output")
-                        
-                        print(f"Processing with GOTW_script: {glycan_name}/{conformer_id}")
-                        output_folder_path = GOTW_script.process_app(f'{glycan_name}/{conformer_id}', pdb_file, off_file, 200)
-                        print(f"GOTW_script completed: {output_folder_path}")
-
-                        # Move the processed folder to the temp output directory
-                        processed_subfolder = Path(output_folder_path)
-                        target_subfolder = Path(tmpdir) / processed_subfolder.name
-                        shutil.move(processed_subfolder, target_subfolder)
-                        shutil.move(json_file, target_subfolder / "info.json")
-                        print(f"Moved processed folder to: {target_subfolder}")
+                        builds.append((f'{glycan_name}/{conformer_id}', pdb_file, off_file, json_file))
                     else:
                         print(f"info.json not found in {root}")
 
-            print(f"Processed {processed_count} structures")
+            # Conformers are independent: build them in parallel, each in its own working directory.
+            # The heavy lifting happens in tleap/acpype subprocesses, so threads are enough, and
+            # no child process re-imports this module with its database and job threads
+            workers = min(len(builds), len(os.sched_getaffinity(0))) or 1
+            print(f"Building {len(builds)} conformers with {workers} processes")
+            progress('build', conformers=len(builds), conformers_done=0)
+            work_root = Path(tmpdir) / "_work"
+            outputs, errors = {}, {}
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gotw-build') as pool:
+                futures = {
+                    pool.submit(GOTW_script.build_conformer, folder_name, pdb_file, off_file, 200, str(work_root / str(i))): i
+                    for i, (folder_name, pdb_file, off_file, _) in enumerate(builds)
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        outputs[i] = future.result()
+                        print(f"GOTW_script completed: {outputs[i]}")
+                    except Exception as e:
+                        errors[builds[i][0]] = str(e)
+                        print(f"GOTW_script failed for {builds[i][0]}: {e}")
+                    progress('build', conformers=len(builds), conformers_done=len(outputs) + len(errors))
+
+            # Merge in submission order, whatever order the builds finished in
+            result_root = Path(tmpdir) / "_result"
+            result_root.mkdir()
+            processed_count = 0
+            for i, (folder_name, _, _, json_file) in enumerate(builds):
+                if i not in outputs:
+                    continue
+                processed_subfolder = Path(outputs[i])
+                target_subfolder = result_root / processed_subfolder.name
+                shutil.move(processed_subfolder, target_subfolder)
+                shutil.move(json_file, target_subfolder / "info.json")
+                print(f"Moved processed folder to: {target_subfolder}")
+                processed_count += 1
+            shutil.rmtree(work_root, ignore_errors=True)
+
+            if errors:
+                with open(result_root / "errors.json", 'w') as f:
+                    json.dump(errors, f, indent=2)
+            if builds and not processed_count:
+                print("All conformer builds failed.")
+                return None, None
 
-            # Remove the original extracted folder to avoid including it in the final zip
-            print("Removing original extracted folder...")
-            shutil.rmtree(puuid_folder)
+            print(f"Processed {processed_count} structures")
 
-            # Create a new temp directory for the final result
-            print("Creating final result directory...")
-            result_dir = tempfile.mkdtemp()
-            # Copy only the processed folders to the result directory
-            shutil.copytree(tmpdir, result_dir, dirs_exist_ok=True)
+            # Zip the processed folders straight into the archive; the tempdir goes away on return
+            progress('archive')
+            zip_path = Path(zip_path)
+            partial_path = zip_path.with_name(zip_path.name + ".part")
+            zip_directory(result_root, partial_path)
+            os.replace(partial_path, zip_path)
 
-            print(f"Final result directory: {result_dir}")
-            # Return the final result directory and glycam name
-            return Path(result_dir), glycan_name
+            print(f"Result archive: {zip_path}")
+            # Return the result archive and glycam name
+            return zip_path, glycan_name
 
     except requests.exceptions.RequestException as e:
         print(f"Network error: {e}")
@@ -804,13 +761,25 @@ def GOTW_process(url: str):
         import traceback
         traceback.print_exc()
         return None, None
-    finally:
-        if zip_file_path and os.path.exists(zip_file_path):
-            try:
-                os.remove(zip_file_path)
-                print(f"Cleaned up temp file: {zip_file_path}")
-            except Exception as e:
-                print(f"Failed to remove temporary file {zip_file_path}: {e}")
+
+def run_gotw_job(job_id, params, progress):
+    """Job handler: build the GOTW systems for a GLYCAM project URL and zip them."""
+    job_dir = Path(config.gotw_jobs_dir) / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    zip_path, name = GOTW_process(params['url'], job_dir / "result.zip", progress)
+    if not zip_path:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise RuntimeError("Failed to process the URL")
+    return {'artifact': str(zip_path), 'filename': f"{name}.zip"}
+
+def purge_gotw_jobs():
+    """Forget finished GOTW jobs past their retention and delete their archives."""
+    for job_id in GOTW_JOBS.purge(config.gotw_result_ttl):
+        shutil.rmtree(Path(config.gotw_jobs_dir) / job_id, ignore_errors=True)
+
+# GOTW builds run as persistent jobs; at most gotw_max_running at once on the host
+GOTW_JOBS = jobs.JobQueue(config.gotw_jobs_db, run_gotw_job, workers=1, max_running=config.gotw_max_running)
+GOTW_JOBS.start()
 
 @app.route('/api/gotw', methods=['POST'])
 def gotw():
@@ -819,25 +788,47 @@ def gotw():
     if not url:
         return jsonify({"error": "URL is required"}), 400
 
-    output_folder_path, name = GOTW_process(url)
-
-    if not output_folder_path:
-        return jsonify({"error": "Failed to process the URL"}), 500
-
-    with tempfile.TemporaryDirectory() as tmpdir:
-        zip_path = os.path.join(tmpdir, f"{name}.zip")
-        zip_directory(output_folder_path, zip_path)
-        response = send_file(zip_path, as_attachment=True, download_name=f"{name}.zip")
-        response.headers["Content-Disposition"] = f"attachment; filename={name}.zip"
-        response.headers["X-Filename"] = f"{name}.zip"
-        response.headers["Access-Control-Expose-Headers"] = "Content-Disposition, X-Filename"
-        return response
+    job_id = GOTW_JOBS.submit({'url': url})
+    purge_gotw_jobs()
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/gotw/{job_id}",
+        "result_url": f"/api/gotw/{job_id}/result",
+    }), 202
+
+@app.route('/api/gotw/<job_id>', methods=['GET'])
+def gotw_status(job_id):
+    job = GOTW_JOBS.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    job.pop('result')
+    return jsonify(job)
+
+@app.route('/api/gotw/<job_id>/result', methods=['GET'])
+def gotw_result(job_id):
+    job = GOTW_JOBS.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] == 'failed':
+        return jsonify({"error": job['error'] or "Failed to process the URL"}), 500
+    if job['status'] != 'done':
+        return jsonify({"error": "Job not finished", "status": job['status'], "stage": job['stage']}), 409
+
+    if not os.path.exists(job['result']['artifact']):
+        return jsonify({"error": "Result archive is no longer available"}), 410
+
+    filename = job['result']['filename']
+    response = send_file(job['result']['artifact'], as_attachment=True, download_name=filename)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    response.headers["X-Filename"] = filename
+    response.headers["Access-Control-Expose-Headers"] = "Content-Disposition, X-Filename"
+    return response
 
 
 @app.route('/api/submit', methods=['POST'])
 def submit_form():
     downloadLocation = GLYCOSHAPE_NEWDATA_DIR
-    csvLocation = GLYCOSHAPE_CSV
 
     try:
         # Retrieve form data
@@ -859,6 +850,7 @@ def submit_form():
 
         if not os.path.exists(glycam_folder):
             os.makedirs(glycam_folder)
+            FOLDERS.invalidate()
 
         # Save the simulation file with glycamName as the filename and original extension
         if simulation_file.filename != '':
@@ -883,9 +875,6 @@ def submit_form():
             info_file_path = os.path.join(glycam_folder, info_filename)
             info_file.save(info_file_path)
 
-        # Load the existing CSV file using pandas
-        csv_data = pd.read_csv(csvLocation)
-
         # Prepare new data in the same structure as the CSV
         new_data = {
             'ID': '',
@@ -903,12 +892,8 @@ def submit_form():
             'What is the GlyTouCan ID of the glycan?': form_data.get('glyTouCanID', '')
         }
 
-        # Convert the new data to a DataFrame and append it to the existing data
-        new_df = pd.DataFrame([new_data])
-        updated_csv_data = pd.concat([csv_data, new_df], ignore_index=True)
-
-        # Save the updated DataFrame back to the CSV file
-        updated_csv_data.to_csv(csvLocation, index=False)
+        # Append to the inventory store, which also adds the row to the CSV view
+        INVENTORY.append(new_data)
 
         return jsonify({
             'message': 'Files uploaded and form data saved successfully',
@@ -958,221 +943,23 @@ def is_glycam(identifier):
 
 @app.route('/api/search', methods=['POST'])
 def search():
+    gdb = GDB.snapshot
     search_result = []
     data = request.get_json()
     search_string = data['search_string']
     search_type = data.get('search_type', None)
 
-    if search_string == 'all':
-        for _, glycan_data in GDB_data.items():
-            entry = {
-                'glytoucan': glycan_data['archetype']['glytoucan'],
-                'ID': glycan_data['archetype']['ID'],
-                'mass': glycan_data['archetype']['mass']
-            }
-            search_result.append(entry)
-        return jsonify({'search_string': search_string, 'results': search_result})
-    elif search_string == "N-Glycans":
-        for _, glycan_data in GDB_data.items():
-            if glycan_data['archetype']['iupac'] and (glycan_data['archetype']['iupac'].endswith('Man(b1-4)GlcNAc(b1-4)GlcNAc') or glycan_data['archetype']['iupac'].endswith('Man(b1-4)GlcNAc(b1-4)[Fuc(a1-6)]GlcNAc')):
-                entry = {
-                    'glytoucan': glycan_data['archetype']['glytoucan'],
-                    'ID': glycan_data['archetype']['ID'],
-                    'mass': glycan_data['archetype']['mass']
-                }
-                search_result.append(entry)
-        return jsonify({'search_string': search_string, 'results': search_result})
-    
-    elif search_string == "O-Glycans":
-        for _, glycan_data in GDB_data.items():
-            # O-glycans typically have GalNAc at the reducing end
-            # Check for common O-glycan patterns: core 1-4 structures
-            if glycan_data['archetype']['iupac'] and (
-                # Check for GalNAc at the reducing end - common in all O-glycans
-                glycan_data['archetype']['iupac'].endswith('GalNAc') or 
-                # Core 1 (T antigen) and extensions
-                'Gal(b1-3)GalNAc' in glycan_data['archetype']['iupac'] or
-                # Core 2 and extensions
-                'GlcNAc(b1-6)[Gal(b1-3)]GalNAc' in glycan_data['archetype']['iupac'] or
-                # Core 3 and extensions
-                'GlcNAc(b1-3)GalNAc' in glycan_data['archetype']['iupac'] or
-                # Core 4 and extensions
-                'GlcNAc(b1-6)[GlcNAc(b1-3)]GalNAc' in glycan_data['archetype']['iupac']
-            ):
-                entry = {
-                    'glytoucan': glycan_data['archetype']['glytoucan'],
-                    'ID': glycan_data['archetype']['ID'],
-                    'mass': glycan_data['archetype']['mass']
-                }
-                search_result.append(entry)
-        return jsonify({'search_string': search_string, 'results': search_result})
-
-    elif search_string == "GAGs":
-        for _, glycan_data in GDB_data.items():
-            if glycan_data['archetype']['iupac'] and (
-                # Common GAG linkage regions and patterns
-                'GlcA(b1-3)Gal(b1-3)Gal(b1-4)Xyl' in glycan_data['archetype']['iupac'] or 
-                'IdoA' in glycan_data['archetype']['iupac'] or
-                'GlcA' in glycan_data['archetype']['iupac'] and 'GlcNAc' in glycan_data['archetype']['iupac'] or  # Hyaluronic acid pattern
-                'GlcA' in glycan_data['archetype']['iupac'] and 'GalNAc' in glycan_data['archetype']['iupac'] or  # Chondroitin/Dermatan pattern
-                'GlcN' in glycan_data['archetype']['iupac'] and 'GlcA' in glycan_data['archetype']['iupac'] or    # Heparin/Heparan pattern
-                'GlcN' in glycan_data['archetype']['iupac'] and 'IdoA' in glycan_data['archetype']['iupac']       # Heparin/Heparan pattern
-            ):
-                entry = {
-                    'glytoucan': glycan_data['archetype']['glytoucan'],
-                    'ID': glycan_data['archetype']['ID'],
-                    'mass': glycan_data['archetype']['mass']
-                }
-                search_result.append(entry)
-        return jsonify({'search_string': search_string, 'results': search_result})
-    
-    elif search_string == "Oligomannose":
-        for _, glycan_data in GDB_data.items():
-            if glycan_data['archetype']['iupac'] and (
-                # Check for N-glycan core structure
-                ('Man(b1-4)GlcNAc(b1-4)GlcNAc' in glycan_data['archetype']['iupac'] or
-                 'Man(b1-4)GlcNAc(b1-4)[Fuc(a1-6)]GlcNAc' in glycan_data['archetype']['iupac']) and
-                # Ensure it has mannose branches beyond the core
-                glycan_data['archetype']['iupac'].count('Man') >= 3 and
-                # Ensure no GlcNAc on mannose branches (which would make it hybrid/complex)
-                'GlcNAc(b1-2)Man' not in glycan_data['archetype']['iupac'] and
-                # No galactose or other sugars typically found in complex/hybrid glycans
-                'Gal(' not in glycan_data['archetype']['iupac'] and
-                'Neu5Ac(' not in glycan_data['archetype']['iupac'] and
-                'GalNAc(' not in glycan_data['archetype']['iupac'] and
-                'Xyl(' not in glycan_data['archetype']['iupac'] and
-                'GlcNAc(b1-4)]Man' not in glycan_data['archetype']['iupac'] and  # No bisecting GlcNAc
-                'GlcNAc(b1-4)Man' not in glycan_data['archetype']['iupac'] and  # No bisecting GlcNAc
-                # No bisecting GlcNAc
-                'GlcNAc(b1-6)[GlcNAc(b1-2)]Man' not in glycan_data['archetype']['iupac'] and  # No complex branching
-                'GlcNAc(b1-4)[GlcNAc(b1-2)]Man' not in glycan_data['archetype']['iupac'] and
-                'Fuc(' not in glycan_data['archetype']['iupac'].replace('Fuc(a1-6)]GlcNAc', '')  # Allow core fucose
-            ):
-                entry = {
-                    'glytoucan': glycan_data['archetype']['glytoucan'],
-                    'ID': glycan_data['archetype']['ID'],
-                    'mass': glycan_data['archetype']['mass']
-                }
-                search_result.append(entry)
-        return jsonify({'search_string': search_string, 'results': search_result})
-
-    elif search_string == "Complex":
-        for _, glycan_data in GDB_data.items():
-            if glycan_data['archetype']['iupac'] and (
-                # Basic N-glycan core structure (with or without core fucose)
-                ('Man(b1-4)GlcNAc(b1-4)GlcNAc' in glycan_data['archetype']['iupac'] or
-                 'Man(b1-4)GlcNAc(b1-4)[Fuc(a1-6)]GlcNAc' in glycan_data['archetype']['iupac'] or
-                 'Man(b1-4)GlcNAc(b1-4)[Fuc(a1-3)]GlcNAc' in glycan_data['archetype']['iupac']) and
-                # Complex glycans have GlcNAc additions on mannose branches
-                'GlcNAc(b1-2)Man' in glycan_data['archetype']['iupac'] and
-                # Check if it has branches on both α1-3 and α1-6 mannose arms
-                # (Complex N-glycans typically have GlcNAc on both branches)
-                'GlcNAc(b1-2)Man(a1-6)' in glycan_data['archetype']['iupac'] and
-                'GlcNAc(b1-2)Man(a1-3)' in glycan_data['archetype']['iupac']
-            ):
-                entry = {
-                    'glytoucan': glycan_data['archetype']['glytoucan'],
-                    'ID': glycan_data['archetype']['ID'],
-                    'mass': glycan_data['archetype']['mass']
-                }
-                search_result.append(entry)
-        return jsonify({'search_string': search_string, 'results': search_result})
-    
-    elif search_string == "Hybrid":
-        for _, glycan_data in GDB_data.items():
-            if glycan_data['archetype']['iupac'] and (
-                # Basic N-glycan core (with or without core fucose)
-                ('Man(b1-4)GlcNAc(b1-4)GlcNAc' in glycan_data['archetype']['iupac'] or
-                 'Man(b1-4)GlcNAc(b1-4)[Fuc(a1-6)]GlcNAc' in glycan_data['archetype']['iupac'] or
-                 'Man(b1-4)GlcNAc(b1-4)[Fuc(a1-3)]GlcNAc' in glycan_data['archetype']['iupac']) and
-                # Hybrid glycans have GlcNAc on one branch (usually α1-3) but not the other
-                (('GlcNAc(b1-2)Man(a1-3)' in glycan_data['archetype']['iupac'] and 
-                  'GlcNAc(b1-2)Man(a1-6)' not in glycan_data['archetype']['iupac']) or
-                 ('GlcNAc(b1-2)Man(a1-6)' in glycan_data['archetype']['iupac'] and
-                  'GlcNAc(b1-2)Man(a1-3)' not in glycan_data['archetype']['iupac'])) and
-                # Also check for mannose residues beyond the core (characteristic of hybrid)
-                glycan_data['archetype']['iupac'].count('Man') > 3
-            ):
-                entry = {
-                    'glytoucan': glycan_data['archetype']['glytoucan'],
-                    'ID': glycan_data['archetype']['ID'],
-                    'mass': glycan_data['archetype']['mass']
-                }
-                search_result.append(entry)
-        return jsonify({'search_string': search_string, 'results': search_result})
-
+    if search_string in gdb.categories:
+        # Named browse searches ("all", "N-Glycans", "O-Glycans", "GAGs", ...) are prebuilt per snapshot
+        return Response(gdb.categories[search_string]['body'], mimetype='application/json')
     elif search_type == 'wurcs':
-        WURCS = search_string.lower()
-
-        # Use name.wurcs_split to extract components from the query WURCS
-        query_split = name.wurcs_split(WURCS)
-        query_res_count = query_split["res_count"]
-        query_lin_count = query_split["lin_count"]
-        query_unique_res_count = query_split["unique_res_count"]
-        query_unique_res_list = query_split["unique_res_list"]
-        query_res_sequence = query_split["res_sequence"]
-        query_lin_list = query_split["lin_list"]
-
-        scored_results = []
-
-        for _, glycan_data in GDB_data.items():
-            wurcs = glycan_data['archetype']['wurcs']
-            if wurcs:
-                db_split = name.wurcs_split(wurcs)
-                db_res_count = db_split["res_count"]
-                db_lin_count = db_split["lin_count"]
-                db_unique_res_count = db_split["unique_res_count"]
-                db_unique_res_list = db_split["unique_res_list"]
-                db_res_sequence = db_split["res_sequence"]
-                db_lin_list = db_split["lin_list"]
-
-                # Score: prioritize exact matches on res_count and lin_count, then minimize differences in other parts
-                score = 0
-                if db_res_count == query_res_count:
-                    score += 50
-                else:
-                    score -= abs(db_res_count - query_res_count) * 10
-
-                if db_lin_count == query_lin_count:
-                    score += 50
-                else:
-                    score -= abs(db_lin_count - query_lin_count) * 10
-
-                # Penalize difference in unique_res_count
-                score -= abs(db_unique_res_count - query_unique_res_count) * 5
-
-                # Fuzzy match for unique_res_list and res_sequence
-                score += fuzz.partial_ratio(" ".join(query_unique_res_list), " ".join(db_unique_res_list))
-                score += fuzz.partial_ratio(query_res_sequence, db_res_sequence)
-
-                # Fuzzy match for lin_list (as string)
-                score += fuzz.partial_ratio(" ".join(query_lin_list), " ".join(db_lin_list))
-
-                entry = {
-                    'glytoucan': glycan_data['archetype']['glytoucan'],
-                    'ID': glycan_data['archetype']['ID'],
-                    'mass': glycan_data['archetype']['mass'],
-                    'score': score
-                }
-                scored_results.append((score, entry))
-        
-        # Sort by score descending and take top 10
-        scored_results.sort(key=lambda x: x[0], reverse=True)
-        search_result = [entry for score, entry in scored_results[:10]]
+        # Top 10 archetypes by WURCS similarity, scored against features precomputed per snapshot
+        search_result = search_index.wurcs_search(gdb.wurcs, search_string.lower(), top_k=10)
         return jsonify({'search_string': search_string, 'results': search_result})
     
     elif search_type == 'end':
-        end_residue = search_string
-        for _, glycan_data in GDB_data.items():
-            if glycan_data['archetype']['iupac'] and glycan_data['archetype']['iupac'].endswith(end_residue):
-                entry = {
-                    'glytoucan': glycan_data['archetype']['glytoucan'],
-                    'ID': glycan_data['archetype']['ID'],
-                    'mass': glycan_data['archetype']['mass'],
-                    'iupac': glycan_data['archetype']['iupac']
-                }
-                search_result.append(entry)
-        search_result.sort(key=lambda x: x['mass'])
+        # Reducing-end match through the reversed-IUPAC index, already sorted by mass
+        search_result = search_index.end_search(gdb.end, search_string)
         return jsonify({'search_string': search_string, 'results': search_result})  
     
     elif search_type == 'ai':
@@ -1197,7 +984,7 @@ def search():
 
         if is_it_glytoucan:
             glytoucan_id = search_string.lower()
-            for _, glycan_data in GDB_data.items():
+            for _, glycan_data in gdb.data.items():
                 if glycan_data['archetype'].get('glytoucan') and glycan_data['archetype']['glytoucan'].lower() == glytoucan_id:
                     entry = {
                         'glytoucan': glycan_data['archetype']['glytoucan'],
@@ -1232,7 +1019,7 @@ def search():
             iupac_id = iupac.lower()
             print(f"Canonicalized IUPAC: {iupac}")
             print(f"IUPAC ID: {iupac_id}")
-            for _, glycan_data in GDB_data.items():
+            for _, glycan_data in gdb.data.items():
                 # Check archetype
                 if glycan_data['archetype'].get('iupac') and glycan_data['archetype']['iupac'].lower() == iupac_id:
                     entry = {
@@ -1250,7 +1037,7 @@ def search():
             if "?" in search_string:
                 # Convert '?' to regex '.' for single-character wildcard
                 pattern = re.compile(search_string.replace("?", "."), re.IGNORECASE)
-                for _, glycan_data in GDB_data.items():
+                for _, glycan_data in gdb.data.items():
                     # Check archetype
                     iupac_val = glycan_data.get('archetype', {}).get('iupac', '')
                     if iupac_val and pattern.fullmatch(iupac_val):
@@ -1263,7 +1050,7 @@ def search():
                 search_result.sort(key=lambda x: x['mass'] if x['mass'] is not None else float('inf'))
                 return jsonify({'search_string': search_string, 'results': search_result})
             iupac_id = search_string.lower()
-            for _, glycan_data in GDB_data.items():
+            for _, glycan_data in gdb.data.items():
                 if glycan_data['archetype'].get('iupac') and glycan_data['archetype']['iupac'].lower() == iupac_id:
                     entry = {
                         'glytoucan': glycan_data['archetype']['glytoucan'],
@@ -1290,56 +1077,8 @@ def search():
         
         else:
             # Fallback to default search if no specific type is provided
-            # For text search, use fuzzy matching across multiple glycan fields
-            search_terms = search_string.lower().split()
-            scored_results = []
-
-            for _, glycan_data in GDB_data.items():
-                # Prepare a combined text from all relevant fields for fuzzy matching
-                search_text = ""
-                
-                # Add archetype data
-                archetype = glycan_data.get('archetype', {})
-                if archetype.get('glytoucan'):
-                    search_text += archetype.get('glytoucan', '') + " "
-                if archetype.get('iupac'):
-                    search_text += archetype.get('iupac', '') + " "
-                if archetype.get('ID'):
-                    search_text += archetype.get('ID', '') + " "
-                
-                # Add alpha/beta data for more comprehensive search
-                for anomeric in ['alpha', 'beta']:
-                    if anomeric in glycan_data:
-                        if glycan_data[anomeric].get('glytoucan'):
-                            search_text += glycan_data[anomeric].get('glytoucan', '') + " "
-                        if glycan_data[anomeric].get('iupac'):
-                            search_text += glycan_data[anomeric].get('iupac', '') + " "
-                
-                search_text = search_text.lower()
-                
-                # Calculate match score - higher is better
-                score = 0
-                for term in search_terms:
-                    # Use partial token matching for each search term
-                    partial_score = fuzz.partial_ratio(term, search_text)
-                    # Also check for exact substring matches
-                    if term in search_text:
-                        partial_score += 30  # Bonus for exact substring match
-                    score += partial_score
-                
-                # Only include results with reasonable match scores
-                if score > 50:  # Threshold can be adjusted
-                    entry = {
-                        'glytoucan': archetype.get('glytoucan'),
-                        'ID': archetype.get('ID'),
-                        'mass': archetype.get('mass'),
-                        'score': score
-                    }
-                    scored_results.append((score, entry))
-
-            # Sort by score descending
-            scored_results.sort(key=lambda x: x[0], reverse=True)
-            search_result = [entry for _, entry in scored_results[:20]]  # Return top 20 results
+            # For text search, fuzzy rescore the trigram index shortlist (top 20 results)
+            search_result = search_index.text_search(gdb.text, search_string, limit=20)
 
             return jsonify({'search_string': search_string, 'results': search_result})
     
@@ -1361,6 +1100,7 @@ def get_glycan_for_reglyco(identifier):
     associated .npz and .json files from the output folder for a given identifier 
     (either glytoucan ID or IUPAC).
     """
+    gdb = GDB.snapshot
     glycoshape_entry = None
     is_iupac = False
 
@@ -1379,87 +1119,39 @@ def get_glycan_for_reglyco(identifier):
     if iupac_like:
         is_iupac = True
         # Try to find the glycan based on IUPAC
-        for glycan_id, glycan_data in GDB_data.items():
-            if (glycan_data.get('archetype', {}).get('iupac') == identifier or 
-                glycan_data.get('alpha', {}).get('iupac') == identifier or 
-                glycan_data.get('beta', {}).get('iupac') == identifier):
-                glycoshape_entry = glycan_data['archetype']['ID']
-                break
+        glycan_data, _ = database.lookup(gdb.index, 'iupac', identifier)
+        if glycan_data:
+            glycoshape_entry = glycan_data['archetype']['ID']
     
     # If not found as IUPAC or is GlyTouCan ID
     if not glycoshape_entry:
         # Try to find the glycan based on GlyTouCan ID
-        for glycan_id, glycan_data in GDB_data.items():
-            if glycan_data.get('alpha', {}).get('glytoucan') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                break
-            elif glycan_data.get('beta', {}).get('glytoucan') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                break
-            elif glycan_data.get('archetype', {}).get('glytoucan') == identifier:
-                glycoshape_entry = glycan_data['archetype']['ID']
-                break
+        glycan_data, _ = database.lookup(gdb.index, 'glytoucan', identifier)
+        if glycan_data:
+            glycoshape_entry = glycan_data['archetype']['ID']
 
     if not glycoshape_entry:
         return jsonify({"error": f"Glycan not found for {'IUPAC' if is_iupac else 'GlyTouCan'}: {identifier}"}), 404
 
-    # Define paths to the PDB_format_ATOM and output directories
-    pdb_dir = GLYCOSHAPE_DIR / glycoshape_entry / 'PDB_format_ATOM'
-    glycam_dir = GLYCOSHAPE_DIR / glycoshape_entry / 'GLYCAM_format_ATOM'
-    charmm_dir = GLYCOSHAPE_DIR / glycoshape_entry / 'CHARMM_format_ATOM'
-    output_dir = GLYCOSHAPE_DIR / glycoshape_entry / 'output'
-    data_json = GLYCOSHAPE_DIR / glycoshape_entry / 'data.json' 
+    entry_dir = GLYCOSHAPE_DIR / glycoshape_entry
 
-    if not pdb_dir.exists():
+    if not (entry_dir / 'PDB_format_ATOM').exists():
         return jsonify({"error": "PDB_format_ATOM directory not found"}), 404
 
-    if not output_dir.exists():
+    if not (entry_dir / 'output').exists():
         return jsonify({"error": "Output directory not found"}), 404
 
-    # Collect all .pdb files
-    pdb_files = list(pdb_dir.glob('*.pdb')) + list(glycam_dir.glob('*.pdb')) + list(charmm_dir.glob('*.pdb'))
-    if not pdb_files:
+    # Prebuilt on disk and rebuilt only when a member file changes
+    opened = bundle.open_bundle(entry_dir, glycoshape_entry, config.bundle_cache_dir)
+    if opened is None:
         return jsonify({"error": "No PDB files found"}), 404
-
-    # Collect all .npz and .json files
-    npz_files = list(output_dir.glob('*.npz'))
-    json_files = list(output_dir.glob('*.json'))
-    mol2_files = list(output_dir.glob('*.mol2'))
-
-    # Create an in-memory ZIP archive
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        # Add PDB files
-        for pdb_file in pdb_files:
-            zip_file.write(pdb_file, arcname=pdb_file.name)
-
-        # Add NPZ files
-        for npz_file in npz_files:
-            zip_file.write(npz_file, arcname=npz_file.name)
-
-        # Add JSON files
-        for json_file in json_files:
-            zip_file.write(json_file, arcname=json_file.name)
-
-        # Add MOL2 files
-        for mol2_file in mol2_files:
-            zip_file.write(mol2_file, arcname=mol2_file.name)
-
-        # Add data.json file
-        if data_json.exists():
-            zip_file.write(data_json, arcname='data.json')
-
-    zip_buffer.seek(0)  # Reset buffer pointer to the beginning
+    bundle_file, bundle_signature = opened
 
     # Define a filename for the ZIP archive
     zip_filename = f"{glycoshape_entry}_files.zip"
 
-    return send_file(
-        zip_buffer,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=zip_filename  # For Flask >=2.0, use 'download_name' instead of 'attachment_filename'
-    )
+    # ETag/Last-Modified and Range support, sized from the open file
+    return bundle.send_bundle(bundle_file, bundle_signature, zip_filename, request.environ)
     
 @app.route('/api/natural2sparql', methods=['POST'])
 def natural_language_to_sparql():
@@ -1543,67 +1235,20 @@ def upload_files():
         for file, relative_path in zip(uploaded_files, file_paths):
             if file and file.filename:
                 try:
-                    # Sanitize the relative path to prevent directory traversal
                     try:
-                        clean_relative_path = sanitize_path(relative_path)
+                        upload_dir, file_dir, secure_filename_result = upload_destination(clean_target_path, relative_path)
                     except ValueError as e:
                         failed_uploads.append({
                             'filename': file.filename,
-                            'error': f'Invalid file path: {str(e)}'
+                            'error': str(e)
                         })
                         continue
                     
-                    # Create the full directory path
-                    if clean_target_path:
-                        full_relative_path = os.path.join(clean_target_path, clean_relative_path)
-                    else:
-                        full_relative_path = clean_relative_path
-                    
-                    # Get directory part of the path
-                    file_dir = os.path.dirname(full_relative_path)
-                    filename = os.path.basename(full_relative_path)
-                    
-                    # Secure the filename
-                    secure_filename_result = secure_filename(filename)
-                    if not secure_filename_result:
-                        failed_uploads.append({
-                            'filename': file.filename,
-                            'error': 'Invalid filename'
-                        })
-                        continue
-                    
-                    # Check file extension
-                    if not allowed_file(secure_filename_result):
-                        failed_uploads.append({
-                            'filename': file.filename,
-                            'error': 'File type not allowed'
-                        })
-                        continue
-                    
-                    # Create the full upload directory path including subdirectories
-                    if file_dir:
-                        upload_dir = os.path.join(str(GLYCOSHAPE_UPLOAD_DIR), file_dir)
-                    else:
-                        upload_dir = str(GLYCOSHAPE_UPLOAD_DIR)
-                    
-                    ensure_directory_exists(upload_dir)
-                    
-                    # Handle duplicate filenames by adding a suffix
-                    file_path = os.path.join(upload_dir, secure_filename_result)
-                    counter = 1
-                    name, ext = os.path.splitext(secure_filename_result)
-                    original_file_path = file_path
-                    
-                    while os.path.exists(file_path):
-                        new_filename = f"{name}_{counter}{ext}"
-                        file_path = os.path.join(upload_dir, new_filename)
-                        counter += 1
-                    
-                    # Save the file
-                    file.save(file_path)
-                    
-                    # Get file info
-                    file_size = os.path.getsize(file_path)
+                    # File the content (hashed while the form was parsed) in the blob store, then
+                    # link it into place; a name that is taken by other content gets a suffix
+                    with BLOBS.pinned():
+                        blob_path, digest, file_size, deduplicated = BLOBS.add_stream(file.stream)
+                        file_path, existing = BLOBS.place(blob_path, upload_dir, secure_filename_result)
                     
                     # Calculate the relative path from upload directory
                     upload_relative_path = os.path.relpath(file_path, str(GLYCOSHAPE_UPLOAD_DIR))
@@ -1614,11 +1259,14 @@ def upload_files():
                         'original_path': relative_path,
                         'saved_path': upload_relative_path,
                         'size': file_size,
+                        'sha256': digest,
                         'directory_created': file_dir if file_dir else 'root',
-                        'renamed': file_path != original_file_path
+                        'renamed': os.path.basename(file_path) != secure_filename_result,
+                        'deduplicated': deduplicated,
+                        'already_present': existing
                     })
                     
-                    logger.info(f"File uploaded successfully: {file_path} (from {relative_path}) by user role: {user_role}")
+                    logger.info(f"File uploaded successfully: {file_path} (from {relative_path}, deduplicated: {deduplicated}) by user role: {user_role}")
                     
                 except Exception as e:
                     logger.error(f"Error uploading file {file.filename} with path {relative_path}: {str(e)}")
@@ -1637,6 +1285,8 @@ def upload_files():
                 'total_files': len(uploaded_files),
                 'successful': len(successful_uploads),
                 'failed': len(failed_uploads),
+                'deduplicated': sum(upload['deduplicated'] for upload in successful_uploads),
+                'bytes_deduplicated': sum(upload['size'] for upload in successful_uploads if upload['deduplicated']),
                 'target_directory': clean_target_path or 'root',
                 'directory_structure_preserved': True,
                 'uploaded_by': user_role,
@@ -1687,7 +1337,130 @@ def upload_info():
         'max_file_size': config.MAX_CONTENT_LENGTH,
         'max_file_size_mb': config.MAX_CONTENT_LENGTH // (1024 * 1024),
         'allowed_extensions': list(config.ALLOWED_EXTENSIONS),
-        'upload_directory': str(GLYCOSHAPE_UPLOAD_DIR)
+        'upload_directory': str(GLYCOSHAPE_UPLOAD_DIR),
+        'chunked_upload_url': '/api/upload/sessions',
+        'chunk_size': config.upload_chunk_size
+    }), 200
+
+def request_upload_role():
+    """Role of the upload key sent in the X-Upload-Key header or the JSON body, None if invalid."""
+    upload_key = request.headers.get('X-Upload-Key')
+    if not upload_key:
+        data = request.get_json(silent=True)
+        upload_key = data.get('upload_key') if data else None
+    return validate_upload_key(upload_key) if upload_key else None
+
+def upload_session_urls(upload_id):
+    return {
+        'status_url': f'/api/upload/sessions/{upload_id}',
+        'chunk_url': f'/api/upload/sessions/{upload_id}?offset=',
+        'finalize_url': f'/api/upload/sessions/{upload_id}/finalize'
+    }
+
+@app.route('/api/upload/sessions', methods=['POST'])
+def create_upload_session():
+    """Start a resumable upload of one file; chunks are then PUT at their offset."""
+    user_role = request_upload_role()
+    if not user_role:
+        return jsonify({'error': 'Invalid upload key'}), 401
+
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data.get('size'))
+        if size < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size must be a non-negative number of bytes'}), 400
+    if size > config.MAX_CONTENT_LENGTH:
+        return jsonify({'error': 'File too large.'}), 413
+    relative_path = data.get('file_path', '')
+    if not relative_path:
+        return jsonify({'error': 'file_path is required'}), 400
+
+    try:
+        target_path = data.get('target_path', '')
+        clean_target_path = sanitize_path(target_path) if target_path else ''
+        upload_dir, file_dir, filename = upload_destination(clean_target_path, relative_path)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Content we already have needs no transfer: link it into place right away
+    with BLOBS.pinned():
+        blob_path = BLOBS.get(data.get('sha256'), size)
+        if blob_path:
+            file_path, existing = BLOBS.place(blob_path, upload_dir, filename)
+    if blob_path:
+        logger.info(f"Upload of {relative_path} deduplicated to {file_path} by user role: {user_role}")
+        return jsonify({
+            'upload_id': None,
+            'status': 'done',
+            'size': size,
+            'committed': size,
+            'filename': os.path.basename(file_path),
+            'original_path': relative_path,
+            'saved_path': os.path.relpath(file_path, str(GLYCOSHAPE_UPLOAD_DIR)),
+            'sha256': data['sha256'].lower(),
+            'renamed': os.path.basename(file_path) != filename,
+            'deduplicated': True,
+            'already_present': existing
+        }), 200
+
+    UPLOADS.purge()
+    upload_id = UPLOADS.create(upload_dir, filename, size, sha256=data.get('sha256'),
+                               original_path=relative_path, role=user_role)
+    logger.info(f"Chunked upload {upload_id} started for {os.path.join(file_dir, filename)} ({size} bytes) by user role: {user_role}")
+    return jsonify({
+        'upload_id': upload_id,
+        'size': size,
+        'committed': 0,
+        'chunk_size': config.upload_chunk_size,
+        **upload_session_urls(upload_id)
+    }), 201
+
+@app.route('/api/upload/sessions/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def upload_session(upload_id):
+    """GET: committed offset and ranges. PUT ?offset=N: write the raw body at N. DELETE: abort."""
+    if not request_upload_role():
+        return jsonify({'error': 'Invalid upload key'}), 401
+    try:
+        if request.method == 'GET':
+            return jsonify(UPLOADS.status(upload_id)), 200
+        if request.method == 'DELETE':
+            UPLOADS.abort(upload_id)
+            return jsonify({'upload_id': upload_id, 'status': 'aborted'}), 200
+
+        offset = request.args.get('offset', type=int)
+        if offset is None or request.content_length is None:
+            return jsonify({'error': 'offset parameter and Content-Length header are required'}), 400
+        status = UPLOADS.write_chunk(upload_id, offset, request.stream, request.content_length)
+        return jsonify(status), 200
+    except KeyError:
+        return jsonify({'error': 'Unknown upload session'}), 404
+    except uploads.UploadError as e:
+        return jsonify({'error': str(e)}), 409
+
+@app.route('/api/upload/sessions/<upload_id>/finalize', methods=['POST'])
+def finalize_upload_session(upload_id):
+    """Verify a fully committed upload and move it into the upload directory."""
+    if not request_upload_role():
+        return jsonify({'error': 'Invalid upload key'}), 401
+    try:
+        result = UPLOADS.finalize(upload_id)
+    except KeyError:
+        return jsonify({'error': 'Unknown upload session'}), 404
+    except uploads.UploadError as e:
+        return jsonify({'error': str(e), **UPLOADS.status(upload_id)}), 409
+
+    return jsonify({
+        'upload_id': upload_id,
+        'filename': os.path.basename(result['path']),
+        'original_path': result['original_path'],
+        'saved_path': os.path.relpath(result['path'], str(GLYCOSHAPE_UPLOAD_DIR)),
+        'size': result['size'],
+        'sha256': result['sha256'],
+        'renamed': os.path.basename(result['path']) != result['filename'],
+        'deduplicated': result['deduplicated'],
+        'already_present': result['existing']
     }), 200
 
 # Error handlers for upload functionality
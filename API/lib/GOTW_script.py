@@ -1,10 +1,20 @@
 import os
+import json
 import subprocess
-from Bio.PDB import PDBParser
-import requests
+import pty
+import time
+import select
+import signal
+import termios
+import numpy as np
 import re
 import shutil
 
+from lib import config, supervisor
+
+# Helper scripts shipped with every GOTW build
+GOTW_SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "GOTW_Scripts")
+
 def extract_added_residues(file_content):
     added_residues_pattern = r"Added\s+(\d+)\s+residues"
     added_residues_match = re.search(added_residues_pattern, file_content)
@@ -15,20 +25,6 @@ def extract_added_residues(file_content):
     else:
         return None
 
-def extract_anions_cations(content):
-    anions_pattern = r"requires\s*<i>([\d\.]+)</i>\s*anions"
-    cations_pattern = r"<i>([\d\.]+)</i>\s*cations"
-
-    anions_match = re.search(anions_pattern, content)
-    cations_match = re.search(cations_pattern, content)
-
-    if anions_match and cations_match:
-        anions = float(anions_match.group(1))
-        cations = float(cations_match.group(1))
-        return anions, cations
-    else:
-        return None, None
-
 def extract_charge(tleap_out_content):
     pattern = r"Total perturbed charge:\s+(-?\d+\.\d+)"
     match = re.search(pattern, tleap_out_content)
@@ -40,19 +36,48 @@ def extract_charge(tleap_out_content):
 
 
 
+# Molarity of pure water, used by SLTCAP to turn a water count into a volume
+WATER_MOLARITY = 55.5
+
+def sltcap_ions(water_molecules, solute_charge, concentration):
+    """
+    Number of anions and cations for a solvated system, by the SLTCAP formula
+    (Schmit et al., J. Chem. Theory Comput. 2018).
+
+    With N0 = water_molecules * concentration / 55.5 M salt pairs in the bulk,
+    the counts are sqrt(N0^2 + (Q/2)^2) +/- Q/2, which neutralize the solute
+    charge Q and screen it like the bulk salt would.
+
+    Parameters:
+    water_molecules (int): Water molecules added by solvation.
+    solute_charge (float): Net charge of the solute.
+    concentration (float): Salt concentration in mM.
+
+    Returns:
+    tuple: (anions, cations), rounded to whole ions.
+    """
+    pairs = water_molecules * concentration / 1000 / WATER_MOLARITY
+    screening = (pairs ** 2 + (solute_charge / 2) ** 2) ** 0.5
+    return round(screening + solute_charge / 2), round(screening - solute_charge / 2)
+
+def sltcap_ions_batch(water_molecules, solute_charges, concentrations):
+    """
+    Vectorized sltcap_ions for many systems at once; arguments broadcast.
+
+    Returns:
+    tuple: (anions, cations) as integer numpy arrays.
+    """
+    water_molecules = np.asarray(water_molecules, dtype=np.float64)
+    solute_charges = np.asarray(solute_charges, dtype=np.float64)
+    pairs = water_molecules * np.asarray(concentrations, dtype=np.float64) / 1000 / WATER_MOLARITY
+    screening = np.hypot(pairs, solute_charges / 2)
+    return np.rint(screening + solute_charges / 2).astype(int), np.rint(screening - solute_charges / 2).astype(int)
+
 def sltcap(data):
-    url = "https://www.phys.ksu.edu/personal/schmit/SLTCAP/SLTCAP.pl"
-    response = requests.post(url, data=data)
-
-    if response.status_code == 200:
-        print("Request was successful.")
-        print("Response:")
-        response_content = str(response.content)
-        anions, cations = extract_anions_cations(response_content)
-        print(f"Anions: {anions}")
-        print(f"Cations: {cations}")
-    else:
-        print(f"Request failed with status code {response.status_code}.")
+    """Ion counts for the fields of the SLTCAP web form, computed locally."""
+    anions, cations = sltcap_ions(data["Molecules"], data["SoluteCharges"], data["Concentration"])
+    print(f"Anions: {anions}")
+    print(f"Cations: {cations}")
     return anions, cations
 
 
@@ -66,33 +91,43 @@ atomic_masses = {
     "S": 32.065,
 }
 
+def read_pdb_columns(pdb_file):
+    """
+    Read the element symbols of every ATOM/HETATM record.
+
+    Only the fixed PDB columns are sliced, without building a structure.
+    A blank element column falls back to the first letter of the atom name,
+    as Biopython does for the elements GOTW deals with.
+
+    Parameters:
+    pdb_file (str): Path to the PDB file.
+
+    Returns:
+    numpy.ndarray: Upper-case element symbols.
+    """
+    with open(pdb_file, "rb") as f:
+        records = [line for line in f if line.startswith((b"ATOM  ", b"HETATM"))]
+
+    # One fixed-width row per record, so columns are plain array slices
+    columns = np.array(records, dtype="S80").view(np.uint8).reshape(-1, 80)
+    elements = np.char.strip(np.ascontiguousarray(columns[:, 76:78]).view("S2").ravel())
+    for i in np.flatnonzero(elements == b""):
+        elements[i] = records[i][12:16].strip().lstrip(b"0123456789")[:1]
+    return np.char.upper(elements).astype(str)
+
 def calculate_mass(pdb_file):
-    # Parse the PDB file
-    parser = PDBParser()
-    structure = parser.get_structure("protein", pdb_file)
-    
-    mass = 0
-    for atom in structure.get_atoms():
-        element = atom.element.strip().upper()
-        if element in atomic_masses:
-            mass += atomic_masses[element]
+    elements = read_pdb_columns(pdb_file)
+
+    # Sum the masses of the known elements, looking each distinct symbol up once
+    symbols, counts = np.unique(elements, return_counts=True)
+    mass = sum(atomic_masses[symbol] * count for symbol, count in zip(symbols, counts) if symbol in atomic_masses)
     
     # Convert to kDa
     mass_kda = mass / 1000
     return mass_kda
 
-def create_tleap_input(folder_name, anions, cations, output_folder="output"):
-    # Create output folder if it doesn't exist
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-
-    # Create folder for the specified folder_name under output folder
-    folder_path = os.path.join(output_folder, folder_name)
-    if not os.path.exists(folder_path):
-        os.makedirs(folder_path)
-
-    # Write tleap input file
-    tleap_input = """set default PBradii mbondi2
+# tleap commands up to solvation; ions and parameter files follow in tleap_ions
+TLEAP_SETUP = """set default PBradii mbondi2
 source leaprc.GLYCAM_06j-1
 source leaprc.water.tip3p
 loadamberprep GLYCAM_06j-1_GAGS.prep
@@ -102,55 +137,190 @@ loadoff structure.off
 check CONDENSEDSEQUENCE 
 charge CONDENSEDSEQUENCE
 solvateBox CONDENSEDSEQUENCE TIP3PBOX 12.0
-addions CONDENSEDSEQUENCE Na+ """+str(int(cations))+"""
+"""
+
+def tleap_ions(anions, cations):
+    return """addions CONDENSEDSEQUENCE Na+ """+str(int(cations))+"""
 addions CONDENSEDSEQUENCE Cl- """+str(int(anions))+"""
 saveamberparm CONDENSEDSEQUENCE system.prm7 system.rst7
 quit
-
 """
 
-    tleap_input_file = os.path.join(folder_path, "tleap.in")
-    tleap_output_file = os.path.join(folder_path, "tleap.out")
-    with open(tleap_input_file, "w") as f:
+def run_tleap(tleap_input, name, folder_path, stages=None):
+    """
+    Write tleap_input to <name>.in in folder_path and run it as the 'tleap' stage.
+
+    Returns:
+    str: What tleap printed, also kept in <name>.out.
+    """
+    stages = stages or supervisor.Stages(folder_path)
+    with open(os.path.join(folder_path, name + ".in"), "w") as f:
         f.write(tleap_input)
+    tleap_output_file = os.path.join(folder_path, name + ".out")
+    stages.run("tleap", ["tleap", "-s", "-f", name + ".in"], cwd=folder_path, stdout=tleap_output_file)
+    with open(tleap_output_file, "r") as f:
+        return f.read()
+
+def ion_counts(tleap_output, Concentration):
+    """SLTCAP (anions, cations) for the water count and charge tleap reported while solvating."""
+    added_residues = extract_added_residues(tleap_output)
+    if added_residues is None:
+        raise ValueError("Number of added water residues not found in the tLEaP output.")
+    anions, cations = sltcap_ions(added_residues, extract_charge(tleap_output), Concentration)
+    print(f"Anions: {anions}")
+    print(f"Cations: {cations}")
+    return anions, cations
+
+class TleapSessionError(RuntimeError):
+    """The interactive tleap session did not behave as expected."""
 
-    return tleap_input_file,tleap_output_file
+def _read_until_prompt(master, deadline):
+    """Read tleap output from the pty until it shows its '> ' prompt again."""
+    output = b""
+    while True:
+        text = output.decode(errors="replace").replace("\r", "")
+        if text == "> " or text.endswith("\n> "):
+            return text[:-2]
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TleapSessionError(f"tleap did not answer in time:\n{text[-2000:]}")
+        ready, _, _ = select.select([master], [], [], remaining)
+        if not ready:
+            continue
+        try:
+            chunk = os.read(master, 65536)
+        except OSError:  # EIO once tleap has exited and closed the terminal
+            chunk = b""
+        if not chunk:
+            raise TleapSessionError(f"tleap exited unexpectedly:\n{text[-2000:]}")
+        output += chunk
 
-def run_tleap(tleap_input_file, tleap_output_file, folder_path):
-    # Run tleap
-    # command = f"tleap -s -f {tleap_input_file} > {tleap_output_file}"
-    command = f"tleap -s -f tleap.in > tleap.out"
-    process = subprocess.Popen(command, shell=True, cwd=folder_path)
-    process.wait()
-    # command = f"conda activate AmberTools23 && tleap -s -f {tleap_input_file} > {tleap_output_file}"
-    # process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    # stdout, stderr = process.communicate()
-    # print(stdout,stderr)
+def _read_to_end(master, deadline):
+    """Read what tleap prints after quit, until it closes the pty."""
+    output = b""
+    while time.monotonic() < deadline:
+        ready, _, _ = select.select([master], [], [], deadline - time.monotonic())
+        if not ready:
+            break
+        try:
+            chunk = os.read(master, 65536)
+        except OSError:
+            break
+        if not chunk:
+            break
+        output += chunk
+    return output.decode(errors="replace").replace("\r", "")
+
+def run_tleap_session(folder_path, Concentration, stages=None):
+    """
+    Prepare the system in a single interactive tleap session.
+
+    The setup commands are sent one at a time through a pty, which keeps
+    tleap's output line-buffered, waiting for the '> ' prompt after each.
+    The water count and charge printed while solvating give the SLTCAP ion
+    counts, which are added, and the parameters saved, in the same session.
+    The whole session runs as the 'tleap' stage, within its configured
+    timeout. tleap.in is written with the equivalent batch script and
+    tleap.out with the transcript.
+
+    Parameters:
+    folder_path (str): Build folder holding structure.off.
+    Concentration (float): Salt concentration in mM.
+    stages (supervisor.Stages): Records the session as the 'tleap' stage.
 
-def run_acpype(folder_name):
+    Returns:
+    tuple: (anions, cations) that were added.
+
+    Raises:
+    TleapSessionError: If tleap stops answering, exits early or fails to write system.prm7/rst7.
+    """
+    stages = stages or supervisor.Stages(folder_path)
+    timeout = config.gotw_stage_timeouts.get("tleap")
+    with stages.slot_stage("tleap") as record:
+        master, slave = pty.openpty()
+        attributes = termios.tcgetattr(slave)
+        attributes[3] &= ~termios.ECHO  # don't read our own commands back
+        termios.tcsetattr(slave, termios.TCSANOW, attributes)
+        process = subprocess.Popen(["tleap", "-s"], cwd=folder_path, stdin=slave, stdout=slave, stderr=slave,
+                                   close_fds=True, start_new_session=True)
+        os.close(slave)
+        deadline = time.monotonic() + (timeout or float("inf"))
+        transcript = []
+        try:
+            transcript.append(_read_until_prompt(master, deadline))
+            for command in TLEAP_SETUP.splitlines():
+                if command.strip():
+                    os.write(master, (command + "\n").encode())
+                    transcript.append(_read_until_prompt(master, deadline))
+            try:
+                anions, cations = ion_counts("".join(transcript), Concentration)
+            except ValueError as e:
+                raise TleapSessionError(str(e))
+            for command in tleap_ions(anions, cations).splitlines():
+                os.write(master, (command + "\n").encode())
+                if command != "quit":
+                    transcript.append(_read_until_prompt(master, deadline))
+            transcript.append(_read_to_end(master, deadline))
+            try:
+                record["returncode"] = process.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                raise TleapSessionError("tleap did not exit after quit")
+        finally:
+            if process.poll() is None:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+            os.close(master)
+            with open(os.path.join(folder_path, "tleap.out"), "w") as f:
+                f.write("".join(transcript))
+        if record["returncode"] != 0 or not all(
+                os.path.exists(os.path.join(folder_path, name)) for name in ("system.prm7", "system.rst7")):
+            raise TleapSessionError(f"tleap exited with status {record['returncode']} without saving the parameters")
+
+    with open(os.path.join(folder_path, "tleap.in"), "w") as f:
+        f.write(TLEAP_SETUP + tleap_ions(anions, cations) + "\n")
+    return anions, cations
+
+def prepare_system(folder_path, Concentration, stages=None):
+    """
+    Solvate the structure in folder_path and add SLTCAP ions with tleap.
+
+    Normally one interactive tleap session does it all, see run_tleap_session.
+    If the session misbehaves, tleap is run twice from scripts instead: once
+    to solvate and read the water count and charge, and once with the full
+    tleap.in, which is also what the session leaves behind.
+
+    Parameters:
+    folder_path (str): Build folder holding structure.off.
+    Concentration (float): Salt concentration in mM.
+    stages (supervisor.Stages): Records the tleap runs.
+
+    Returns:
+    tuple: (anions, cations) that were added.
+    """
+    try:
+        return run_tleap_session(folder_path, Concentration, stages)
+    except TleapSessionError as e:
+        print(f"Single tleap session failed, running tleap twice: {e}")
+    anions, cations = ion_counts(run_tleap(TLEAP_SETUP + "quit\n", "solvate", folder_path, stages), Concentration)
+    run_tleap(TLEAP_SETUP + tleap_ions(anions, cations) + "\n", "tleap", folder_path, stages)
+    return anions, cations
+
+def run_acpype(folder_name, stages=None):
     # Run acpype command
-    command = "acpype -p system.prm7 -x system.rst7"
-    process = subprocess.Popen(command, shell=True, cwd=folder_name)
-    process.wait()
+    stages = stages or supervisor.Stages(folder_name)
+    stages.run("acpype", ["acpype", "-p", "system.prm7", "-x", "system.rst7"], cwd=folder_name,
+               stdout=os.path.join(folder_name, "acpype.out"))
 
     # Move the generated .gro and .top files to the current directory
-    mv_gro_command = "mv system.amb2gmx/system_GMX.gro ."
-    mv_top_command = "mv system.amb2gmx/system_GMX.top ."
-    process = subprocess.Popen(mv_gro_command, shell=True, cwd=folder_name)
-    process.wait()
-    process = subprocess.Popen(mv_top_command, shell=True, cwd=folder_name)
-    process.wait()
+    amb2gmx = os.path.join(folder_name, "system.amb2gmx")
+    shutil.move(os.path.join(amb2gmx, "system_GMX.gro"), os.path.join(folder_name, "system_GMX.gro"))
+    shutil.move(os.path.join(amb2gmx, "system_GMX.top"), os.path.join(folder_name, "system_GMX.top"))
 
     # Remove the system.amb2gmx directory
-    rm_command = "rm -r system.amb2gmx"
-    process = subprocess.Popen(rm_command, shell=True, cwd=folder_name)
-    process.wait()
+    shutil.rmtree(amb2gmx)
     
 
 def main():
-    anions = 0
-    cations = 0
-    added_residues = 0
     mass = calculate_mass("structure.pdb")
     folder_name = input("Enter the folder name: ")
     isExist = os.path.exists(f"output/{folder_name}")
@@ -160,29 +330,9 @@ def main():
     shutil.copy("structure.off", f"output/{folder_name}/structure.off")
     shutil.copy("structure.pdb", f"output/{folder_name}/structure.pdb")
     shutil.copy("run.sh", f"output/{folder_name}/run.sh")
-    tleap_input_file, tleap_output_file = create_tleap_input(folder_name, anions, cations,)
     folder_path = os.path.join("output", folder_name)
-    run_tleap(tleap_input_file, tleap_output_file, folder_path)
-    with open(f"output/{folder_name}/tleap.out", "r") as f:
-        tleap_out_content = f.read()
-        added_residues = extract_added_residues(tleap_out_content)
-        charge = extract_charge(tleap_out_content)
-    data = {
-        "ProteinMass": mass,
-        "Concentration": 200,
-        "SoluteCharges": charge,
-        "BoxLength": "",
-        "BoxLengthX": "",
-        "BoxLengthY": "",
-        "BoxLengthZ": "",
-        "Molecules": added_residues,
-        "BoxEdge": "",
-        "ProteinAxis": "",
-    }
-    anions, cations = sltcap(data)
+    prepare_system(folder_path, 200)
     print(f"Mass (kDa): {mass}")
-    tleap_input_file, tleap_output_file = create_tleap_input(folder_name, anions, cations,)
-    run_tleap(tleap_input_file, tleap_output_file, folder_path)
     print(f"Generated files saved in {folder_path}")
 
 def copy_files(src_folder, dst_folder):
@@ -202,47 +352,47 @@ def copy_files(src_folder, dst_folder):
         if os.path.isfile(src_file):
             shutil.copy(src_file, dst_file)
 
-def process_app(folder_name,pdb,off,Concentration):
-    anions = 0
-    cations = 0
-    added_residues = 0
-    mass = calculate_mass(pdb)
-    isExist = os.path.exists(f"output/{folder_name}")
+def process_app(folder_name,pdb,off,Concentration,output_folder="output"):
+    folder_path = os.path.join(output_folder, folder_name)
+    stages = supervisor.Stages(folder_name)
+    with stages.stage("mass") as record:
+        mass = record["mass_kda"] = calculate_mass(pdb)
+    isExist = os.path.exists(folder_path)
     if not isExist:
-        print(f"Creating a directory output/{folder_name} ...",)
-        os.makedirs(f"output/{folder_name}")
-    shutil.copy(off, f"output/{folder_name}/structure.off")
-    shutil.copy(pdb, f"output/{folder_name}/structure.pdb")
+        print(f"Creating a directory {folder_path} ...",)
+        os.makedirs(folder_path)
+    shutil.copy(off, os.path.join(folder_path, "structure.off"))
+    shutil.copy(pdb, os.path.join(folder_path, "structure.pdb"))
     # shutil.copy("run.sh", f"output/{folder_name}/run.sh")
-    tleap_input_file, tleap_output_file = create_tleap_input(folder_name, anions, cations,)
-    folder_path = os.path.join("output", folder_name)
-    run_tleap(tleap_input_file, tleap_output_file, folder_path)
-    with open(f"output/{folder_name}/tleap.out", "r") as f:
-        tleap_out_content = f.read()
-        
-        added_residues = extract_added_residues(tleap_out_content)
-        charge = extract_charge(tleap_out_content)
-    
-    data = {
-        "ProteinMass": mass,
-        "Concentration": Concentration,
-        "SoluteCharges": charge,
-        "BoxLength": "",
-        "BoxLengthX": "",
-        "BoxLengthY": "",
-        "BoxLengthZ": "",
-        "Molecules": added_residues,
-        "BoxEdge": "",
-        "ProteinAxis": "",
-    }
-    anions, cations = sltcap(data)
+    prepare_system(folder_path, Concentration, stages)
     print(f"Mass (kDa): {mass}")
-    tleap_input_file, tleap_output_file = create_tleap_input(folder_name, anions, cations,)
-    run_tleap(tleap_input_file, tleap_output_file, folder_path)
-    run_acpype(folder_path)
-    copy_files("GOTW_Scripts",folder_path)
+    run_acpype(folder_path, stages)
+    copy_files(GOTW_SCRIPTS_DIR,folder_path)
+    # Per-stage durations and exit statuses, shipped with the build
+    with open(os.path.join(folder_path, "stages.json"), "w") as f:
+        json.dump(stages.records, f, indent=2)
     print(f"Generated files saved in {folder_path}")
-    return f"output/{folder_name}"
+    return folder_path
+
+def build_conformer(folder_name, pdb, off, Concentration, workdir):
+    """
+    Run process_app for one conformer inside its own working directory.
+
+    Meant to be called from a thread pool: nothing is shared with other
+    conformers and the working directory of the process is never changed,
+    so any number of them can be built at once.
+
+    Parameters:
+    folder_name (str): Name of the build, e.g. '<glycan>/<conformer>'.
+    pdb (str): Path to structure.pdb.
+    off (str): Path to structure.off.
+    Concentration (float): Salt concentration in mM.
+    workdir (str): Private directory the build is written to.
+
+    Returns:
+    str: Path to the folder with the generated files.
+    """
+    return process_app(folder_name, pdb, off, Concentration, output_folder=os.path.join(workdir, "output"))
 
 if __name__ == "__main__":
     main()
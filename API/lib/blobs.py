@@ -0,0 +1,225 @@
+"""Content-addressed store of uploaded files, shared with the upload tree through hardlinks."""
+
+import os
+import re
+import uuid
+import errno
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+DIGEST = re.compile(r'[0-9a-f]{64}')
+
+
+def link_unique(source, directory, filename):
+    """Link source into directory under filename, adding _1, _2, ... if it's taken.
+
+    A name that already holds this very file (same inode) is reused rather
+    than suffixed, so uploading the same file twice leaves one copy.
+    Linking never replaces an existing file, so concurrent uploads of the
+    same name can't overwrite each other. Falls back to a copy when source
+    is on another filesystem.
+
+    Returns:
+        tuple: (path the file is at, True if that name already held it)
+    """
+    source_stat = os.stat(source)
+    name, ext = os.path.splitext(filename)
+    counter = 0
+    while True:
+        path = os.path.join(directory, f"{name}_{counter}{ext}" if counter else filename)
+        try:
+            os.link(source, path)
+            return path, False
+        except FileExistsError:
+            if os.path.samestat(os.stat(path), source_stat):
+                return path, True
+            counter += 1
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            try:
+                with open(path, 'xb') as f, open(source, 'rb') as src:
+                    shutil.copyfileobj(src, f, READ_SIZE)
+                return path, False
+            except FileExistsError:
+                counter += 1
+
+
+class SpooledUpload:
+    """Temporary file in the blob store that hashes whatever is written to it.
+
+    Used as the file stream of multipart uploads, so the form parser's
+    single write of each file both hashes it and puts it next to the blobs.
+    Other file methods go to the underlying temporary file, which is
+    deleted when it is closed.
+    """
+
+    def __init__(self, directory):
+        self.file = tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp')
+        self.sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class BlobStore:
+    """Uploaded file contents keyed by SHA-256.
+
+    Every upload is hashed as it is written, and its content is kept once
+    under directory/ab/abcd... . Files in the upload tree are hardlinks to
+    those blobs, so a duplicate upload costs no space and, when the client
+    announces the hash up front, no transfer either. A blob whose only
+    remaining link is its own entry is no longer used and can be pruned.
+
+    Blobs are made read-only, since writing to any file in the upload
+    tree would change every upload sharing its content, and are only ever
+    created by add_file, so a blob is trusted to hold the content its name
+    says; reusing one only compares its size.
+
+    Args:
+        directory (str): Where blobs are kept; on the same filesystem as the uploads.
+    """
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    @contextmanager
+    def pinned(self):
+        """Keep prune from deleting blobs while a block looks them up and links them into place."""
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            yield
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, digest, size=None):
+        """Return the blob path for a hex digest (and size), or None if it isn't stored."""
+        if not digest or not DIGEST.fullmatch(digest.lower()):
+            return None
+        path = self.path(digest.lower())
+        try:
+            if size is None or os.path.getsize(path) == size:
+                return path
+        except OSError:
+            pass
+        return None
+
+    def add_file(self, path, digest):
+        """Store a file whose digest is known, linking it rather than copying.
+
+        Returns:
+            tuple: (blob path, True if the content was already stored)
+        """
+        blob_path = self.path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(path, tmp_path)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            # Blob directory on another filesystem: copy the content in
+            shutil.copyfile(path, tmp_path)
+        try:
+            os.chmod(tmp_path, 0o444)
+            try:
+                os.link(tmp_path, blob_path)
+                return blob_path, False
+            except FileExistsError:
+                if os.path.getsize(blob_path) == os.path.getsize(tmp_path):
+                    return blob_path, True
+            # Files already linked to the damaged blob keep it; new uploads get the good content
+            logger.warning(f"Blob {blob_path} has the wrong size for its digest, replacing it")
+            os.replace(tmp_path, blob_path)
+            return blob_path, False
+        finally:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def add_stream(self, stream):
+        """Store the content of a readable stream, hashing it as it is written.
+
+        Returns:
+            tuple: (blob path, hex digest, size, True if the content was already stored)
+        """
+        if isinstance(stream, SpooledUpload):
+            # Already hashed while it was spooled
+            stream.file.flush()
+            digest = stream.sha.hexdigest()
+            blob_path, existed = self.add_file(stream.name, digest)
+            return blob_path, digest, stream.size, existed
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for data in iter(lambda: stream.read(READ_SIZE), b''):
+                    sha.update(data)
+                    f.write(data)
+                    size += len(data)
+            digest = sha.hexdigest()
+            blob_path, existed = self.add_file(tmp_path, digest)
+        finally:
+            os.unlink(tmp_path)
+        return blob_path, digest, size, existed
+
+    def spool(self):
+        """A writable SpooledUpload in this store, see add_stream."""
+        return SpooledUpload(self.directory)
+
+    def place(self, blob_path, directory, filename):
+        """Link a blob into the upload tree, see link_unique."""
+        return link_unique(blob_path, directory, filename)
+
+    def prune(self):
+        """Delete blobs that no file in the upload tree links to any more.
+
+        Each deletion takes the store lock exclusively and is skipped while
+        a pinned block holds it, so a blob is never removed between being
+        looked up and being linked into place.
+
+        Returns:
+            int: Bytes freed.
+        """
+        freed = 0
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        if not DIGEST.fullmatch(name) or os.stat(path).st_nlink != 1:
+                            continue
+                    except FileNotFoundError:
+                        continue
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                    try:
+                        stat = os.stat(path)
+                        if stat.st_nlink == 1:
+                            os.unlink(path)
+                            freed += stat.st_size
+                    except FileNotFoundError:
+                        pass
+                    finally:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+        logger.info(f"Pruned {freed} bytes of unused upload blobs")
+        return freed
@@ -0,0 +1,140 @@
+"""Prebuilt per-entry ZIP bundles served by /api/download/<identifier>."""
+
+import os
+import fcntl
+import hashlib
+import logging
+import threading
+import zipfile
+from pathlib import Path
+
+from werkzeug.utils import send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+
+logger = logging.getLogger(__name__)
+
+# Members that are already compressed gain nothing from deflate
+STORED_SUFFIXES = {'.npz', '.zip', '.gz', '.png', '.jpg', '.jpeg'}
+
+def bundle_members(entry_dir):
+    """List the (path, arcname) pairs that make up an entry's Re-Glyco bundle.
+
+    Args:
+        entry_dir (Path): The entry folder inside the database directory.
+
+    Returns:
+        list: Members in archive order; empty if the entry has no PDB files.
+    """
+    output_dir = entry_dir / 'output'
+    pdb_files = []
+    for folder in ('PDB_format_ATOM', 'GLYCAM_format_ATOM', 'CHARMM_format_ATOM'):
+        pdb_files += list((entry_dir / folder).glob('*.pdb'))
+    if not pdb_files:
+        return []
+
+    members = [(path, path.name) for path in pdb_files]
+    for pattern in ('*.npz', '*.json', '*.mol2'):
+        members += [(path, path.name) for path in output_dir.glob(pattern)]
+    data_json = entry_dir / 'data.json'
+    if data_json.exists():
+        members.append((data_json, 'data.json'))
+    return members
+
+
+def signature(members):
+    """Hash member names, sizes and mtimes, so any change gives a new bundle."""
+    digest = hashlib.sha256()
+    for path, arcname in members:
+        stat = path.stat()
+        digest.update(f"{path}\0{arcname}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def _write_bundle(members, bundle_path):
+    tmp_path = bundle_path.with_name(f"{bundle_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for path, arcname in members:
+                compression = zipfile.ZIP_STORED if path.suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+                zip_file.write(path, arcname=arcname, compress_type=compression)
+        os.replace(tmp_path, bundle_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def open_bundle(entry_dir, entry_id, bundle_dir):
+    """Open an up-to-date bundle for an entry, building it if needed.
+
+    Bundles are named after a signature of their members and written
+    atomically, so workers never see a half-written file; superseded
+    bundles of the same entry are removed after a rebuild. Builds of one
+    entry are serialized across processes with an flock. The bundle is
+    returned open, so a rebuild elsewhere removing it can't break a
+    download that is being served.
+
+    Args:
+        entry_dir (Path): The entry folder inside the database directory.
+        entry_id (str): GlycoShape ID, used in the bundle file name.
+        bundle_dir (str or Path): Where bundles are kept.
+
+    Returns:
+        tuple: (open binary file, bundle signature), or None if the entry has no PDB files.
+    """
+    bundle_dir = Path(bundle_dir)
+    while True:
+        members = bundle_members(entry_dir)
+        if not members:
+            return None
+        bundle_signature = signature(members)
+        bundle_path = bundle_dir / f"{entry_id}.{bundle_signature}.zip"
+        try:
+            return open(bundle_path, 'rb'), bundle_signature
+        except FileNotFoundError:
+            pass
+
+        bundle_dir.mkdir(parents=True, exist_ok=True)
+        with open(bundle_dir / f"{entry_id}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not bundle_path.exists():
+                _write_bundle(members, bundle_path)
+                logger.info(f"Built download bundle {bundle_path.name} ({len(members)} files)")
+                for stale in bundle_dir.glob(f"{entry_id}.*.zip"):
+                    if stale != bundle_path:
+                        try:
+                            stale.unlink()
+                        except OSError:
+                            pass
+            try:
+                return open(bundle_path, 'rb'), bundle_signature
+            except FileNotFoundError:
+                # Members changed again and another build replaced it; start over
+                continue
+
+
+def send_bundle(bundle_file, bundle_signature, download_name, environ):
+    """Serve a bundle opened by open_bundle, with ETag, Last-Modified and Range support.
+
+    werkzeug can't tell the size of an open file, and without it neither
+    Content-Length nor byte ranges can be answered, so the response is
+    made conditional here with the size of the open file.
+
+    Args:
+        bundle_file (file): Binary file returned by open_bundle; closed with the response.
+        bundle_signature (str): Bundle signature, used as the ETag.
+        download_name (str): File name offered to the client.
+        environ (dict): WSGI environment of the request.
+
+    Returns:
+        Response: 200, 206 or 304 response streaming the bundle.
+    """
+    stat = os.fstat(bundle_file.fileno())
+    response = send_file(bundle_file, environ, mimetype='application/zip', as_attachment=True,
+                         download_name=download_name, etag=bundle_signature, last_modified=stat.st_mtime,
+                         conditional=False)
+    response.content_length = stat.st_size
+    try:
+        return response.make_conditional(environ, accept_ranges=True, complete_length=stat.st_size)
+    except RequestedRangeNotSatisfiable:
+        bundle_file.close()
+        raise
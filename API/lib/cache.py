@@ -0,0 +1,254 @@
+"""Caches shared between processes: SQLite key/value store and generated files.
+
+Only uses the standard library so the DB build scripts can import it too.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+# Returned by PersistentCache.get when there is no live entry for a key
+MISS = object()
+
+
+class PersistentCache:
+    """Cache of JSON-serializable values with per-entry expiry.
+
+    Every process and thread opens its own connection to the same file, so
+    all gunicorn workers (and any script pointing at the file) share hits.
+
+    Args:
+        path (str): SQLite database file.
+        ttl (int): Lifetime of a positive result in seconds.
+        negative_ttl (int): Lifetime of a "not found" result in seconds.
+    """
+
+    def __init__(self, path, ttl=30 * 86400, negative_ttl=86400):
+        self.path = str(path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+                                namespace TEXT NOT NULL,
+                                key TEXT NOT NULL,
+                                value TEXT,
+                                expires REAL NOT NULL,
+                                PRIMARY KEY (namespace, key))""")
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace, key):
+        """Return the cached value for key, or MISS if absent or expired."""
+        try:
+            row = self._connection().execute(
+                "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key)).fetchone()
+        except sqlite3.Error:
+            return MISS
+        if row is None or row[1] < time.time():
+            return MISS
+        return json.loads(row[0])
+
+    def set(self, namespace, key, value, negative=None):
+        """Store value under key.
+
+        Args:
+            negative (bool): Use negative_ttl. Defaults to value is None.
+        """
+        self.set_many(namespace, [(key, value)], negative)
+
+    def set_many(self, namespace, items, negative=None):
+        """Store several (key, value) pairs in one transaction."""
+        now = time.time()
+        rows = []
+        for key, value in items:
+            is_negative = value is None if negative is None else negative
+            rows.append((namespace, key, json.dumps(value),
+                         now + (self.negative_ttl if is_negative else self.ttl)))
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", rows)
+        except sqlite3.Error:
+            pass
+
+    def purge(self):
+        """Delete expired entries."""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+
+
+def warm_from_glycoshape(cache, gdb_data):
+    """Seed the nomenclature conversions with identifiers already in GLYCOSHAPE.json.
+
+    Fills the namespaces used by name.iupac2wurcs_glytoucan and
+    name.wurcs2glytoucan, so lookups for glycans in the database never
+    leave the box.
+
+    Accepts both the database schema served by the API (archetype, alpha
+    and beta per entry) and the flat per-entry records GlycoShape_DB.py
+    builds before conversion (iupac, wurcs and glytoucan_id at the top).
+
+    Args:
+        cache (PersistentCache): Cache to fill.
+        gdb_data (dict): Parsed GLYCOSHAPE.json.
+
+    Returns:
+        int: Number of entries written.
+    """
+    iupac2wurcs, wurcs2glytoucan = {}, {}
+    for glycan_data in gdb_data.values():
+        if 'archetype' in glycan_data:
+            variants = [glycan_data.get(variant) or {} for variant in ('archetype', 'alpha', 'beta')]
+        else:
+            variants = [glycan_data]
+        for data in variants:
+            glytoucan = data.get('glytoucan') or data.get('glytoucan_id')
+            iupac, wurcs = data.get('iupac'), data.get('wurcs')
+            if iupac and glytoucan and wurcs:
+                iupac2wurcs.setdefault(iupac, [glytoucan, wurcs])
+            if wurcs and glytoucan:
+                wurcs2glytoucan.setdefault(wurcs, glytoucan)
+
+    cache.set_many('iupac2wurcs_glytoucan', iupac2wurcs.items(), negative=False)
+    cache.set_many('wurcs2glytoucan', wurcs2glytoucan.items(), negative=False)
+    return len(iupac2wurcs) + len(wurcs2glytoucan)
+
+
+class FileCache:
+    """Two-tier cache of generated files: an in-process LRU over a directory.
+
+    Files are stored under the SHA-256 of their key, so any worker (or a
+    restarted one) reuses what another has already generated. Concurrent
+    requests for the same key in a process wait for a single generation.
+
+    Reading a file from disk refreshes its mtime, and once a tenth of
+    max_bytes has been written the least recently used files are deleted
+    until the directory holds at most max_bytes, so keys taken from user
+    input can't fill the volume.
+
+    Args:
+        directory (str): Where generated files are kept.
+        max_items (int): Number of files held in memory.
+        suffix (str): File extension, e.g. '.svg'.
+        max_bytes (int): Size the directory is pruned down to; None keeps everything.
+    """
+
+    def __init__(self, directory, max_items=512, suffix='', max_bytes=None):
+        self.directory = Path(directory)
+        self.max_items = max_items
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self._lru = OrderedDict()
+        self._lru_lock = threading.Lock()
+        self._key_locks = {}
+        # Bytes written since the last prune; starts full so the first write prunes
+        self._written = max_bytes or 0
+
+    def _remember(self, digest, value):
+        with self._lru_lock:
+            self._lru[digest] = value
+            self._lru.move_to_end(digest)
+            while len(self._lru) > self.max_items:
+                self._lru.popitem(last=False)
+
+    def _recall(self, digest):
+        with self._lru_lock:
+            value = self._lru.get(digest)
+            if value is not None:
+                self._lru.move_to_end(digest)
+            return value
+
+    def get_or_create(self, key, create):
+        """Return (content, etag) for key, calling create(path) on a miss.
+
+        Args:
+            key (tuple): JSON-serializable identity of the file.
+            create (callable): Writes the file to the path it is given.
+
+        Returns:
+            tuple: File content as bytes and its SHA-256 hex digest.
+        """
+        digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+        value = self._recall(digest)
+        if value is not None:
+            return value
+
+        with self._lru_lock:
+            lock = self._key_locks.setdefault(digest, threading.Lock())
+        with lock:
+            try:
+                value = self._recall(digest)
+                if value is not None:
+                    return value
+
+                path = self.directory / digest[:2] / f"{digest}{self.suffix}"
+                try:
+                    content = path.read_bytes()
+                    os.utime(path)
+                except FileNotFoundError:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_path = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp{self.suffix}")
+                    try:
+                        create(str(tmp_path))
+                        content = tmp_path.read_bytes()
+                        os.replace(tmp_path, path)
+                    finally:
+                        if tmp_path.exists():
+                            tmp_path.unlink()
+                    self._wrote(len(content))
+                value = (content, hashlib.sha256(content).hexdigest())
+                self._remember(digest, value)
+                return value
+            finally:
+                with self._lru_lock:
+                    self._key_locks.pop(digest, None)
+
+    def _wrote(self, size):
+        if self.max_bytes is None:
+            return
+        with self._lru_lock:
+            self._written += size
+            if self._written < self.max_bytes / 10:
+                return
+            self._written = 0
+        self.prune()
+
+    def prune(self):
+        """Delete the least recently used files until the directory holds at most max_bytes.
+
+        Returns:
+            int: Bytes freed.
+        """
+        files = []
+        for path in self.directory.glob(f"*/*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if '.tmp' not in path.name:
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        freed = 0
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            freed += size
+        return freed
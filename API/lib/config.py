@@ -48,11 +48,73 @@ glycoshape_newdata_dir = variable_value5
 
 pin = "glycotime"
 
+# SQLite cache of GlyGen/GlyCosmos nomenclature conversions, shared by all workers
+# (point GlycoShape_DB.py at the same file to share it with the DB build)
+name_cache_path = os.environ.get("GLYCOSHAPE_NAME_CACHE", "name_cache.db")
+
+# Rendered SNFG images for /api/draw, keyed by glycan, motif and drawing options
+draw_cache_dir = os.environ.get("GLYCOSHAPE_DRAW_CACHE", "draw_cache")
+# Size the draw cache is pruned down to, least recently used images first
+draw_cache_bytes = int(os.environ.get("GLYCOSHAPE_DRAW_CACHE_BYTES", 1024**3))
+
+# Prebuilt Re-Glyco download bundles for /api/download/<identifier>
+bundle_cache_dir = os.environ.get("GLYCOSHAPE_BUNDLE_CACHE", "bundle_cache")
+
+# Cache-Control max-age for database-backed responses; ETag/Last-Modified keep them fresh
+http_max_age = int(os.environ.get("GLYCOSHAPE_HTTP_MAX_AGE", 3600))
+
+# SQLite visitor log behind /api/log and /api/visitors
+visitors_db_path = os.environ.get("GLYCOSHAPE_VISITORS_DB", "visitors.db")
+
+# SQLite inventory of /api/submit submissions, kept in step with GLYCOSHAPE_INVENTORY_CSV:
+# new submissions are appended to the CSV, and hand edits to it are reloaded
+inventory_db_path = os.environ.get("GLYCOSHAPE_INVENTORY_DB", "inventory.db")
+
+# Optional offline GeoIP2/GeoLite2 City database (.mmdb); geocoder is used when unset
+geoip_db_path = os.environ.get("GLYCOSHAPE_GEOIP_DB")
+
+# GOTW build jobs: SQLite queue, result archives and host-wide limit on concurrent builds
+gotw_jobs_db = os.environ.get("GLYCOSHAPE_GOTW_JOBS_DB", "gotw_jobs.db")
+gotw_jobs_dir = os.environ.get("GLYCOSHAPE_GOTW_JOBS_DIR", "gotw_jobs")
+gotw_max_running = int(os.environ.get("GLYCOSHAPE_GOTW_MAX_RUNNING", 2))
+gotw_result_ttl = int(os.environ.get("GLYCOSHAPE_GOTW_RESULT_TTL", 7 * 86400))
+
+# External GOTW build processes (tleap, acpype) allowed at once on the host, and per-stage timeouts in seconds
+gotw_max_processes = int(os.environ.get("GLYCOSHAPE_GOTW_MAX_PROCS", os.cpu_count() or 1))
+gotw_slot_dir = os.environ.get("GLYCOSHAPE_GOTW_SLOT_DIR", "/tmp/glycoshape_gotw_slots")
+gotw_stage_timeouts = {
+    "tleap": int(os.environ.get("GLYCOSHAPE_GOTW_TLEAP_TIMEOUT", 900)),
+    "acpype": int(os.environ.get("GLYCOSHAPE_GOTW_ACPYPE_TIMEOUT", 1800)),
+}
+
+# GLYCAM project zips downloaded for GOTW, reused across submissions and resumed when cut off
+gotw_download_dir = os.environ.get("GLYCOSHAPE_GOTW_DOWNLOAD_DIR", "gotw_downloads")
+gotw_download_cache_bytes = int(os.environ.get("GLYCOSHAPE_GOTW_DOWNLOAD_CACHE_BYTES", 20 * 1024**3))
+
+# Seconds between mtime checks of the raw and new-data directories indexed for /api/exist
+folder_index_interval = float(os.environ.get("GLYCOSHAPE_FOLDER_INDEX_INTERVAL", 5))
+
+# Most identifiers accepted by one /api/resolve batch request
+resolve_batch_max = int(os.environ.get("GLYCOSHAPE_RESOLVE_BATCH_MAX", 10000))
+
+# Seconds between checks of GLYCOSHAPE.json for a newer build (0 disables hot reload)
+gdb_reload_interval = int(os.environ.get("GLYCOSHAPE_RELOAD_INTERVAL", 30))
+
 # Upload functionality configuration
 UPLOAD_FOLDER = variable_value2  # Use the same as glycoshape_upload_dir
 MAX_CONTENT_LENGTH = 15 * 1024 * 1024 * 1024  # 12GB max file size
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'pdb', 'zip', 'tar', 'gz', 'json', 'csv', 'mol2', 'mol', 'sdf', 'xyz', 'prm7', 'prm', 'nc', 'rst', 'tsv', 'xlsx', 'xls', 'md', 'html', 'htm', 'xml', 'yaml', 'yml', 'cif', 'map', 'parm7' }
 
+# Resumable chunked uploads (/api/upload/sessions): session store, suggested chunk size
+# and how long an unfinished upload is kept after its last chunk
+upload_sessions_db = os.environ.get("GLYCOSHAPE_UPLOAD_SESSIONS_DB", "upload_sessions.db")
+upload_chunk_size = int(os.environ.get("GLYCOSHAPE_UPLOAD_CHUNK_SIZE", 64 * 1024 * 1024))
+upload_session_ttl = int(os.environ.get("GLYCOSHAPE_UPLOAD_SESSION_TTL", 7 * 86400))
+
+# Content-addressed store of uploaded files, hardlinked into the upload directory
+# (must be on the same filesystem; defaults to <upload dir>/.blobs)
+upload_blob_dir = os.environ.get("GLYCOSHAPE_UPLOAD_BLOB_DIR")
+
 # Load upload keys from environment variables
 def load_upload_keys():
     """Load upload keys from environment variables with fallback defaults."""
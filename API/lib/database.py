@@ -0,0 +1,227 @@
+"""In-memory lookup structures built from GLYCOSHAPE.json."""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+
+from lib import search_index
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = ('archetype', 'alpha', 'beta')
+
+# GlyTouCan IDs resolve to the anomer before the archetype, matching the
+# order the PDB/GLYCAM download routes have always checked them in.
+GLYTOUCAN_ORDER = ('alpha', 'beta', 'archetype')
+
+
+def _add(table, key, entry, variant):
+    if key:
+        table.setdefault(key, []).append((entry, variant))
+
+
+def build_index(gdb_data):
+    """Build identifier lookup tables for the glycan database.
+
+    Every table maps a key to a list of (entry, variant) tuples in database
+    order, so the first hit is the one a linear scan would have found.
+
+    Args:
+        gdb_data (dict): Parsed GLYCOSHAPE.json, keyed by entry ID.
+
+    Returns:
+        dict: Tables named 'id', 'glytoucan', 'iupac', 'iupac_lower',
+              'glycam', 'glycam_lower', 'wurcs' and 'wurcs_lower'.
+    """
+    index = {field: {} for field in ('id', 'glytoucan', 'iupac', 'iupac_lower',
+                                     'glycam', 'glycam_lower', 'wurcs', 'wurcs_lower')}
+
+    for glycan_id, entry in gdb_data.items():
+        _add(index['id'], glycan_id, entry, 'archetype')
+
+        for variant in GLYTOUCAN_ORDER:
+            _add(index['glytoucan'], (entry.get(variant) or {}).get('glytoucan'), entry, variant)
+
+        for variant in VARIANTS:
+            data = entry.get(variant) or {}
+            for field in ('iupac', 'glycam', 'wurcs'):
+                value = data.get(field)
+                if value:
+                    _add(index[field], value, entry, variant)
+                    _add(index[f'{field}_lower'], value.lower(), entry, variant)
+
+    return index
+
+
+def lookup(index, field, key, variants=None):
+    """Return the first (entry, variant) stored under key, or (None, None).
+
+    Args:
+        index (dict): Tables returned by build_index.
+        field (str): Table name, e.g. 'glytoucan' or 'iupac_lower'.
+        key (str): Identifier to resolve.
+        variants (tuple): Only accept hits on these variants.
+    """
+    for entry, variant in index[field].get(key, ()):
+        if variants is None or variant in variants:
+            return entry, variant
+    return None, None
+
+
+def resolve(index, identifier, iupac=True):
+    """Resolve an entry ID, GlyTouCan ID or exact IUPAC to (entry, variant).
+
+    Lookups are tried in that order, mirroring the public lookup routes.
+    """
+    for field in ('id', 'glytoucan') + (('iupac',) if iupac else ()):
+        entry, variant = lookup(index, field, identifier)
+        if entry is not None:
+            return entry, variant
+    return None, None
+
+
+# (table, lowercase the key, variants accepted, match label) in the order /api/exist checks them;
+# GLYCAM names refer to the base structure, so only archetypes match
+IDENTIFIER_TABLES = (
+    ('id', False, None, 'ID'),
+    ('glytoucan', False, None, 'GlyTouCan'),
+    ('iupac', False, None, 'IUPAC'),
+    ('iupac_lower', True, None, 'IUPAC'),
+    ('glycam_lower', True, ('archetype',), 'GLYCAM'),
+    ('wurcs_lower', True, None, 'WURCS'),
+)
+
+# Reducing-end anomer and aglycon, e.g. 'b1-OH'; GLYCAM names are indexed without it, as glycamtidy stores them
+GLYCAM_AGLYCON = re.compile(r'[ab]\d-oh$')
+
+
+def resolve_any(index, identifier):
+    """Resolve an entry ID, GlyTouCan ID, IUPAC, GLYCAM name or WURCS to (entry, variant, match).
+
+    Only the lookup tables are consulted; no nomenclature conversion is
+    attempted, so this is cheap enough to run over large batches.
+
+    Returns:
+        tuple: (entry, variant, label of the table that matched), or (None, None, None).
+    """
+    identifier_lower = identifier.lower()
+    for field, lower, variants, label in IDENTIFIER_TABLES:
+        if field == 'glycam_lower':
+            key = GLYCAM_AGLYCON.sub('', identifier_lower)
+        else:
+            key = identifier_lower if lower else identifier
+        entry, variant = lookup(index, field, key, variants)
+        if entry is not None:
+            return entry, variant, label
+    return None, None, None
+
+
+class Snapshot:
+    """One parsed GLYCOSHAPE.json together with every structure derived from it.
+
+    A snapshot is never modified after construction; a reload builds a new
+    one and swaps the reference, so a request that grabbed the old snapshot
+    finishes on consistent data.
+    """
+
+    def __init__(self, data, mtime_ns=0, size=0):
+        self.data = data
+        self.index = build_index(data)
+        self.wurcs = search_index.build_wurcs_index(data)
+        self.text = search_index.build_text_index(data)
+        self.categories = search_index.build_categories(data)
+        self.end = search_index.build_end_index(data)
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.version = f"{mtime_ns:x}-{size:x}"
+        self.loaded_at = time.time()
+
+
+def load_snapshot(path):
+    """Parse a GLYCOSHAPE.json file and build a Snapshot from it."""
+    stat = os.stat(path)
+    with open(path, 'r') as file:
+        data = json.load(file)
+    return Snapshot(data, stat.st_mtime_ns, stat.st_size)
+
+
+class Database:
+    """Holds the current Snapshot of the glycan database and reloads it.
+
+    Args:
+        path (str or Path): Location of GLYCOSHAPE.json.
+        on_load (callable): Called with every snapshot installed, the first one included.
+    """
+
+    def __init__(self, path, on_load=None):
+        self.path = path
+        self.on_load = on_load
+        self.snapshot = load_snapshot(path)
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._loaded(self.snapshot)
+
+    def _loaded(self, snapshot):
+        if self.on_load is None:
+            return
+        try:
+            self.on_load(snapshot)
+        except Exception as e:
+            logger.error(f"Snapshot {snapshot.version} load hook failed: {e}")
+
+    def changed(self):
+        """Check whether the file on disk differs from the loaded snapshot."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) != (self.snapshot.mtime_ns, self.snapshot.size)
+
+    def reload(self, force=False):
+        """Load the file again if it changed and swap in the new snapshot.
+
+        Parsing and index building happen before the swap, so lookups keep
+        being served from the previous snapshot until the new one is ready.
+        A file that fails to parse (e.g. still being written) leaves the
+        current snapshot in place.
+
+        Returns:
+            bool: True if a new snapshot was installed.
+        """
+        with self._reload_lock:
+            if not force and not self.changed():
+                return False
+            try:
+                snapshot = load_snapshot(self.path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Keeping snapshot {self.snapshot.version}, reload of {self.path} failed: {e}")
+                return False
+            self.snapshot = snapshot
+        logger.info(f"Glycan database reloaded: {len(snapshot.data)} entries, version {snapshot.version}")
+        self._loaded(snapshot)
+        return True
+
+    def reload_async(self, force=False):
+        """Run reload in a background thread."""
+        thread = threading.Thread(target=self.reload, kwargs={'force': force}, daemon=True)
+        thread.start()
+        return thread
+
+    def watch(self, interval):
+        """Poll the file mtime every interval seconds and reload on change."""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def poll():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error(f"Glycan database watcher error: {e}")
+
+        self._watcher = threading.Thread(target=poll, name='gdb-watcher', daemon=True)
+        self._watcher.start()
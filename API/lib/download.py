@@ -0,0 +1,173 @@
+"""Resumable downloads into a content-addressed on-disk cache."""
+
+import os
+import time
+import fcntl
+import hashlib
+import logging
+from pathlib import Path
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# Response headers that tell one version of a file from another
+VALIDATORS = ("ETag", "Last-Modified", "Content-Length")
+
+
+def _cache_key(url, headers):
+    """Key a download on its URL and whatever validators the server gives for it."""
+    values = "\0".join(headers.get(name, "") for name in VALIDATORS)
+    return hashlib.sha256(f"{url}\0{values}".encode()).hexdigest()
+
+
+def _total_size(response, resume_position):
+    content_range = response.headers.get("Content-Range", "")
+    if content_range.split("/")[-1].isdigit():
+        return int(content_range.split("/")[-1])
+    if "Content-Length" in response.headers:
+        return resume_position + int(response.headers["Content-Length"])
+    return 0
+
+
+def fetch(url, cache_dir, session=None, progress=None, attempts=3, progress_interval=2.0, suffix=".zip"):
+    """Download url into cache_dir, reusing a complete copy or resuming a partial one.
+
+    The file is named after a hash of the URL and the ETag, Last-Modified
+    and Content-Length the server reports for it, so a changed file on the
+    server is fetched again while repeated requests for the same one skip
+    the download. Bytes already on disk are kept across failed attempts,
+    jobs and restarts; concurrent fetches of the same file wait for each
+    other. A server that reports none of those validators can't tell us
+    whether the file changed, so its file is downloaded every time and
+    not kept.
+
+    The file is returned open, so prune removing it can't break a caller
+    that is still reading it.
+
+    Args:
+        url (str): File to download.
+        cache_dir (str or Path): Where downloads are kept.
+        session (requests.Session): Session to use, e.g. one with retries mounted.
+        progress (callable): Optional progress('download', bytes=..., total=...) callback.
+        attempts (int): Resumed attempts before giving up on a dropped connection.
+        progress_interval (float): Minimum seconds between progress reports.
+        suffix (str): Extension of the cached file.
+
+    Returns:
+        file: The complete file, open for binary reading; its name is its path.
+
+    Raises:
+        requests.exceptions.RequestException: If the download keeps failing.
+        ValueError: If the server sent fewer bytes than announced.
+    """
+    session = session or requests.Session()
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    head = session.head(url, allow_redirects=True, timeout=(10, 60))
+    validators = head.headers if head.ok else {}
+    cacheable = any(validators.get(name) for name in VALIDATORS)
+    key = _cache_key(url, validators)
+    path = cache_dir / f"{key}{suffix}"
+    partial_path = cache_dir / f"{key}{suffix}.part"
+    # If-Range takes an ETag or, failing that, a Last-Modified date
+    if_range = validators.get("ETag") or validators.get("Last-Modified")
+
+    with open(cache_dir / f"{key}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not cacheable:
+            # Nothing says whether an earlier copy is still current
+            path.unlink(missing_ok=True)
+            partial_path.unlink(missing_ok=True)
+        elif path.exists():
+            print(f"Using cached download {path} for {url}")
+            os.utime(path)
+            return open(path, "rb")
+
+        for attempt in range(1, attempts + 1):
+            resume_position = partial_path.stat().st_size if partial_path.exists() else 0
+            headers = {"Range": f"bytes={resume_position}-"}
+            if resume_position and if_range:
+                # Only resume if the file on the server is still the one we started
+                headers["If-Range"] = if_range
+            if resume_position:
+                print(f"Partial download found. Resuming from byte {resume_position}")
+
+            try:
+                response = session.get(url, stream=True, timeout=(10, 60), headers=headers)
+                if response.status_code == 416 and resume_position:
+                    # Nothing left to send: the partial file is already complete
+                    total_size, bytes_written = resume_position, resume_position
+                else:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        resume_position = 0  # server ignored the range, start over
+                    total_size = _total_size(response, resume_position)
+                    print(f"Downloading {url} from byte {resume_position} of {total_size or 'unknown size'}")
+
+                    bytes_written = resume_position
+                    last_report = 0.0
+                    with open(partial_path, "ab" if resume_position else "wb") as f:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            if chunk:
+                                f.write(chunk)
+                                bytes_written += len(chunk)
+                                now = time.monotonic()
+                                if now - last_report >= progress_interval:
+                                    last_report = now
+                                    print(f"Downloaded {bytes_written} bytes of {total_size or 'unknown size'}")
+                                    if progress:
+                                        progress('download', bytes=bytes_written, total=total_size)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == attempts:
+                    raise
+                logger.warning(f"Download of {url} interrupted ({e}), resuming")
+                time.sleep(attempt)
+                continue
+
+            if total_size > 0 and bytes_written != total_size:
+                raise ValueError(
+                    f"Download incomplete: {bytes_written} bytes received, "
+                    f"expected {total_size} bytes"
+                )
+            os.replace(partial_path, path)
+            if progress:
+                progress('download', bytes=bytes_written, total=total_size)
+            print(f"Download completed: {path}")
+            downloaded = open(path, "rb")
+            if not cacheable:
+                path.unlink()
+            return downloaded
+
+
+def prune(cache_dir, max_bytes):
+    """Delete the least recently used downloads until cache_dir holds at most max_bytes.
+
+    Each file is removed under its fetch lock, and files that are being
+    fetched are skipped.
+    """
+    files = []
+    for path in Path(cache_dir).glob("*"):
+        if path.suffix in (".lock", ".part"):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= max_bytes:
+            break
+        key = path.name.split(".")[0]
+        with open(path.with_name(f"{key}.lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            path.unlink(missing_ok=True)
+        total -= size
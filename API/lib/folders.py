@@ -0,0 +1,88 @@
+"""In-memory index of the glycan folders in the raw and new-data directories."""
+
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Folders differing only in their last characters (the reducing-end suffix) count as similar
+SUFFIX_LENGTH = 5
+
+
+class FolderIndex:
+    """Names of the subfolders of a few directories, for /api/exist.
+
+    Folders are grouped by (length, name minus the suffix), so both the
+    exact and the similar-folder checks are dict lookups. A directory is
+    re-listed only when its mtime changes, which happens whenever a folder
+    is added, removed or renamed in it, and its mtime is looked at no more
+    than once per check_interval seconds.
+
+    Args:
+        directories (list): (label, path) pairs, searched in that order.
+        check_interval (float): Seconds between mtime checks of each directory.
+    """
+
+    def __init__(self, directories, check_interval=5.0):
+        self.directories = [(label, str(path)) for label, path in directories]
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # path -> (mtime_ns, folder names, {(length, prefix): [names]})
+        self._listings = {}
+        self._checked = None
+
+    @staticmethod
+    def _list(path):
+        names = set()
+        similar = {}
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        names.add(entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        for folder in sorted(names):
+            similar.setdefault((len(folder), folder[:-SUFFIX_LENGTH]), []).append(folder)
+        return names, similar
+
+    def _refresh(self):
+        checked = self._checked
+        if checked is not None and time.monotonic() - checked < self.check_interval:
+            return
+        with self._lock:
+            if self._checked is not None and time.monotonic() - self._checked < self.check_interval:
+                return
+            for _, path in self.directories:
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except OSError:
+                    mtime_ns = None
+                listing = self._listings.get(path)
+                if listing is None or listing[0] != mtime_ns:
+                    started = time.monotonic()
+                    names, similar = self._list(path)
+                    self._listings[path] = (mtime_ns, names, similar)
+                    logger.info(f"Indexed {len(names)} folders in {path} in {time.monotonic() - started:.2f}s")
+            self._checked = time.monotonic()
+
+    def invalidate(self):
+        """Check the directories again on the next lookup, e.g. after creating a folder."""
+        self._checked = None
+
+    def exists(self, name):
+        """Return True if any of the directories has a folder called name."""
+        self._refresh()
+        return any(name in self._listings[path][1] for _, path in self.directories)
+
+    def similar(self, name):
+        """Return (label, folder) for the first other folder of the same length sharing all but the suffix, or None."""
+        self._refresh()
+        key = (len(name), name[:-SUFFIX_LENGTH])
+        for label, path in self.directories:
+            for folder in self._listings[path][2].get(key, ()):
+                if folder != name:
+                    return label, folder
+        return None
@@ -0,0 +1,176 @@
+"""Background IP geolocation for the visitor log."""
+
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+
+import geocoder
+
+logger = logging.getLogger(__name__)
+
+# Retry IPs that resolved to nothing after this many seconds
+MISS_TTL = 86400
+
+
+def geocoder_lookup(ip):
+    """Resolve an IP with the geocoder web service.
+
+    Returns:
+        tuple: (latitude, longitude), (None, None) if the IP is unknown.
+
+    Raises:
+        RuntimeError: If the service couldn't be reached or answered with an
+            error (rate limit, outage), so the IP is retried later rather
+            than recorded as unknown.
+    """
+    g = geocoder.ip(ip)
+    if g.ok and g.latlng:
+        return tuple(g.latlng)
+    # Only a successful answer without a location means the IP is unknown
+    if g.status_code == 200:
+        return None, None
+    raise RuntimeError(f"Geocoder lookup failed with HTTP {g.status_code}: {g.status}")
+
+
+def geoip_lookup(path):
+    """Return a resolver reading an offline MaxMind GeoIP2/GeoLite2 City database.
+
+    Args:
+        path (str): The .mmdb file.
+
+    Returns:
+        callable: Resolver with the same contract as geocoder_lookup,
+                  or None if geoip2 is not installed or the file can't be opened.
+    """
+    try:
+        import geoip2.database
+        import geoip2.errors
+    except ImportError:
+        logger.warning("geoip2 is not installed, falling back to geocoder")
+        return None
+    try:
+        reader = geoip2.database.Reader(path)
+    except Exception as e:
+        logger.warning(f"Could not open GeoIP database {path}: {e}")
+        return None
+
+    def lookup(ip):
+        try:
+            location = reader.city(ip).location
+        except (geoip2.errors.AddressNotFoundError, ValueError):
+            return None, None
+        return location.latitude, location.longitude
+
+    return lookup
+
+
+class Geolocator:
+    """Resolves visitor IPs off the request path.
+
+    Lookups go through an in-process LRU, then the locations table of the
+    visitor store, then the resolver; only the last one leaves the process.
+    Visits are logged without coordinates and filled in by a worker thread.
+
+    Args:
+        store (VisitorStore): Where visits and per-IP results are kept.
+        geoip_path (str): Optional offline GeoIP2 City database to resolve with.
+        cache_size (int): Number of IPs held in memory.
+        queue_size (int): Pending lookups before new ones are left to backfill.
+    """
+
+    def __init__(self, store, geoip_path=None, cache_size=4096, queue_size=10000):
+        self.store = store
+        self.resolver = (geoip_path and geoip_lookup(geoip_path)) or geocoder_lookup
+        self.cache_size = cache_size
+        self._lru = OrderedDict()
+        self._lru_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker = None
+
+    def cached(self, ip):
+        """Return (latitude, longitude) if the IP is in memory, else None."""
+        with self._lru_lock:
+            location = self._lru.get(ip)
+            if location is not None:
+                self._lru.move_to_end(ip)
+            return location
+
+    def _remember(self, ip, location):
+        with self._lru_lock:
+            self._lru[ip] = location
+            self._lru.move_to_end(ip)
+            while len(self._lru) > self.cache_size:
+                self._lru.popitem(last=False)
+
+    def resolve(self, ip):
+        """Return (latitude, longitude) for an IP, (None, None) if unknown.
+
+        Raises whatever the resolver raises on transient failures; those
+        are not recorded, so the IP is tried again later.
+        """
+        location = self.cached(ip)
+        if location is not None:
+            return location
+
+        row = self.store.get_location(ip)
+        if row is not None and (row[0] is not None or row[2] > time.time() - MISS_TTL):
+            location = (row[0], row[1])
+        else:
+            location = self.resolver(ip)
+            self.store.set_location(ip, *location)
+        if location[0] is not None:
+            self._remember(ip, location)
+        return location
+
+    def _locate(self, ip, row_ids):
+        try:
+            latitude, longitude = self.resolve(ip)
+        except Exception as e:
+            logger.warning(f"Error getting geolocation for IP {ip}: {e}")
+            return False
+        if latitude is None:
+            return False
+        self.store.locate(row_ids, latitude, longitude)
+        return True
+
+    def submit(self, row_id, ip):
+        """Queue a logged visit for geolocation; never blocks."""
+        self.start()
+        try:
+            self._queue.put_nowait((row_id, ip))
+        except queue.Full:
+            pass  # the row stays unlocated until the next backfill
+
+    def start(self):
+        """Start the worker thread of this process if it isn't running."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(target=self._run, name='geolocation', daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        while True:
+            row_id, ip = self._queue.get()
+            try:
+                self._locate(ip, [row_id])
+            except Exception as e:
+                logger.error(f"Geolocation worker error: {e}")
+
+    def backfill(self, limit=None):
+        """Locate visits that were logged without coordinates.
+
+        Each distinct IP is resolved once, however many visits it has.
+
+        Args:
+            limit (int): Only look at this many unlocated visits.
+
+        Returns:
+            int: Number of IPs that were located.
+        """
+        located = 0
+        for ip, row_ids in self.store.unlocated(limit).items():
+            located += self._locate(ip, row_ids)
+        logger.info(f"Geolocation backfill located {located} IPs")
+        return located
@@ -0,0 +1,238 @@
+"""Simulation submission inventory in SQLite, with a CSV view for the DB scripts.
+
+Only uses the standard library so the DB build scripts can import it too.
+"""
+
+import os
+import csv
+import json
+import fcntl
+import sqlite3
+import threading
+
+# Columns of GlycoShape_Inventory.csv, in order
+COLUMNS = [
+    'ID',
+    'Timestamp',
+    'Email address',
+    'Full GLYCAM name of glycan being submitted.',
+    'How will the data be transferred?',
+    'What is the aggregated length of the simulations?',
+    'What MD package was used for the simulations?',
+    'What force field was used for the simulations?',
+    'What temperature target was used for the simulations? ',
+    'What pressure target was used for the simulations?',
+    'What NaCl concentration was used for the simulations?',
+    'Any comments that should be noted with the submission?',
+    'What is the GlyTouCan ID of the glycan?',
+]
+GLYCAM_COLUMN = 3
+
+
+def column_type(values):
+    """Type pandas.read_csv would give a column: int, float (when numeric with gaps) or str."""
+    present = [value for value in values if value != '']
+    for cast in (int, float):
+        try:
+            for value in present:
+                cast(value)
+        except ValueError:
+            continue
+        # Empty cells are NaN, which only a float column can hold
+        return float if cast is int and len(present) < len(values) else cast
+    return str
+
+
+def glycamtidy(glycam):
+    """Drop the reducing-end aglycon, as the DB scripts do."""
+    if glycam[-3:] == "-OH":
+        glycam = glycam[:-5]
+    return glycam
+
+
+class InventoryStore:
+    """Submissions indexed by (tidied) GLYCAM name.
+
+    Rows are appended in a SQLite transaction, so concurrent submissions
+    never overwrite each other. The CSV view is extended by one line per
+    submission under an flock instead of being rewritten.
+
+    The CSV stays the copy curators edit: whenever its mtime or size
+    differs from what the store last imported or appended, the store is
+    reloaded from it before the next lookup. A missing CSV is written out
+    from the store.
+
+    Args:
+        path (str): SQLite database file.
+        csv_path (str): Inventory CSV the store is kept in step with.
+    """
+
+    def __init__(self, path, csv_path=None):
+        self.path = str(path)
+        self.csv_path = str(csv_path) if csv_path else None
+        self._local = threading.local()
+        # ((max id, row count), column types) of the rows the types were inferred from
+        self._types = None
+        self.sync()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS submissions (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                glycam TEXT,
+                                timestamp TEXT,
+                                row TEXT NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS submissions_glycam ON submissions (glycam)")
+            conn.execute("CREATE TABLE IF NOT EXISTS columns (position INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+            if conn.execute("SELECT COUNT(*) FROM columns").fetchone()[0] == 0:
+                conn.executemany("INSERT INTO columns VALUES (?, ?)", enumerate(COLUMNS))
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def columns(self):
+        """Column names in CSV order."""
+        return [row[0] for row in self._connection().execute("SELECT name FROM columns ORDER BY position")]
+
+    @staticmethod
+    def _stat(f):
+        stat = os.fstat(f.fileno())
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _recorded(self, conn):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'csv_stat'").fetchone()
+        return row[0] if row else None
+
+    def _record(self, conn, stat):
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('csv_stat', ?)", (stat,))
+
+    def sync(self):
+        """Reload the store from the CSV if the CSV changed since the store last saw it.
+
+        Returns:
+            int: Number of rows imported, 0 if the store was up to date.
+        """
+        if not self.csv_path:
+            return 0
+        try:
+            stat = os.stat(self.csv_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_size == 0:
+            if self._connection().execute("SELECT 1 FROM submissions LIMIT 1").fetchone():
+                self.export_csv(self.csv_path)
+            return 0
+        if self._recorded(self._connection()) == f"{stat.st_mtime_ns}:{stat.st_size}":
+            return 0
+        return self.import_csv(self.csv_path)
+
+    def import_csv(self, csv_path):
+        """Replace the rows of the store with those of an inventory CSV, keeping its columns.
+
+        Returns:
+            int: Number of rows imported, 0 if the store already holds this version of csv_path.
+        """
+        conn = self._connection()
+        with conn:
+            # Take the write lock first so only one process imports
+            conn.execute("BEGIN IMMEDIATE")
+            with open(csv_path, 'r', newline='') as f:
+                stat = self._stat(f)
+                if csv_path == self.csv_path and self._recorded(conn) == stat:
+                    return 0
+                reader = csv.reader(f)
+                header = next(reader, COLUMNS)
+                rows = [values + [''] * (len(header) - len(values)) for values in reader]
+            conn.execute("DELETE FROM submissions")
+            conn.execute("DELETE FROM columns")
+            conn.executemany("INSERT INTO columns VALUES (?, ?)", enumerate(header))
+            conn.executemany("INSERT INTO submissions (glycam, timestamp, row) VALUES (?, ?, ?)",
+                             [(glycamtidy(values[GLYCAM_COLUMN]), values[1], json.dumps(values)) for values in rows])
+            if csv_path == self.csv_path:
+                self._record(conn, stat)
+        return len(rows)
+
+    def append(self, record):
+        """Add one submission.
+
+        Args:
+            record (dict): Values keyed by column name; missing columns are left empty.
+
+        Returns:
+            int: Row id of the submission.
+        """
+        conn = self._connection()
+        if not self.csv_path:
+            with conn:
+                return self._insert(conn, record)
+        self.sync()
+        with open(self.csv_path, 'a', newline='') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Pick up hand edits first, so recording the new size below doesn't hide them
+                if f.tell() and self._recorded(conn) != self._stat(f):
+                    self.import_csv(self.csv_path)
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    row_id = self._insert(conn, record, f)
+                    f.flush()
+                    self._record(conn, self._stat(f))
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return row_id
+
+    def _insert(self, conn, record, csv_file=None):
+        columns = self.columns()
+        values = [str(record.get(column, '')) for column in columns]
+        cursor = conn.execute("INSERT INTO submissions (glycam, timestamp, row) VALUES (?, ?, ?)",
+                              (glycamtidy(values[GLYCAM_COLUMN]), values[1], json.dumps(values)))
+        if csv_file is not None:
+            writer = csv.writer(csv_file)
+            if csv_file.tell() == 0:
+                writer.writerow(columns)
+            writer.writerow(values)
+        return cursor.lastrowid
+
+    def column_types(self):
+        """Types of the columns in CSV order, inferred over all rows like pandas.read_csv does."""
+        conn = self._connection()
+        key = conn.execute("SELECT MAX(id), COUNT(*) FROM submissions").fetchone()
+        if self._types is None or self._types[0] != key:
+            rows = [json.loads(row) for (row,) in conn.execute("SELECT row FROM submissions")]
+            self._types = (key, [column_type([values[i] for values in rows]) for i in range(len(self.columns()))])
+        return self._types[1]
+
+    def find(self, glycam):
+        """Return the first timestamped submission of a tidied GLYCAM name as a list in column order, or None.
+
+        Values are typed per column as pandas.read_csv would read the CSV;
+        empty cells are NaN.
+        """
+        self.sync()
+        row = self._connection().execute(
+            "SELECT row FROM submissions WHERE glycam = ? AND timestamp != '' ORDER BY id LIMIT 1", (glycam,)).fetchone()
+        if row is None:
+            return None
+        return [cast(value) if value != '' else float('nan')
+                for cast, value in zip(self.column_types(), json.loads(row[0]))]
+
+    def glycams(self):
+        """Tidied GLYCAM names of all timestamped submissions, in inventory order."""
+        self.sync()
+        return [row[0] for row in self._connection().execute(
+            "SELECT glycam FROM submissions WHERE timestamp != '' ORDER BY id")]
+
+    def export_csv(self, csv_path):
+        """Write the whole inventory as CSV, replacing csv_path atomically."""
+        tmp_path = f"{csv_path}.tmp"
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns())
+            for (row,) in self._connection().execute("SELECT row FROM submissions ORDER BY id"):
+                writer.writerow(json.loads(row))
+        os.replace(tmp_path, csv_path)
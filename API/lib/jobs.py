@@ -0,0 +1,212 @@
+"""Persistent background jobs shared by all workers through one SQLite file."""
+
+import os
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Queue of long-running jobs executed off the request path.
+
+    Every gunicorn worker runs a few executor threads, but a job is only
+    claimed while fewer than max_running jobs are running on the host, so
+    that limit holds however many workers there are. Running jobs are kept
+    alive by a heartbeat; a job whose worker died (restart, crash, reload)
+    stops getting one and is queued again.
+
+    Args:
+        path (str): SQLite database file.
+        handler (callable): handler(job_id, params, progress) -> result dict.
+            progress(stage, **info) records the stage the job has reached.
+        workers (int): Executor threads in this process.
+        max_running (int): Jobs allowed to run at once across all processes.
+        poll_interval (float): Seconds between checks for queued jobs.
+        stale_after (float): Seconds without a heartbeat before a running job is requeued.
+        max_attempts (int): Runs a job gets before an abandoned one is marked failed.
+    """
+
+    def __init__(self, path, handler, workers=1, max_running=2, poll_interval=2.0, stale_after=60.0, max_attempts=3):
+        self.path = str(path)
+        self.handler = handler
+        self.workers = workers
+        self.max_running = max_running
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._threads = []
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                                id TEXT PRIMARY KEY,
+                                params TEXT NOT NULL,
+                                status TEXT NOT NULL,
+                                stages TEXT NOT NULL,
+                                result TEXT,
+                                error TEXT,
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                created REAL NOT NULL,
+                                updated REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def submit(self, params):
+        """Queue a job and return its ID."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT INTO jobs (id, params, status, stages, created, updated) VALUES (?, ?, 'queued', '[]', ?, ?)",
+                         (job_id, json.dumps(params), now, now))
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if the ID is unknown."""
+        row = self._connection().execute(
+            "SELECT id, status, stages, result, error, attempts, created, updated FROM jobs WHERE id = ?",
+            (job_id,)).fetchone()
+        if row is None:
+            return None
+        stages = json.loads(row[2])
+        return {
+            'id': row[0],
+            'status': row[1],
+            'stage': stages[-1]['name'] if stages else None,
+            'stages': stages,
+            'result': json.loads(row[3]) if row[3] else None,
+            'error': row[4],
+            'attempts': row[5],
+            'created': row[6],
+            'updated': row[7],
+        }
+
+    def purge(self, max_age):
+        """Delete finished jobs last updated more than max_age seconds ago.
+
+        Returns:
+            list: IDs of the deleted jobs, so the caller can drop their artifacts.
+        """
+        cutoff = time.time() - max_age
+        conn = self._connection()
+        with conn:
+            job_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (cutoff,))]
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+        return job_ids
+
+    def _claim(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+            if running >= self.max_running:
+                return None
+            row = conn.execute("SELECT id, params FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+            if row is None:
+                return None
+            conn.execute("""UPDATE jobs SET status = 'running', stages = '[]', attempts = attempts + 1, updated = ?
+                            WHERE id = ?""", (time.time(), row[0]))
+        return row[0], json.loads(row[1])
+
+    def _progress(self, job_id, stage, **info):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            stages = json.loads(conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+            if stages and stages[-1]['name'] == stage:
+                stages[-1].update(info)
+            else:
+                if stages and 'finished' not in stages[-1]:
+                    stages[-1]['finished'] = now
+                stages.append({'name': stage, 'started': now, **info})
+            conn.execute("UPDATE jobs SET stages = ?, updated = ? WHERE id = ?", (json.dumps(stages), now, job_id))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            stages = json.loads(conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+            if stages and 'finished' not in stages[-1]:
+                stages[-1]['finished'] = now
+            conn.execute("UPDATE jobs SET status = ?, stages = ?, result = ?, error = ?, updated = ? WHERE id = ?",
+                         (status, json.dumps(stages), json.dumps(result) if result is not None else None, error, now, job_id))
+
+    def _execute(self, job_id, params):
+        with self._running_lock:
+            self._running.add(job_id)
+        started = time.time()
+        try:
+            result = self.handler(job_id, params, lambda stage, **info: self._progress(job_id, stage, **info))
+            self._finish(job_id, 'done', result=result)
+            logger.info(f"Job {job_id} done in {time.time() - started:.1f}s")
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            self._finish(job_id, 'failed', error=str(e))
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+
+    def _heartbeat(self):
+        """Touch the jobs this process is running and requeue abandoned ones."""
+        now = time.time()
+        with self._running_lock:
+            running = list(self._running)
+        conn = self._connection()
+        with conn:
+            conn.executemany("UPDATE jobs SET updated = ? WHERE id = ? AND status = 'running'",
+                             [(now, job_id) for job_id in running])
+            requeued = conn.execute("""UPDATE jobs SET
+                                           status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                                           error = CASE WHEN attempts >= ? THEN 'Worker stopped while running the job' END
+                                       WHERE status = 'running' AND updated < ?""",
+                                    (self.max_attempts, self.max_attempts, now - self.stale_after)).rowcount
+        if requeued:
+            logger.warning(f"Requeued or failed {requeued} abandoned job(s)")
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                logger.error(f"Job queue error: {e}")
+                claimed = None
+            if claimed:
+                self._execute(*claimed)
+                continue
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _beat(self):
+        while True:
+            try:
+                self._heartbeat()
+            except sqlite3.Error as e:
+                logger.error(f"Job heartbeat error: {e}")
+            time.sleep(self.stale_after / 4)
+
+    def start(self):
+        """Start the executor and heartbeat threads of this process."""
+        if self._threads:
+            return
+        self._threads = [threading.Thread(target=self._beat, name='jobs-heartbeat', daemon=True)]
+        self._threads += [threading.Thread(target=self._run, name=f'jobs-{i}', daemon=True) for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
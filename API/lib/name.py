@@ -1,14 +1,59 @@
 import requests
 import logging
+import functools
 import subprocess
 from pathlib import Path
 from glycowork.motif.processing import IUPAC_to_SMILES
 import re
 from rdkit import Chem
+from lib import config, cache
 
 
 logger = logging.getLogger(__name__)
 
+# Conversions answered by GlyGen/GlyCosmos, shared by every worker on the box
+name_cache = cache.PersistentCache(config.name_cache_path)
+
+
+class _TransientError(Exception):
+    """Lookup failed for a reason worth retrying; carries the value to return."""
+
+    def __init__(self, fallback):
+        super().__init__(fallback)
+        self.fallback = fallback
+
+
+def _is_not_found(e):
+    # A 4xx answer (other than rate limiting) means the identifier is unknown
+    status = e.response.status_code if isinstance(e, requests.HTTPError) and e.response is not None else None
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+def _cached(func):
+    """Serve func from name_cache, storing answers and "not found" results.
+
+    "Not found" covers None, an error dict and an all-None tuple; those
+    expire after the cache's negative_ttl.
+
+    Results the wrapped function signals as transient (network errors,
+    5xx, rate limits) are returned but never stored.
+    """
+    @functools.wraps(func)
+    def wrapper(key):
+        value = name_cache.get(func.__name__, key)
+        if value is not cache.MISS:
+            return tuple(value) if isinstance(value, list) else value
+        try:
+            value = func(key)
+        except _TransientError as e:
+            return e.fallback
+        negative = value is None or isinstance(value, dict) or (isinstance(value, tuple) and not any(value))
+        name_cache.set(func.__name__, key, value, negative)
+        return value
+    return wrapper
+
+
+@_cached
 def glytoucan2iupac(glytoucan_ac):
     """Get Glygen data for a GlyTouCan accession number.
 
@@ -37,7 +82,9 @@ def glytoucan2iupac(glytoucan_ac):
                 return iupac + "-(1→"
     except Exception as e:
         logger.error(f"Failed to get Glygen data: {str(e)}")
-        return None
+        if _is_not_found(e):
+            return None
+        raise _TransientError(None)
     
 def glycam2iupac(glycam):
     # Define a dictionary of default stereochemistry for common monosaccharides
@@ -118,6 +165,7 @@ def glycam2iupac(glycam):
 
 
 
+@_cached
 def iupac2wurcs_glytoucan(iupac_condensed):
     """
     Converts IUPAC condensed format to WURCS format and retrieves the GlyTouCan accession number.
@@ -143,10 +191,12 @@ def iupac2wurcs_glytoucan(iupac_condensed):
         return data.get("id"),data.get("WURCS")
     except requests.exceptions.RequestException as e:
         # Handle any request exceptions
-        return {"error": str(e)}
+        if _is_not_found(e):
+            return {"error": str(e)}
+        raise _TransientError({"error": str(e)})
     except KeyError:
         # Handle unexpected response structure
-        return {"error": "Unexpected response structure"}
+        raise _TransientError({"error": "Unexpected response structure"})
     
 
 def smiles2wurcs(smiles):
@@ -260,6 +310,7 @@ def pdb2wurcs(pdb_path):
         logger.error(f"Failed to convert PDB to WURCS: {str(e)}")
         return None
 
+@_cached
 def wurcs2glytoucan(wurcs):
     """Convert WURCS to GlyTouCan ID using GlyCosmos API.
     
@@ -287,4 +338,6 @@ def wurcs2glytoucan(wurcs):
         
     except Exception as e:
         logger.error(f"Failed to convert WURCS to GlyTouCan ID: {str(e)}")
-        return None
\ No newline at end of file
+        if _is_not_found(e):
+            return None
+        raise _TransientError(None)
\ No newline at end of file
@@ -0,0 +1,428 @@
+"""Precomputed search structures for the /api/search routes."""
+
+import json
+from bisect import bisect_left
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from lib import name
+
+# Upper bound of the fuzzy part of the WURCS score: three partial_ratio terms
+WURCS_FUZZY_MAX = 300
+
+
+def _result(archetype):
+    return {
+        'glytoucan': archetype['glytoucan'],
+        'ID': archetype['ID'],
+        'mass': archetype['mass']
+    }
+
+
+def _encode_sequence(res_sequence):
+    # One character per residue index, so string partial_ratio compares the
+    # RES sequence element by element exactly like it does on the int list.
+    return "".join(chr(0x100 + n) for n in res_sequence)
+
+
+def _wurcs_features(wurcs):
+    split = name.wurcs_split(wurcs)
+    if split is None:
+        return None
+    return (split["res_count"], split["lin_count"], split["unique_res_count"],
+            " ".join(split["unique_res_list"]),
+            _encode_sequence(split["res_sequence"]),
+            " ".join(split["lin_list"]))
+
+
+def build_wurcs_index(gdb_data):
+    """Split every archetype WURCS once and group the entries into buckets.
+
+    Args:
+        gdb_data (dict): Parsed GLYCOSHAPE.json.
+
+    Returns:
+        dict: 'entries' (result dicts), 'unique_res', 'res_sequence' and
+              'lin' (feature strings as numpy object arrays) and 'buckets',
+              mapping (res_count, lin_count, unique_res_count) to entry
+              positions.
+    """
+    entries, unique_res, res_sequence, lin = [], [], [], []
+    buckets = {}
+    for glycan_data in gdb_data.values():
+        wurcs = glycan_data['archetype'].get('wurcs')
+        features = _wurcs_features(wurcs) if wurcs else None
+        if features is None:
+            continue
+        res_count, lin_count, unique_res_count = features[:3]
+        buckets.setdefault((res_count, lin_count, unique_res_count), []).append(len(entries))
+        entries.append(_result(glycan_data['archetype']))
+        unique_res.append(features[3])
+        res_sequence.append(features[4])
+        lin.append(features[5])
+
+    return {
+        'entries': entries,
+        'unique_res': np.array(unique_res, dtype=object),
+        'res_sequence': np.array(res_sequence, dtype=object),
+        'lin': np.array(lin, dtype=object),
+        'buckets': {key: np.array(positions, dtype=np.int64) for key, positions in buckets.items()},
+    }
+
+
+def _count_score(query_count, db_count):
+    return 50 if db_count == query_count else -abs(db_count - query_count) * 10
+
+
+def wurcs_search(wurcs_index, wurcs, top_k=10):
+    """Return the top_k archetypes most similar to a WURCS string.
+
+    Scores are identical to a full scan: +50 for an equal RES/LIN count (or
+    -10 per unit of difference), -5 per unit of UniqueRES count difference,
+    plus partial_ratio of the UniqueRES lists, RES sequences and LIN lists.
+    The count part is shared by a whole bucket, so buckets are visited best
+    first and skipped once even a perfect fuzzy match could not reach the
+    current top_k. Surviving buckets are scored in one batched cdist call.
+
+    Args:
+        wurcs_index (dict): Structure returned by build_wurcs_index.
+        wurcs (str): Query WURCS, already lower-cased by the caller.
+        top_k (int): Number of results to return.
+
+    Returns:
+        list: Result dicts with a 'score' key, best first; ties keep
+              database order.
+    """
+    query = _wurcs_features(wurcs)
+    if query is None:
+        return []
+    query_res_count, query_lin_count, query_unique_res_count = query[:3]
+
+    bucket_scores = sorted(
+        ((_count_score(query_res_count, key[0])
+          + _count_score(query_lin_count, key[1])
+          - abs(key[2] - query_unique_res_count) * 5, key)
+         for key in wurcs_index['buckets']),
+        key=lambda x: x[0], reverse=True)
+
+    positions, scores = [], []
+    threshold = None
+    for base, key in bucket_scores:
+        if threshold is not None and base + WURCS_FUZZY_MAX < threshold:
+            break
+        idx = wurcs_index['buckets'][key]
+        fuzzy = np.zeros(len(idx))
+        for query_part, column in ((query[3], 'unique_res'), (query[4], 'res_sequence'), (query[5], 'lin')):
+            fuzzy += np.rint(process.cdist([query_part], wurcs_index[column][idx], scorer=fuzz.partial_ratio, dtype=np.float64)[0])
+        positions.append(idx)
+        scores.append(base + fuzzy.astype(np.int64))
+        if sum(len(p) for p in positions) >= top_k:
+            collected = np.concatenate(scores)
+            threshold = np.partition(collected, len(collected) - top_k)[len(collected) - top_k]
+
+    if not positions:
+        return []
+    positions = np.concatenate(positions)
+    scores = np.concatenate(scores)
+    if len(scores) > top_k:
+        keep = np.argpartition(-scores, top_k - 1)[:top_k]
+        # Pull in every entry tied with the cut-off so database order decides
+        keep = np.flatnonzero(scores >= scores[keep].min())
+        positions, scores = positions[keep], scores[keep]
+    order = np.lexsort((positions, -scores))[:top_k]
+
+    results = []
+    for i in order:
+        entry = dict(wurcs_index['entries'][positions[i]])
+        entry['score'] = int(scores[i])
+        results.append(entry)
+    return results
+
+
+# Number of trigram candidates that get fuzzy rescored in free-text search
+TEXT_SHORTLIST = 500
+
+
+def _search_text(glycan_data):
+    # GlyTouCan IDs, IUPAC strings and the entry ID of every variant
+    search_text = ""
+    archetype = glycan_data.get('archetype', {})
+    for field in ('glytoucan', 'iupac', 'ID'):
+        if archetype.get(field):
+            search_text += archetype[field] + " "
+    for anomeric in ['alpha', 'beta']:
+        if anomeric in glycan_data:
+            for field in ('glytoucan', 'iupac'):
+                if glycan_data[anomeric].get(field):
+                    search_text += glycan_data[anomeric][field] + " "
+    return search_text.lower()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def build_text_index(gdb_data):
+    """Build the trigram inverted index used by the free-text search.
+
+    Args:
+        gdb_data (dict): Parsed GLYCOSHAPE.json.
+
+    Returns:
+        dict: 'entries' (result dicts), 'texts' (lower-cased search text
+              per entry as a numpy object array) and 'postings', mapping
+              each trigram to the positions of the entries containing it.
+    """
+    entries, texts = [], []
+    postings = {}
+    for glycan_data in gdb_data.values():
+        archetype = glycan_data.get('archetype', {})
+        text = _search_text(glycan_data)
+        for trigram in _trigrams(text):
+            postings.setdefault(trigram, []).append(len(entries))
+        entries.append({
+            'glytoucan': archetype.get('glytoucan'),
+            'ID': archetype.get('ID'),
+            'mass': archetype.get('mass')
+        })
+        texts.append(text)
+
+    return {
+        'entries': entries,
+        'texts': np.array(texts, dtype=object),
+        'postings': {trigram: np.array(positions, dtype=np.int64) for trigram, positions in postings.items()},
+    }
+
+
+def text_search(text_index, search_string, limit=20, shortlist=TEXT_SHORTLIST):
+    """Fuzzy free-text search over GlyTouCan IDs, IUPAC strings and entry IDs.
+
+    Entries sharing the most trigrams with the search terms form a
+    shortlist, which is then scored like the original full scan: for every
+    term, partial_ratio against the entry text plus 30 for an exact
+    substring match. Entries scoring 50 or less are dropped. If no term is
+    long enough to have a trigram, every entry is scored.
+
+    Args:
+        text_index (dict): Structure returned by build_text_index.
+        search_string (str): Whitespace separated search terms.
+        limit (int): Number of results to return.
+        shortlist (int): Number of trigram candidates to rescore.
+
+    Returns:
+        list: Result dicts with a 'score' key, best first.
+    """
+    search_terms = search_string.lower().split()
+    n_entries = len(text_index['entries'])
+    if not search_terms or not n_entries:
+        return []
+
+    hits = np.zeros(n_entries, dtype=np.int64)
+    for term in search_terms:
+        for trigram in _trigrams(term):
+            positions = text_index['postings'].get(trigram)
+            if positions is not None:
+                hits[positions] += 1
+
+    if any(len(term) >= 3 for term in search_terms):
+        candidates = np.flatnonzero(hits)
+        if len(candidates) > shortlist:
+            candidates = candidates[np.argpartition(-hits[candidates], shortlist - 1)[:shortlist]]
+    else:
+        candidates = np.arange(n_entries)
+    if not len(candidates):
+        return []
+
+    texts = text_index['texts'][candidates]
+    scores = np.zeros(len(candidates), dtype=np.int64)
+    for term in search_terms:
+        scores += np.rint(process.cdist([term], texts, scorer=fuzz.partial_ratio, dtype=np.float64)[0]).astype(np.int64)
+        scores += np.fromiter((30 if term in text else 0 for text in texts), dtype=np.int64, count=len(texts))
+
+    keep = scores > 50
+    candidates, scores = candidates[keep], scores[keep]
+    order = np.lexsort((candidates, -scores))[:limit]
+
+    results = []
+    for i in order:
+        entry = dict(text_index['entries'][candidates[i]])
+        entry['score'] = int(scores[i])
+        results.append(entry)
+    return results
+
+
+def _is_n_glycan(iupac):
+    return (iupac.endswith('Man(b1-4)GlcNAc(b1-4)GlcNAc') or
+            iupac.endswith('Man(b1-4)GlcNAc(b1-4)[Fuc(a1-6)]GlcNAc'))
+
+
+def _is_o_glycan(iupac):
+    # O-glycans typically have GalNAc at the reducing end
+    # Check for common O-glycan patterns: core 1-4 structures
+    return (
+        # Check for GalNAc at the reducing end - common in all O-glycans
+        iupac.endswith('GalNAc') or
+        # Core 1 (T antigen) and extensions
+        'Gal(b1-3)GalNAc' in iupac or
+        # Core 2 and extensions
+        'GlcNAc(b1-6)[Gal(b1-3)]GalNAc' in iupac or
+        # Core 3 and extensions
+        'GlcNAc(b1-3)GalNAc' in iupac or
+        # Core 4 and extensions
+        'GlcNAc(b1-6)[GlcNAc(b1-3)]GalNAc' in iupac
+    )
+
+
+def _is_gag(iupac):
+    return (
+        # Common GAG linkage regions and patterns
+        'GlcA(b1-3)Gal(b1-3)Gal(b1-4)Xyl' in iupac or
+        'IdoA' in iupac or
+        'GlcA' in iupac and 'GlcNAc' in iupac or  # Hyaluronic acid pattern
+        'GlcA' in iupac and 'GalNAc' in iupac or  # Chondroitin/Dermatan pattern
+        'GlcN' in iupac and 'GlcA' in iupac or    # Heparin/Heparan pattern
+        'GlcN' in iupac and 'IdoA' in iupac       # Heparin/Heparan pattern
+    )
+
+
+def _is_oligomannose(iupac):
+    return (
+        # Check for N-glycan core structure
+        ('Man(b1-4)GlcNAc(b1-4)GlcNAc' in iupac or
+         'Man(b1-4)GlcNAc(b1-4)[Fuc(a1-6)]GlcNAc' in iupac) and
+        # Ensure it has mannose branches beyond the core
+        iupac.count('Man') >= 3 and
+        # Ensure no GlcNAc on mannose branches (which would make it hybrid/complex)
+        'GlcNAc(b1-2)Man' not in iupac and
+        # No galactose or other sugars typically found in complex/hybrid glycans
+        'Gal(' not in iupac and
+        'Neu5Ac(' not in iupac and
+        'GalNAc(' not in iupac and
+        'Xyl(' not in iupac and
+        'GlcNAc(b1-4)]Man' not in iupac and  # No bisecting GlcNAc
+        'GlcNAc(b1-4)Man' not in iupac and  # No bisecting GlcNAc
+        # No bisecting GlcNAc
+        'GlcNAc(b1-6)[GlcNAc(b1-2)]Man' not in iupac and  # No complex branching
+        'GlcNAc(b1-4)[GlcNAc(b1-2)]Man' not in iupac and
+        'Fuc(' not in iupac.replace('Fuc(a1-6)]GlcNAc', '')  # Allow core fucose
+    )
+
+
+def _has_n_core(iupac):
+    # Basic N-glycan core structure (with or without core fucose)
+    return ('Man(b1-4)GlcNAc(b1-4)GlcNAc' in iupac or
+            'Man(b1-4)GlcNAc(b1-4)[Fuc(a1-6)]GlcNAc' in iupac or
+            'Man(b1-4)GlcNAc(b1-4)[Fuc(a1-3)]GlcNAc' in iupac)
+
+
+def _is_complex(iupac):
+    return (
+        _has_n_core(iupac) and
+        # Complex glycans have GlcNAc additions on mannose branches
+        'GlcNAc(b1-2)Man' in iupac and
+        # Check if it has branches on both α1-3 and α1-6 mannose arms
+        # (Complex N-glycans typically have GlcNAc on both branches)
+        'GlcNAc(b1-2)Man(a1-6)' in iupac and
+        'GlcNAc(b1-2)Man(a1-3)' in iupac
+    )
+
+
+def _is_hybrid(iupac):
+    return (
+        _has_n_core(iupac) and
+        # Hybrid glycans have GlcNAc on one branch (usually α1-3) but not the other
+        (('GlcNAc(b1-2)Man(a1-3)' in iupac and
+          'GlcNAc(b1-2)Man(a1-6)' not in iupac) or
+         ('GlcNAc(b1-2)Man(a1-6)' in iupac and
+          'GlcNAc(b1-2)Man(a1-3)' not in iupac)) and
+        # Also check for mannose residues beyond the core (characteristic of hybrid)
+        iupac.count('Man') > 3
+    )
+
+
+# Named browse searches and the archetype IUPAC rule each one applies
+CATEGORIES = {
+    'all': None,
+    'N-Glycans': _is_n_glycan,
+    'O-Glycans': _is_o_glycan,
+    'GAGs': _is_gag,
+    'Oligomannose': _is_oligomannose,
+    'Complex': _is_complex,
+    'Hybrid': _is_hybrid,
+}
+
+
+def build_categories(gdb_data):
+    """Materialize the named category searches once per snapshot.
+
+    Args:
+        gdb_data (dict): Parsed GLYCOSHAPE.json.
+
+    Returns:
+        dict: Category name -> {'ids': ordered entry IDs, 'body': the
+              serialized /api/search response}.
+    """
+    categories = {}
+    for category, rule in CATEGORIES.items():
+        ids, results = [], []
+        for glycan_data in gdb_data.values():
+            archetype = glycan_data['archetype']
+            if rule is None or (archetype['iupac'] and rule(archetype['iupac'])):
+                ids.append(archetype['ID'])
+                results.append(_result(archetype))
+        # Same key order and separators as Flask's jsonify
+        body = json.dumps({'search_string': category, 'results': results},
+                          sort_keys=True, separators=(",", ":")) + "\n"
+        categories[category] = {'ids': ids, 'body': body.encode()}
+    return categories
+
+
+def build_end_index(gdb_data):
+    """Index archetype IUPAC strings by their reducing end.
+
+    IUPAC condensed names end with the reducing-end residue, so reversing
+    them turns an endswith query into a prefix range of a sorted list.
+
+    Args:
+        gdb_data (dict): Parsed GLYCOSHAPE.json.
+
+    Returns:
+        dict: 'keys' (sorted reversed IUPAC strings), 'ranks' (mass rank of
+              the entry behind each key) and 'results' (result dicts in
+              mass order).
+    """
+    archetypes = [glycan_data['archetype'] for glycan_data in gdb_data.values()
+                  if glycan_data['archetype']['iupac']]
+    by_mass = sorted(range(len(archetypes)),
+                     key=lambda i: archetypes[i]['mass'] if archetypes[i]['mass'] is not None else float('inf'))
+    rank = {position: r for r, position in enumerate(by_mass)}
+    keyed = sorted((archetypes[i]['iupac'][::-1], rank[i]) for i in range(len(archetypes)))
+
+    return {
+        'keys': [key for key, _ in keyed],
+        'ranks': np.array([r for _, r in keyed], dtype=np.int64),
+        'results': [{
+            'glytoucan': archetypes[i]['glytoucan'],
+            'ID': archetypes[i]['ID'],
+            'mass': archetypes[i]['mass'],
+            'iupac': archetypes[i]['iupac']
+        } for i in by_mass],
+    }
+
+
+def end_search(end_index, end_residue):
+    """Return every archetype whose IUPAC ends with end_residue, lightest first.
+
+    Args:
+        end_index (dict): Structure returned by build_end_index.
+        end_residue (str): Reducing-end IUPAC fragment, e.g. "GlcNAc(b1-4)GlcNAc".
+
+    Returns:
+        list: Result dicts sorted by mass; equal masses keep database order.
+    """
+    prefix = end_residue[::-1]
+    keys = end_index['keys']
+    lo = bisect_left(keys, prefix)
+    hi = bisect_left(keys, prefix[:-1] + chr(ord(prefix[-1]) + 1)) if prefix else len(keys)
+    return [end_index['results'][r] for r in np.sort(end_index['ranks'][lo:hi])]
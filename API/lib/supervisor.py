@@ -0,0 +1,105 @@
+"""Supervised execution of external build stages (tleap, acpype) with timeouts and timing."""
+
+import os
+import time
+import fcntl
+import signal
+import logging
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+
+from lib import config
+
+logger = logging.getLogger(__name__)
+
+
+class StageError(RuntimeError):
+    """A stage exited with an error or ran past its timeout."""
+
+
+@contextmanager
+def slot(poll_interval=0.5):
+    """Hold one of the host-wide process slots for the duration of the block."""
+    Path(config.gotw_slot_dir).mkdir(parents=True, exist_ok=True)
+    while True:
+        for i in range(config.gotw_max_processes):
+            handle = open(os.path.join(config.gotw_slot_dir, f"slot-{i}.lock"), "w")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                continue
+            try:
+                yield i
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+                handle.close()
+            return
+        time.sleep(poll_interval)
+
+
+class Stages:
+    """Runs the stages of one build and records how each of them went.
+
+    Args:
+        label (str): Build name used in log messages.
+    """
+
+    def __init__(self, label=""):
+        self.label = label
+        self.records = []
+
+    @contextmanager
+    def stage(self, name):
+        """Time an in-process block as a stage; exceptions mark it failed."""
+        record = {"stage": name, "status": "running"}
+        self.records.append(record)
+        started = time.monotonic()
+        try:
+            yield record
+            record["status"] = "ok"
+        except Exception as e:
+            record["status"] = "failed"
+            record["error"] = str(e)
+            raise
+        finally:
+            record["seconds"] = round(time.monotonic() - started, 3)
+            logger.info(f"{self.label} {name}: {record['status']} in {record['seconds']}s")
+
+    @contextmanager
+    def slot_stage(self, name):
+        """Time a stage that needs a host-wide slot; waiting for the slot is recorded apart."""
+        queued = time.monotonic()
+        with slot():
+            waited = round(time.monotonic() - queued, 3)
+            with self.stage(name) as record:
+                record["waited"] = waited
+                yield record
+
+    def run(self, name, args, cwd, stdout=None, timeout=None):
+        """Run an external command as a stage, inside a host-wide slot.
+
+        Args:
+            name (str): Stage name, also the key into config.gotw_stage_timeouts.
+            args (list): Command and arguments; no shell is involved.
+            cwd (str): Working directory.
+            stdout (str): File the output goes to; discarded if None.
+            timeout (float): Seconds before the process group is killed.
+
+        Raises:
+            StageError: On a non-zero exit status or a timeout.
+        """
+        timeout = timeout or config.gotw_stage_timeouts.get(name)
+        with self.slot_stage(name) as record:
+            with open(stdout or os.devnull, "w") as out:
+                process = subprocess.Popen(args, cwd=cwd, stdout=out, stderr=subprocess.STDOUT, start_new_session=True)
+                try:
+                    record["returncode"] = process.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+                    record["returncode"] = None
+                    raise StageError(f"{name} timed out after {timeout}s")
+            if record["returncode"] != 0:
+                raise StageError(f"{name} exited with status {record['returncode']}")
@@ -0,0 +1,321 @@
+"""Resumable chunked uploads, shared by all workers through one SQLite file."""
+
+import os
+import time
+import uuid
+import hashlib
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+# Seconds between sweeps of the blob store for content no upload links to any more
+PRUNE_INTERVAL = 3600
+
+
+class UploadError(ValueError):
+    """A request that doesn't fit the state of the upload session."""
+
+
+def merge_ranges(ranges):
+    """Merge (offset, length) pairs into sorted, non-overlapping [start, end) ranges."""
+    merged = []
+    for offset, length in sorted(ranges):
+        end = offset + length
+        if merged and offset <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([offset, end])
+    return merged
+
+
+class UploadSessions:
+    """Upload sessions whose chunks are written in place, in any order.
+
+    Each session preallocates a hidden .part file next to its destination,
+    so chunks are written straight to disk at their offset and finalizing
+    only links it into place. Committed byte ranges are recorded once a chunk is synced,
+    so a client can ask where to resume after a dropped connection, and
+    chunks of one file may be sent over several connections at once.
+
+    The worker that receives a session's first chunk keeps its SHA-256 and,
+    after every chunk it commits, hashes the bytes that have become
+    contiguous from the start, reading them back while they are still in
+    the page cache. Chunks may arrive in any order. A hash state can't be
+    shared between processes, so the hash only advances when a chunk
+    reaches that worker. Finalize reads whatever it hasn't hashed, which is
+    the whole file when it runs on another worker or a committed range was
+    rewritten. It then files the content in the blob store and links it
+    into place.
+
+    Args:
+        path (str): SQLite database file.
+        blobs (BlobStore): Content-addressed store the finished files go into.
+        ttl (float): Seconds an unfinished session is kept after its last chunk.
+    """
+
+    def __init__(self, path, blobs, ttl=7 * 86400):
+        self.path = str(path)
+        self.blobs = blobs
+        self.ttl = ttl
+        self._local = threading.local()
+        # upload id -> [sha256, bytes hashed, end of the range being hashed, lock] for sessions whose
+        # first chunk reached this process; None once a hashed range was rewritten
+        self._hashers = {}
+        self._hashers_lock = threading.Lock()
+        self._pruned = None
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS uploads (
+                                id TEXT PRIMARY KEY,
+                                role TEXT,
+                                directory TEXT NOT NULL,
+                                filename TEXT NOT NULL,
+                                original_path TEXT,
+                                size INTEGER NOT NULL,
+                                sha256 TEXT,
+                                status TEXT NOT NULL,
+                                created REAL NOT NULL,
+                                updated REAL NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS chunks (
+                                upload_id TEXT NOT NULL,
+                                offset INTEGER NOT NULL,
+                                length INTEGER NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_upload ON chunks (upload_id)")
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def part_path(directory, filename, upload_id):
+        return os.path.join(directory, f".{filename}.{upload_id}.part")
+
+    def _session(self, upload_id):
+        row = self._connection().execute(
+            "SELECT directory, filename, original_path, size, sha256, status, role FROM uploads WHERE id = ?",
+            (upload_id,)).fetchone()
+        if row is None:
+            raise KeyError(upload_id)
+        return dict(zip(('directory', 'filename', 'original_path', 'size', 'sha256', 'status', 'role'), row))
+
+    def create(self, directory, filename, size, sha256=None, original_path=None, role=None):
+        """Open a session and preallocate its file.
+
+        Args:
+            directory (str): Existing directory the file ends up in.
+            filename (str): Name it is saved under (suffixed if taken at finalize).
+            size (int): Total bytes the client will send.
+            sha256 (str): Optional expected hex digest, checked at finalize.
+            original_path (str): Path as given by the client, for the response.
+            role (str): Upload key role, for the log.
+
+        Returns:
+            str: The upload ID.
+        """
+        upload_id = uuid.uuid4().hex
+        with open(self.part_path(directory, filename, upload_id), 'wb') as f:
+            f.truncate(size)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?, 'open', ?, ?)",
+                         (upload_id, role, directory, filename, original_path, size,
+                          sha256.lower() if sha256 else None, now, now))
+        return upload_id
+
+    def status(self, upload_id):
+        """Return the session as a dict, with the bytes committed from the start and all committed ranges.
+
+        Raises:
+            KeyError: If the upload ID is unknown.
+        """
+        session = self._session(upload_id)
+        ranges = merge_ranges(self._connection().execute(
+            "SELECT offset, length FROM chunks WHERE upload_id = ?", (upload_id,)).fetchall())
+        committed = ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+        return {
+            'upload_id': upload_id,
+            'filename': session['filename'],
+            'size': session['size'],
+            'status': session['status'],
+            'committed': committed,
+            'ranges': ranges,
+        }
+
+    def write_chunk(self, upload_id, offset, stream, length):
+        """Write length bytes from stream at offset and commit them.
+
+        Raises:
+            KeyError: If the upload ID is unknown.
+            UploadError: If the session is closed, the chunk falls outside the
+                file or the stream ends early.
+        """
+        session = self._session(upload_id)
+        if session['status'] != 'open':
+            raise UploadError(f"Upload is {session['status']}")
+        if offset < 0 or length < 0 or offset + length > session['size']:
+            raise UploadError(f"Chunk {offset}+{length} is outside the file size {session['size']}")
+
+        with self._hashers_lock:
+            hasher = self._hashers.get(upload_id, False)
+            if hasher is False and offset == 0:
+                hasher = self._hashers[upload_id] = [hashlib.sha256(), 0, 0, threading.Lock()]
+            elif hasher and offset < hasher[2]:
+                # Rewriting bytes that are (being) hashed; finalize reads the file instead
+                self._hashers[upload_id] = hasher = None
+
+        part_path = self.part_path(session['directory'], session['filename'], upload_id)
+        fd = os.open(part_path, os.O_WRONLY)
+        try:
+            position, remaining = offset, length
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    raise UploadError(f"Chunk ended after {position - offset} of {length} bytes")
+                view = memoryview(data)
+                while view:
+                    written = os.pwrite(fd, view, position)
+                    view = view[written:]
+                    position += written
+                remaining -= len(data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT INTO chunks VALUES (?, ?, ?)", (upload_id, offset, length))
+            conn.execute("UPDATE uploads SET updated = ? WHERE id = ?", (time.time(), upload_id))
+        status = self.status(upload_id)
+        if hasher:
+            self._hash_committed(upload_id, hasher, part_path, status['committed'])
+        return status
+
+    def _hash_committed(self, upload_id, hasher, part_path, committed):
+        """Advance a hash state over the bytes committed from the start that it hasn't seen yet."""
+        with hasher[3]:
+            with self._hashers_lock:
+                if self._hashers.get(upload_id) is not hasher or committed <= hasher[1]:
+                    return
+                position = hasher[1]
+                hasher[2] = committed
+            try:
+                with open(part_path, 'rb') as f:
+                    f.seek(position)
+                    while position < committed:
+                        data = f.read(min(READ_SIZE, committed - position))
+                        if not data:
+                            raise EOFError(part_path)
+                        hasher[0].update(data)
+                        position += len(data)
+            except (OSError, EOFError):
+                with self._hashers_lock:
+                    self._hashers[upload_id] = None
+                return
+            with self._hashers_lock:
+                hasher[1] = committed
+
+    def _digest(self, upload_id, part_path, size):
+        with self._hashers_lock:
+            hasher = self._hashers.pop(upload_id, None)
+        sha, position = hashlib.sha256(), 0
+        if hasher:
+            # Wait for a chunk still being hashed
+            with hasher[3]:
+                if hasher[1] == hasher[2]:
+                    sha, position = hasher[0], hasher[1]
+        if position < size:
+            with open(part_path, 'rb') as f:
+                f.seek(position)
+                for data in iter(lambda: f.read(READ_SIZE), b''):
+                    sha.update(data)
+        return sha.hexdigest()
+
+    def finalize(self, upload_id):
+        """Check a complete upload and move it into place.
+
+        Returns:
+            dict: The status plus 'path' and 'sha256' of the saved file, 'deduplicated'
+                  if its content was already stored and 'existing' if the path already held it.
+
+        Raises:
+            KeyError: If the upload ID is unknown.
+            UploadError: If bytes are missing or the SHA-256 doesn't match.
+        """
+        conn = self._connection()
+        with conn:
+            claimed = conn.execute("UPDATE uploads SET status = 'finalizing' WHERE id = ? AND status = 'open'",
+                                   (upload_id,)).rowcount
+        session = self._session(upload_id)
+        if not claimed:
+            raise UploadError(f"Upload is {session['status']}")
+
+        try:
+            status = self.status(upload_id)
+            if status['committed'] != session['size']:
+                raise UploadError(f"Upload incomplete: {status['committed']} of {session['size']} bytes committed")
+            part_path = self.part_path(session['directory'], session['filename'], upload_id)
+            digest = self._digest(upload_id, part_path, session['size'])
+            if session['sha256'] and digest != session['sha256']:
+                raise UploadError(f"SHA-256 mismatch: expected {session['sha256']}, got {digest}")
+            with self.blobs.pinned():
+                blob_path, deduplicated = self.blobs.add_file(part_path, digest)
+                path, existing = self.blobs.place(blob_path, session['directory'], session['filename'])
+            os.unlink(part_path)
+        except Exception:
+            with conn:
+                conn.execute("UPDATE uploads SET status = 'open' WHERE id = ?", (upload_id,))
+            raise
+
+        with conn:
+            conn.execute("UPDATE uploads SET status = 'done', updated = ? WHERE id = ?", (time.time(), upload_id))
+            conn.execute("DELETE FROM chunks WHERE upload_id = ?", (upload_id,))
+        logger.info(f"Chunked upload {upload_id} saved to {path} by user role: {session['role']}")
+        return {**status, 'status': 'done', 'path': path, 'sha256': digest,
+                'original_path': session['original_path'], 'deduplicated': deduplicated, 'existing': existing}
+
+    def abort(self, upload_id):
+        """Drop an unfinished session and its partial file."""
+        session = self._session(upload_id)
+        self._remove(upload_id, session['directory'], session['filename'])
+
+    def _remove(self, upload_id, directory, filename):
+        try:
+            os.unlink(self.part_path(directory, filename, upload_id))
+        except FileNotFoundError:
+            pass
+        with self._hashers_lock:
+            self._hashers.pop(upload_id, None)
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM chunks WHERE upload_id = ?", (upload_id,))
+            conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+
+    def purge(self):
+        """Remove sessions untouched for longer than the TTL, with their partial files.
+
+        Also prunes the blob store, at most once per PRUNE_INTERVAL seconds in each process.
+
+        Returns:
+            int: Number of sessions removed.
+        """
+        rows = self._connection().execute("SELECT id, directory, filename FROM uploads WHERE updated < ?",
+                                          (time.time() - self.ttl,)).fetchall()
+        for row in rows:
+            self._remove(*row)
+        # Drop hash states of sessions another worker finalized or removed
+        open_ids = {row[0] for row in self._connection().execute("SELECT id FROM uploads WHERE status = 'open'")}
+        with self._hashers_lock:
+            for upload_id in [upload_id for upload_id in self._hashers if upload_id not in open_ids]:
+                del self._hashers[upload_id]
+        if self._pruned is None or time.monotonic() - self._pruned >= PRUNE_INTERVAL:
+            self._pruned = time.monotonic()
+            self.blobs.prune()
+        return len(rows)
@@ -0,0 +1,156 @@
+"""Append-only visitor log in SQLite with an incrementally serialized aggregate."""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+class VisitorStore:
+    """Visitor log shared by all workers through one SQLite file.
+
+    Each process keeps the /api/visitors body pre-serialized and only
+    serializes rows added since its last refresh. Per-IP geolocation
+    results are kept in the same file (see lib.geolocation).
+
+    Args:
+        path (str): SQLite database file.
+        csv_path (str): Legacy visitors.csv, imported once into an empty store.
+    """
+
+    def __init__(self, path, csv_path=None):
+        self.path = str(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._records = bytearray()
+        self._body = b"[]\n"
+        if csv_path and os.path.exists(csv_path):
+            self.import_csv(csv_path)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS visits (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                timestamp TEXT NOT NULL,
+                                ip_address TEXT,
+                                latitude REAL,
+                                longitude REAL,
+                                seq INTEGER)""")
+            # seq is bumped when a row is inserted or located later, so the
+            # aggregate picks up rows whose geolocation arrived after them
+            if 'seq' not in [column[1] for column in conn.execute("PRAGMA table_info(visits)")]:
+                conn.execute("ALTER TABLE visits ADD COLUMN seq INTEGER")
+            conn.execute("UPDATE visits SET seq = id WHERE seq IS NULL")
+            conn.execute("CREATE INDEX IF NOT EXISTS visits_seq ON visits (seq)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS locations (
+                                ip_address TEXT PRIMARY KEY,
+                                latitude REAL,
+                                longitude REAL,
+                                resolved_at REAL NOT NULL)""")
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def import_csv(self, csv_path):
+        """Copy the rows of a legacy visitors.csv into an empty store.
+
+        Malformed lines (anything but 4 fields) and 'None' coordinates are
+        handled the way the old CSV reader did.
+
+        Returns:
+            int: Number of rows imported.
+        """
+        def coordinate(value):
+            try:
+                return float(value)
+            except ValueError:
+                return None
+
+        conn = self._connection()
+        with conn:
+            # Take the write lock first so only one worker imports
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM visits LIMIT 1").fetchone():
+                return 0
+            rows = []
+            with open(csv_path, 'r') as f:
+                next(f, None)
+                for line in f:
+                    if line.count(',') != 3:
+                        continue
+                    timestamp, ip, latitude, longitude = line.rstrip('\n').split(',')
+                    rows.append((timestamp, ip, coordinate(latitude), coordinate(longitude)))
+            conn.executemany("INSERT INTO visits (timestamp, ip_address, latitude, longitude) VALUES (?, ?, ?, ?)", rows)
+            conn.execute("UPDATE visits SET seq = id WHERE seq IS NULL")
+        print(f"Imported {len(rows)} visitors from {csv_path}")
+        return len(rows)
+
+    def log(self, timestamp, ip, latitude=None, longitude=None):
+        """Append one visit and return its row id."""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute("""INSERT INTO visits (timestamp, ip_address, latitude, longitude, seq)
+                                     VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM visits))""",
+                                  (str(timestamp), ip, latitude, longitude))
+        return cursor.lastrowid
+
+    def locate(self, row_ids, latitude, longitude):
+        """Fill in the coordinates of visits that were logged without them."""
+        conn = self._connection()
+        with conn:
+            for row_id in row_ids:
+                conn.execute("""UPDATE visits SET latitude = ?, longitude = ?,
+                                    seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM visits)
+                                WHERE id = ? AND latitude IS NULL""", (latitude, longitude, row_id))
+
+    def unlocated(self, limit=None):
+        """Return {ip: [row ids]} for visits that still have no coordinates."""
+        query = "SELECT id, ip_address FROM visits WHERE latitude IS NULL AND ip_address IS NOT NULL ORDER BY id"
+        rows = self._connection().execute(query + (" LIMIT ?" if limit else ""), (limit,) if limit else ()).fetchall()
+        pending = {}
+        for row_id, ip in rows:
+            pending.setdefault(ip, []).append(row_id)
+        return pending
+
+    def get_location(self, ip):
+        """Return (latitude, longitude, resolved_at) remembered for an IP, or None."""
+        return self._connection().execute(
+            "SELECT latitude, longitude, resolved_at FROM locations WHERE ip_address = ?", (ip,)).fetchone()
+
+    def set_location(self, ip, latitude, longitude):
+        """Remember where an IP resolved to; (None, None) records a miss."""
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO locations VALUES (?, ?, ?, ?)", (ip, latitude, longitude, time.time()))
+
+    def visitors_json(self):
+        """Return the located visits as a JSON array, without IP addresses.
+
+        Only rows appended or located since the previous call are read and
+        serialized.
+
+        Returns:
+            bytes: Body for /api/visitors.
+        """
+        with self._lock:
+            rows = self._connection().execute(
+                """SELECT seq, timestamp, latitude, longitude FROM visits
+                   WHERE seq > ? ORDER BY seq""", (self._last_seq,)).fetchall()
+            if not rows:
+                return self._body
+            for seq, timestamp, latitude, longitude in rows:
+                self._last_seq = seq
+                if latitude is None or longitude is None:
+                    continue
+                if self._records:
+                    self._records += b","
+                self._records += json.dumps({'latitude': latitude, 'longitude': longitude, 'timestamp': timestamp},
+                                            separators=(",", ":")).encode()
+            self._body = b"[" + bytes(self._records) + b"]\n"
+            return self._body
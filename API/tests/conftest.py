@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The API imports its modules as `from lib import ...`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
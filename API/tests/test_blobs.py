@@ -0,0 +1,52 @@
+import hashlib
+import io
+import os
+import stat
+
+from lib.blobs import BlobStore
+
+CONTENT = b"ATOM      1  C1  ROH" * 100
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_blobs_are_read_only(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    blob_path, digest, size, existed = store.add_stream(io.BytesIO(CONTENT))
+    assert (digest, size, existed) == (DIGEST, len(CONTENT), False)
+    assert stat.S_IMODE(os.stat(blob_path).st_mode) == 0o444
+
+
+def test_spooled_upload_is_hashed_while_written(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    spooled = store.spool()
+    spooled.write(CONTENT[:100])
+    spooled.write(CONTENT[100:])
+    spooled.seek(0)
+    blob_path, digest, size, existed = store.add_stream(spooled)
+    spooled.close()
+    assert (digest, size, existed) == (DIGEST, len(CONTENT), False)
+    assert open(blob_path, "rb").read() == CONTENT
+
+
+def test_truncated_blob_is_not_reused(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    blob_path = store.add_stream(io.BytesIO(CONTENT))[0]
+    os.chmod(blob_path, 0o644)
+    os.truncate(blob_path, 10)
+    assert store.get(DIGEST, len(CONTENT)) is None
+    assert store.add_stream(io.BytesIO(CONTENT))[3] is False
+    assert open(blob_path, "rb").read() == CONTENT
+    assert store.get(DIGEST, len(CONTENT)) == blob_path
+
+
+def test_prune_keeps_linked_and_pinned_blobs(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    used = store.add_stream(io.BytesIO(CONTENT))[0]
+    store.place(used, str(uploads), "used.pdb")
+    unused = store.add_stream(io.BytesIO(b"unused"))[0]
+    with store.pinned():
+        assert store.prune() == 0
+    assert store.prune() == len(b"unused")
+    assert os.path.exists(used) and not os.path.exists(unused)
@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("werkzeug")
+
+from werkzeug.test import EnvironBuilder
+
+from lib.bundle import open_bundle, send_bundle
+
+
+def entry(tmp_path):
+    entry_dir = tmp_path / "GS00001"
+    (entry_dir / "PDB_format_ATOM").mkdir(parents=True, exist_ok=True)
+    (entry_dir / "output").mkdir(exist_ok=True)
+    pdb = entry_dir / "PDB_format_ATOM" / "cluster0.pdb"
+    if not pdb.exists():
+        pdb.write_bytes(b"ATOM  " * 5000)
+    return entry_dir
+
+
+def body(response):
+    # send_file responses are in direct passthrough mode; iterate them as the server would
+    data = b"".join(response.response)
+    response.close()
+    return data
+
+
+def serve(tmp_path, headers=None):
+    bundle_file, bundle_signature = open_bundle(entry(tmp_path), "GS00001", tmp_path / "bundles")
+    environ = EnvironBuilder(path="/api/download/GS00001", headers=headers).get_environ()
+    return send_bundle(bundle_file, bundle_signature, "GS00001_files.zip", environ), bundle_signature
+
+
+def test_full_download_has_length_and_validators(tmp_path):
+    response, bundle_signature = serve(tmp_path)
+    assert response.status_code == 200
+    assert response.content_length == len(body(response))
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.get_etag()[0] == bundle_signature
+
+
+def test_range_request_is_partial(tmp_path):
+    response, _ = serve(tmp_path, {"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"].startswith("bytes 10-19/")
+    assert len(body(response)) == 10
+
+
+def test_matching_etag_is_not_modified(tmp_path):
+    response, bundle_signature = serve(tmp_path)
+    response.close()
+    response, _ = serve(tmp_path, {"If-None-Match": f'"{bundle_signature}"'})
+    assert response.status_code == 304
+    response.close()
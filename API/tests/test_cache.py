@@ -0,0 +1,56 @@
+import pytest
+
+from lib.cache import MISS, FileCache, PersistentCache, warm_from_glycoshape
+
+WURCS_ALPHA = "WURCS=2.0/2,2,1/[a2122h-1a_1-5_2*NCC/3=O][a1122h-1b_1-5]/1-2/a4-b1"
+WURCS_BETA = "WURCS=2.0/2,2,1/[a2122h-1b_1-5_2*NCC/3=O][a1122h-1b_1-5]/1-2/a4-b1"
+
+# One entry as served from GLYCOSHAPE.json
+SNAPSHOT_ENTRY = {
+    "archetype": {"ID": "GS00001", "glytoucan": "G00001AA", "iupac": "Man(b1-4)GlcNAc",
+                  "glycam": "DManpb1-4DGlcpNAc", "wurcs": "WURCS=2.0/2,2,1/[a2122h-1x_1-5_2*NCC/3=O][a1122h-1b_1-5]/1-2/a4-b1"},
+    "alpha": {"ID": "GS00001", "glytoucan": "G00002AA", "iupac": "Man(b1-4)GlcNAc(a1-",
+              "glycam": "DManpb1-4DGlcpNAca1-OH", "wurcs": WURCS_ALPHA},
+    "beta": {"ID": "GS00001", "glytoucan": "G00003AA", "iupac": "Man(b1-4)GlcNAc(b1-",
+             "glycam": "DManpb1-4DGlcpNAcb1-OH", "wurcs": WURCS_BETA},
+}
+
+# The same glycan as GlycoShape_DB.py records it while building
+BUILD_ENTRY = {"ID": "GS00001", "glycam": "DManpb1-4DGlcpNAc", "iupac": "Man(b1-4)GlcNAc",
+               "wurcs": WURCS_BETA, "glytoucan_id": "G00003AA"}
+
+
+def test_warm_from_snapshot_schema(tmp_path):
+    cache = PersistentCache(tmp_path / "names.db")
+    assert warm_from_glycoshape(cache, {"GS00001": SNAPSHOT_ENTRY}) == 6
+    assert cache.get("iupac2wurcs_glytoucan", "Man(b1-4)GlcNAc(a1-") == ["G00002AA", WURCS_ALPHA]
+    assert cache.get("wurcs2glytoucan", WURCS_BETA) == "G00003AA"
+
+
+def test_warm_from_build_records(tmp_path):
+    cache = PersistentCache(tmp_path / "names.db")
+    assert warm_from_glycoshape(cache, {"GS00001": BUILD_ENTRY}) == 2
+    assert cache.get("iupac2wurcs_glytoucan", "Man(b1-4)GlcNAc") == ["G00003AA", WURCS_BETA]
+    assert cache.get("wurcs2glytoucan", WURCS_BETA) == "G00003AA"
+
+
+def test_incomplete_entries_are_skipped(tmp_path):
+    cache = PersistentCache(tmp_path / "names.db")
+    entry = {"archetype": {"iupac": "Man"}, "alpha": None, "beta": {}}
+    assert warm_from_glycoshape(cache, {"GS00002": entry}) == 0
+    assert cache.get("iupac2wurcs_glytoucan", "Man") is MISS
+
+
+def test_file_cache_is_pruned_to_max_bytes(tmp_path):
+    cache = FileCache(tmp_path / "draw", max_items=0, suffix=".svg", max_bytes=1000)
+
+    def draw(path):
+        with open(path, "wb") as f:
+            f.write(b"x" * 300)
+
+    for i in range(10):
+        assert cache.get_or_create(["glycan", i], draw)[0] == b"x" * 300
+    files = list((tmp_path / "draw").glob("*/*.svg"))
+    assert sum(path.stat().st_size for path in files) <= 1000 + 300
+    # The newest image survived and is served from disk
+    assert cache.get_or_create(["glycan", 9], lambda path: pytest.fail("regenerated"))[0] == b"x" * 300
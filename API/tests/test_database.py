@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("glycowork")
+pytest.importorskip("rdkit")
+
+from lib.database import build_index, resolve_any
+
+# Chitobiose as served from GLYCOSHAPE.json; archetype GLYCAM names have no reducing-end aglycon
+ENTRY = {
+    "archetype": {"ID": "GS00002", "glytoucan": "G00055MO", "iupac": "GlcNAc(b1-4)GlcNAc",
+                  "glycam": "DGlcpNAcb1-4DGlcpNAc", "wurcs": "WURCS=2.0/1,2,1/[a2122h-1x_1-5_2*NCC/3=O]/1-1/a4-b1"},
+    "alpha": {"ID": "GS00002", "glytoucan": "G00056MO", "iupac": "GlcNAc(b1-4)GlcNAc(a1-",
+              "glycam": "DGlcpNAcb1-4DGlcpNAca1-OH", "wurcs": "WURCS=2.0/1,2,1/[a2122h-1a_1-5_2*NCC/3=O]/1-1/a4-b1"},
+    "beta": {"ID": "GS00002", "glytoucan": "G00057MO", "iupac": "GlcNAc(b1-4)GlcNAc(b1-",
+             "glycam": "DGlcpNAcb1-4DGlcpNAcb1-OH", "wurcs": "WURCS=2.0/1,2,1/[a2122h-1b_1-5_2*NCC/3=O]/1-1/a4-b1"},
+}
+
+
+@pytest.mark.parametrize("identifier", ["DGlcpNAcb1-4DGlcpNAcb1-OH", "DGlcpNAcb1-4DGlcpNAca1-oh", "DGlcpNAcb1-4DGlcpNAc"])
+def test_resolve_glycam_with_reducing_end(identifier):
+    entry, variant, label = resolve_any(build_index({"GS00002": ENTRY}), identifier)
+    assert (entry["archetype"]["ID"], variant, label) == ("GS00002", "archetype", "GLYCAM")
+
+
+def test_resolve_other_identifiers():
+    index = build_index({"GS00002": ENTRY})
+    assert resolve_any(index, "G00056MO")[1:] == ("alpha", "GlyTouCan")
+    assert resolve_any(index, "glcnac(b1-4)glcnac")[1:] == ("archetype", "IUPAC")
+    assert resolve_any(index, "DGlcpb1-OH") == (None, None, None)
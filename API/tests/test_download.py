@@ -0,0 +1,68 @@
+import fcntl
+
+from lib import download
+
+URL = "https://glycam.org/json/download/project/gotw/123"
+
+
+class FakeResponse:
+    def __init__(self, content, headers, status_code=200):
+        self.content = content
+        self.headers = headers
+        self.status_code = status_code
+        self.ok = status_code < 400
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.content
+
+
+class FakeSession:
+    """Serves one file; headers are the validators HEAD and GET report."""
+
+    def __init__(self, content, headers):
+        self.content = content
+        self.headers = headers
+        self.gets = 0
+
+    def head(self, url, **kwargs):
+        return FakeResponse(b"", self.headers)
+
+    def get(self, url, **kwargs):
+        self.gets += 1
+        return FakeResponse(self.content, {**self.headers, "Content-Length": str(len(self.content))})
+
+
+def fetch(session, cache_dir):
+    with download.fetch(URL, cache_dir, session) as f:
+        return f.read()
+
+
+def test_validated_download_is_reused(tmp_path):
+    session = FakeSession(b"project v1", {"ETag": '"v1"'})
+    assert fetch(session, tmp_path) == b"project v1"
+    assert fetch(session, tmp_path) == b"project v1"
+    assert session.gets == 1
+
+
+def test_download_without_validators_is_fetched_every_time(tmp_path):
+    session = FakeSession(b"project v1", {})
+    assert fetch(session, tmp_path) == b"project v1"
+    session.content = b"project v2"
+    assert fetch(session, tmp_path) == b"project v2"
+    assert session.gets == 2
+    assert not list(tmp_path.glob("*.zip"))
+
+
+def test_prune_skips_downloads_in_use(tmp_path):
+    session = FakeSession(b"x" * 100, {"ETag": '"v1"'})
+    fetch(session, tmp_path)
+    path, = tmp_path.glob("*.zip")
+    with open(path.with_name(path.name.split(".")[0] + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        download.prune(tmp_path, 0)
+        assert path.exists()
+    download.prune(tmp_path, 0)
+    assert not path.exists()
@@ -0,0 +1,98 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+from lib import config, supervisor, GOTW_script
+
+# Stands in for tleap: answers each command and prompts with '> ', or runs a -f script
+FAKE_TLEAP = textwrap.dedent("""\
+    #!{python}
+    import sys
+
+    def run(commands, prompt):
+        for command in commands:
+            command = command.strip()
+            if command.startswith("charge"):
+                print("Total unperturbed charge:  -2.000000")
+                print("Total perturbed charge:  -2.000000")
+            elif command.startswith("solvateBox"):
+                print("  Added 3000 residues.")
+            elif command.startswith("saveamberparm"):
+                for name in ("system.prm7", "system.rst7"):
+                    open(name, "w").close()
+            elif command == "quit":
+                print("\\tQuit")
+                return
+            if prompt:
+                sys.stdout.write("> ")
+                sys.stdout.flush()
+
+    if "-f" in sys.argv:
+        run(open(sys.argv[sys.argv.index("-f") + 1]), False)
+    elif {interactive}:
+        print("-I: Adding /usr/share/leap to search path.")
+        sys.stdout.write("> ")
+        sys.stdout.flush()
+        run(iter(sys.stdin.readline, ""), True)
+    """)
+
+
+@pytest.fixture
+def build(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "gotw_slot_dir", str(tmp_path / "slots"))
+    folder = tmp_path / "build"
+    folder.mkdir()
+    (folder / "structure.off").touch()
+
+    def install(interactive=True):
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir(exist_ok=True)
+        tleap = bin_dir / "tleap"
+        tleap.write_text(FAKE_TLEAP.format(python=sys.executable, interactive=interactive))
+        tleap.chmod(0o755)
+        monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+        return str(folder)
+    return install
+
+
+def test_single_session_adds_sltcap_ions(build):
+    folder = build()
+    stages = supervisor.Stages("test")
+    assert GOTW_script.prepare_system(folder, 200, stages) == (10, 12)
+    assert [(record["stage"], record["status"]) for record in stages.records] == [("tleap", "ok")]
+    with open(os.path.join(folder, "tleap.in")) as f:
+        script = f.read()
+    assert script.startswith(GOTW_script.TLEAP_SETUP) and "Na+ 12" in script and "Cl- 10" in script
+    with open(os.path.join(folder, "tleap.out")) as f:
+        assert "Added 3000 residues" in f.read()
+    assert os.path.exists(os.path.join(folder, "system.prm7"))
+
+
+def test_falls_back_to_two_scripted_runs(build):
+    folder = build(interactive=False)
+    stages = supervisor.Stages("test")
+    assert GOTW_script.prepare_system(folder, 200, stages) == (10, 12)
+    assert [record["status"] for record in stages.records] == ["failed", "ok", "ok"]
+    # The archived script is complete on its own
+    with open(os.path.join(folder, "tleap.in")) as f:
+        assert f.read().startswith(GOTW_script.TLEAP_SETUP)
+    assert os.path.exists(os.path.join(folder, "system.rst7"))
+
+
+def test_read_pdb_columns(tmp_path):
+    pdb = tmp_path / "structure.pdb"
+    pdb.write_text(
+        "REMARK  generated\n"
+        "ATOM      1  C1  ROH     1       1.000   2.000   3.000  1.00  0.00           C\n"
+        "HETATM    2  O5  ROH     1       1.000   2.000   3.000  1.00  0.00           o\n"
+        "ATOM      3 1H2  ROH     1       1.000   2.000   3.000  1.00  0.00            \n"  # blank element column
+        "ATOM      4  N2  ROH     1       1.000   2.000   3.000\n"  # short line, no element column
+        "TER\n"
+        "HETATM    5 NA   NA      2       1.000   2.000   3.000  1.00  0.00          NA\n"
+        "END\n")
+    assert list(GOTW_script.read_pdb_columns(str(pdb))) == ["C", "O", "H", "N", "NA"]
+    assert GOTW_script.calculate_mass(str(pdb)) == pytest.approx(
+        (GOTW_script.atomic_masses["C"] + GOTW_script.atomic_masses["O"]
+         + GOTW_script.atomic_masses["H"] + GOTW_script.atomic_masses["N"]) / 1000)
@@ -0,0 +1,54 @@
+import csv
+import math
+import os
+
+from lib.inventory import COLUMNS, InventoryStore
+
+GLYCAM = "DManpb1-4DGlcpNAcb1-OH"
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+
+def row(ID, glycam, salt="", timestamp="2024-01-01"):
+    return [ID, timestamp, "someone@example.org", glycam, "", "1000", "GROMACS", "GLYCAM", "300", "1", salt, "", ""]
+
+
+def test_find_types_values_like_pandas(tmp_path):
+    csv_path = tmp_path / "inventory.csv"
+    write_csv(csv_path, [row("1", GLYCAM, "150"), row("2", "DGlcpb1-OH")])
+    values = InventoryStore(tmp_path / "inventory.db", csv_path).find("DManpb1-4DGlcpNAc")
+    assert values[0] == 1 and isinstance(values[0], int)
+    assert values[5] == 1000
+    assert values[10] == 150.0 and isinstance(values[10], float)
+    assert math.isnan(values[11])
+
+
+def test_hand_edits_are_reloaded(tmp_path):
+    csv_path = tmp_path / "inventory.csv"
+    write_csv(csv_path, [row("", GLYCAM)])
+    store = InventoryStore(tmp_path / "inventory.db", csv_path)
+    assert math.isnan(store.find("DManpb1-4DGlcpNAc")[0])
+
+    write_csv(csv_path, [row("7", GLYCAM, "200")])
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    values = store.find("DManpb1-4DGlcpNAc")
+    assert values[0] == 7 and values[10] == 200
+
+
+def test_append_keeps_csv_and_store_in_step(tmp_path):
+    csv_path = tmp_path / "inventory.csv"
+    write_csv(csv_path, [row("1", GLYCAM)])
+    store = InventoryStore(tmp_path / "inventory.db", csv_path)
+    store.append(dict(zip(COLUMNS, row("2", "DGlcpb1-OH"))))
+    assert store.sync() == 0
+    assert store.glycams() == ["DManpb1-4DGlcpNAc", "DGlcp"]
+    with open(csv_path, newline="") as f:
+        assert len(list(csv.reader(f))) == 3
+    # A second store on the same files sees the appended row without re-importing
+    assert InventoryStore(tmp_path / "inventory.db", csv_path).find("DGlcp")[0] == 2
@@ -0,0 +1,31 @@
+import hashlib
+import io
+
+from lib.blobs import BlobStore
+from lib.uploads import UploadSessions
+
+CONTENT = bytes(range(256)) * 40
+
+
+def upload(sessions, directory, chunks):
+    upload_id = sessions.create(str(directory), "traj.nc", len(CONTENT))
+    for offset, length in chunks:
+        sessions.write_chunk(upload_id, offset, io.BytesIO(CONTENT[offset:offset + length]), length)
+    return upload_id
+
+
+def test_out_of_order_chunks_are_hashed_as_they_become_contiguous(tmp_path):
+    sessions = UploadSessions(tmp_path / "sessions.db", BlobStore(tmp_path / "blobs"))
+    upload_id = upload(sessions, tmp_path, [(0, 1000), (3000, len(CONTENT) - 3000), (1000, 2000)])
+    sha, hashed, _, _ = sessions._hashers[upload_id]
+    assert hashed == len(CONTENT)
+    result = sessions.finalize(upload_id)
+    assert result['sha256'] == hashlib.sha256(CONTENT).hexdigest()
+    assert open(result['path'], 'rb').read() == CONTENT
+
+
+def test_rewritten_chunk_is_hashed_from_the_file(tmp_path):
+    sessions = UploadSessions(tmp_path / "sessions.db", BlobStore(tmp_path / "blobs"))
+    upload_id = upload(sessions, tmp_path, [(0, 4000), (0, 1000), (4000, len(CONTENT) - 4000)])
+    assert sessions._hashers[upload_id] is None
+    assert sessions.finalize(upload_id)['sha256'] == hashlib.sha256(CONTENT).hexdigest()
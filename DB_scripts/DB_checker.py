@@ -14,6 +14,9 @@ import pandas as pd
 from tqdm import tqdm
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent / "API"))
+from lib.inventory import InventoryStore
+
 ###############################################
 
 input_path = "/mnt/database/glycoshape_data"
@@ -62,10 +65,7 @@ def canonicalize_iupac(iupac):
 ###############################################
 
 inventory = "/mnt/database/DB_scripts/GlycoShape_Inventory.csv"
-df_inventory = pd.read_csv(inventory)
-df_inventory = df_inventory[df_inventory['Timestamp'].notna()]
-df_inventory[df_inventory.columns[3]] = [glycamtidy(i) for i in df_inventory[df_inventory.columns[3]].values]
-inventory_glycan = df_inventory[df_inventory.columns[3]].values.tolist()
+inventory_glycan = InventoryStore(os.environ.get("GLYCOSHAPE_INVENTORY_DB", "/mnt/database/DB_scripts/GlycoShape_Inventory.db"), inventory).glycams()
 inventory_glycan = [str(glycam2iupac(glycam_tidy)) for glycam_tidy in inventory_glycan]
 inventory_glycan = [canonicalize_iupac(iupac_untidy)[2:-2] for iupac_untidy in inventory_glycan]
 
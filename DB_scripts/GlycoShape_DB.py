@@ -15,11 +15,20 @@ import pandas as pd
 from tqdm import tqdm
 from pathlib import Path
 
+# Nomenclature conversions go through the API's cache (GLYCOSHAPE_NAME_CACHE, see API/lib/cache.py)...
+sys.path.append(str(Path(__file__).resolve().parent.parent / "API"))
+from lib import name
+from lib.cache import MISS, warm_from_glycoshape
+from lib.inventory import InventoryStore
+
 ###############################################
 
 input_path = "/mnt/database/glycoshape_data"
 output_path = "/mnt/database/DB_temp"
 update = True
+# Submission inventory, reloaded whenever the CSV is edited (same store as the API's GLYCOSHAPE_INVENTORY_DB)
+inventory = InventoryStore(os.environ.get("GLYCOSHAPE_INVENTORY_DB", "/mnt/database/DB_scripts/GlycoShape_Inventory.db"),
+                           "/mnt/database/DB_scripts/GlycoShape_Inventory.csv")
 
 ###############################################
 
@@ -81,26 +90,24 @@ def iupac2composition(iupac):
 
 
 # Function to request the WURCS nomeclature and GlyTouCan ID from the condensed IUPAC nomeclature...
-def iupac2wurcs_glytoucan(iupac): 
-    id_list = []
-    for end in ["a","b","?"]:
-        iupac_mod = iupac + f"({end}1-"
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded',
-        }
-        data = {"input": f"{iupac}"}
-        response = requests.post(
-            'https://api.glycosmos.org/glycanformatconverter/2.8.2/iupaccondensed2wurcs',
-            headers=headers,
-            data=str(data),
-        )
-        id_list.append([response.json()["id"] if "id" in response.json() else None, response.json()["wurcs"] if "wurcs" in response.json() else None])
-
-    ids = [id_list[n][0] for n in range(len(id_list))]
-    ids = list(dict.fromkeys(ids))
-    wurcs = [id_list[n][1] for n in range(len(id_list))]
-    wurcs = list(dict.fromkeys(wurcs))
-    return ids, wurcs
+# Answers are kept in the shared name cache under their own namespace, apart from the API's GET-based lookups
+def iupac2wurcs_glytoucan(iupac):
+    cached = name.name_cache.get("GlycoShape_DB.iupac2wurcs_glytoucan", iupac)
+    if cached is not MISS:
+        return tuple(cached)
+    headers = {
+        'Content-Type': 'application/x-www-form-urlencoded',
+    }
+    data = {"input": f"{iupac}"}
+    response = requests.post(
+        'https://api.glycosmos.org/glycanformatconverter/2.8.2/iupaccondensed2wurcs',
+        headers=headers,
+        data=str(data),
+    )
+    result = response.json()
+    glytoucan, wurcs = result["id"] if "id" in result else None, result["wurcs"] if "wurcs" in result else None
+    name.name_cache.set("GlycoShape_DB.iupac2wurcs_glytoucan", iupac, [glytoucan, wurcs], negative=wurcs is None)
+    return glytoucan, wurcs
 
 
 # Function to look up a GlyTouCan ID from GlyGen...
@@ -117,22 +124,17 @@ def glytoucan2glygen(glytoucan):
 
 # Function to get MD simulation info for a glycan submission...
 def get_md_info(glycam):
-    latest_inventory = "/mnt/database/DB_scripts/GlycoShape_Inventory.csv"
-    df = pd.read_csv(latest_inventory)
-    df = df[df['Timestamp'].notna()]
-    df[df.columns[3]] = [glycamtidy(i) for i in df[df.columns[3]].values]
-    df = df.loc[df[df.columns[3]] == glycam]
-    try:
-        length = str(list(df[df.columns[5]].values)[0])
-        package = list(df[df.columns[6]].values)[0]
-        FF = list(df[df.columns[7]].values)[0]
-        temp = str(list(df[df.columns[8]].values)[0])
-        pressure = str(list(df[df.columns[9]].values)[0])
-        salt = list(df[df.columns[10]].values)[0]
-        contributor = list(df[df.columns[2]].values)[0]
-        ID = list(df[df.columns[0]].values)[0]
-    except IndexError:
-        ID, length, package, FF, temp, pressure, salt, contributor = 0, 0, 0, 0, 0, 0, 0, "0"
+    row = inventory.find(glycam)
+    if row is None:
+        return 0, 0, 0, 0, 0, 0, 0, "0"
+    length = str(row[5])
+    package = row[6]
+    FF = row[7]
+    temp = str(row[8])
+    pressure = str(row[9])
+    salt = row[10]
+    contributor = row[2]
+    ID = row[0]
     return ID, length, package, FF, temp, pressure, salt, contributor
 
 # Function to get the cluster information for the glycan of interest...
@@ -340,8 +342,6 @@ for glycam, i in zip(glycoshape_list,tqdm(range(len(glycoshape_list)))):
 
     composition = iupac2composition(iupac)
     glytoucan, wurcs = iupac2wurcs_glytoucan(iupac)
-    glytoucan = glytoucan[0]
-    wurcs = wurcs [0]
     glycoct, IGNORE = glytoucan2glygen(glytoucan)
     try:
         mass, tpsa, rot_bonds, hbond_donor, hbond_acceptor = iupac2properties(iupac)
@@ -515,9 +515,16 @@ for glycam, i in zip(glycoshape_list,tqdm(range(len(glycoshape_list)))):
 
     sim_time.append(np.float64(length))
 
+# Write to a temporary file and rename, so a running API hot-reloading
+# GLYCOSHAPE.json never sees a half-written database...
 json_object = json.dumps(glycoshape, indent=4)
-with open(os.path.join(output_path,"GLYCOSHAPE.json"), "w") as outfile:
+with open(os.path.join(output_path,"GLYCOSHAPE.json.tmp"), "w") as outfile:
     outfile.write(json_object)
+os.replace(os.path.join(output_path,"GLYCOSHAPE.json.tmp"), os.path.join(output_path,"GLYCOSHAPE.json"))
+
+# Seed the API's nomenclature cache with every identifier we just resolved...
+n_cached = warm_from_glycoshape(name.name_cache, glycoshape)
+print(f"Warmed name cache with {n_cached} entries")
 
 
 GAG = ["GlcNS(a1-4)IdoA(a1-4)GlcNS(a1-4)GlcA(b1-4)GlcNAc6S(a1-4)GlcA(b1-4)GlcNS6S(a1-4)IdoA2S(a1-4)GlcNAc(a1-4)GlcA",
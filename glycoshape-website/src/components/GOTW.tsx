@@ -43,6 +43,7 @@ const App: React.FC = () => {
 
   const [uploadProgress, setUploadProgress] = useState<number>(0);
   const [loading, setLoading] = useState<boolean>(false);
+  const [jobStage, setJobStage] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
   const [placeholdertext, setPlaceholderText] = useState('Lets run some glycan simulations...');
   const placeholders = [
@@ -126,10 +127,26 @@ const App: React.FC = () => {
     setError(null);
 
     try {
-      const response = await axios.post(`${apiUrl}/api/gotw`, { url }, {
+      // The build runs as a background job: submit it, poll its status, then fetch the archive
+      const submitted = await axios.post(`${apiUrl}/api/gotw`, { url }, {
         headers: {
           'Content-Type': 'application/json',
         },
+      });
+      const jobId = submitted.data.job_id;
+
+      let status = submitted.data.status;
+      while (status !== 'done') {
+        await new Promise((resolve) => setTimeout(resolve, 5000));
+        const job = await axios.get(`${apiUrl}/api/gotw/${jobId}`);
+        status = job.data.status;
+        setJobStage(job.data.stage);
+        if (status === 'failed') {
+          throw new Error(job.data.error);
+        }
+      }
+
+      const response = await axios.get(`${apiUrl}/api/gotw/${jobId}/result`, {
         responseType: 'blob',
       });
 
@@ -155,6 +172,7 @@ const App: React.FC = () => {
       setError('Failed to process the URL');
     } finally {
       setLoading(false);
+      setJobStage(null);
     }
   };
 
@@ -207,7 +225,7 @@ const App: React.FC = () => {
           size="md"
           onClick={handleSubmitUrl}
         >
-          {loading ? 'Processing...' : 'Fetch Files'}
+          {loading ? `Processing${jobStage ? ` (${jobStage})` : ''}...` : 'Fetch Files'}
         </Button>
       </Flex>
       <Box p={8} width="900px"  margin="0 auto">